@@ -0,0 +1,21 @@
+from __future__ import annotations
+from app.core.errors import AppError, ConfigError, ProviderError, RateLimitError
+from app.providers.llm.base import LLMHTTPError
+from app.services.rate_limiter import RateLimitTimeout
+
+# excepciones de providers/servicios -> AppError (compartido por /llm y el WS)
+
+def to_app_error(e: Exception, provider: str) -> AppError:
+    if isinstance(e, AppError):
+        return e
+    if isinstance(e, RateLimitTimeout):
+        return RateLimitError(str(e), provider=e.provider, retry_after_s=e.wait_s)
+    if isinstance(e, LLMHTTPError):
+        if e.status_code == 429:
+            return RateLimitError(str(e), provider=e.provider, retry_after_s=e.retry_after_s)
+        return ProviderError(str(e), provider=e.provider, details={"status_code": e.status_code})
+    if isinstance(e, NotImplementedError):
+        return ProviderError("Provider not implemented yet", provider=provider)
+    if isinstance(e, ValueError):
+        return ConfigError(str(e))
+    return ProviderError(str(e), provider=provider)
@@ -1,8 +1,16 @@
 from __future__ import annotations
 from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
 
 router = APIRouter(tags=["health"])
 
 @router.get("/health")
 def health() -> dict:
     return {"status": "ok", "service": "PROMPTer-backend"}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    # formato de texto de Prometheus (scrape)
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,21 +1,34 @@
 from __future__ import annotations
-from typing import Any, Optional
-from fastapi import APIRouter
+import asyncio
+import json
+from dataclasses import replace
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from fastapi import APIRouter, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from app.services.llm_router import LLMRouter
-from app.providers.llm.base import LLMGenerateRequest, LLMMessage
-from app.core.errors import ProviderError, ConfigError
+from app.services.llm_router import get_llm_router
+from app.providers.llm.base import LLMGenerateRequest, LLMMessage, LLMStreamChunk
+from app.core.config import get_settings
+from app.core.logging import log_timings
+from app.core.timing import Timings, span, use_timings
+from app.api.errors import to_app_error
+from app.core.errors import AppError, NotFoundError, SessionMovedError, ValidationAppError
+from app.services.context_budget import ContextReport, apply_context_budget, budget_for, estimate_prompt_tokens, fit_context
+from app.services.conversation_store import Conversation, get_conversation_store
+from app.services.session_registry import conversation_key, get_session_registry
 
 router = APIRouter(prefix="/llm", tags=["llm"])
 
-_llm_router = LLMRouter()
+_llm_router = get_llm_router()
 
 class MessageIn(BaseModel):
     role: str
     content: str
 
 class LLMGenerateIn(BaseModel):
+    # con conversation_id, messages son solo los mensajes nuevos del turno
     messages: list[MessageIn]
+    conversation_id: Optional[str] = None
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
     max_tokens: int = Field(default=256, ge=1, le=8192)
     provider: Optional[str] = None
@@ -27,10 +40,30 @@ class LLMGenerateOut(BaseModel):
     provider: str
     model: Optional[str] = None
     usage: dict[str, Any] | None = None
+    cached: bool = False
+    conversation_id: Optional[str] = None
+    context: dict[str, Any] | None = None
 
-@router.post("/generate", response_model=LLMGenerateOut)
-async def generate_llm(payload: LLMGenerateIn) -> LLMGenerateOut:
-    req = LLMGenerateRequest(
+class ConversationIn(BaseModel):
+    system_prompt: str = ""
+    messages: list[MessageIn] = Field(default_factory=list)
+
+class LLMBatchIn(BaseModel):
+    items: list[LLMGenerateIn] = Field(min_length=1)
+    # true: SSE con un evento "item" por petición según terminan
+    stream: bool = False
+
+class LLMBatchItemOut(BaseModel):
+    index: int
+    ok: bool
+    result: Optional[LLMGenerateOut] = None
+    error: dict[str, Any] | None = None
+
+class LLMBatchOut(BaseModel):
+    results: list[LLMBatchItemOut]
+
+def _to_request(payload: LLMGenerateIn) -> LLMGenerateRequest:
+    return LLMGenerateRequest(
         messages=[LLMMessage(role=m.role, content=m.content) for m in payload.messages],
         temperature=payload.temperature,
         max_tokens=payload.max_tokens,
@@ -38,15 +71,258 @@ async def generate_llm(payload: LLMGenerateIn) -> LLMGenerateOut:
         extra=payload.extra,
     )
 
+async def _not_here(conversation_id: str) -> AppError:
+    # otro worker la tiene: redirige allí en vez de responder 404
+    owner = await asyncio.to_thread(get_session_registry().remote_owner, conversation_key(conversation_id))
+    if owner is not None:
+        return SessionMovedError(
+            "conversation lives on another worker", worker_id=owner.worker_id, worker_url=owner.url
+        )
+    return NotFoundError("conversation not found", details={"conversation_id": conversation_id})
+
+async def _conversation(conversation_id: str) -> Conversation:
+    conv = get_conversation_store().get(conversation_id)
+    if conv is None:
+        raise await _not_here(conversation_id)
+    return conv
+
+async def _prepare(
+    payload: LLMGenerateIn, conv: Optional[Conversation]
+) -> tuple[LLMGenerateRequest, Optional[ContextReport]]:
+    # arma la petición final: historial guardado + delta, recortado al presupuesto
+    req = _to_request(payload)
+    if conv is not None:
+        conv.messages.extend(req.messages)
+        with span("context_budget"):
+            report = await apply_context_budget(conv, _llm_router, payload.config)
+        return replace(req, messages=conv.prompt_messages()), report
+
+    if payload.config.get("context_budget_tokens") is None:
+        return req, None
+    # sin conversación: solo se recorta lo que mandó el cliente
+    budget = budget_for(payload.config)
+    plan = fit_context(req.messages, budget, get_settings().LLM_CONTEXT_KEEP_LAST)
+    report = ContextReport(budget_tokens=budget, trimmed=len(plan.dropped))
+    report.prompt_tokens = estimate_prompt_tokens(plan.kept)
+    return replace(req, messages=plan.kept), report
+
+@router.post("/generate", response_model=LLMGenerateOut)
+async def generate_llm(payload: LLMGenerateIn, response: Response) -> LLMGenerateOut:
+    timings = Timings()
     try:
-        res = await _llm_router.generate(req, payload.config)
-        return LLMGenerateOut(text=res.text, provider=res.provider, model=res.model, usage=res.usage)
+        with use_timings(timings):
+            out = await _generate_turn(payload)
+    finally:
+        log_timings("llm.generate", timings, provider=payload.provider or payload.config.get("provider"))
+    response.headers["Server-Timing"] = timings.server_timing()
+    return out
 
-    except NotImplementedError:
-        raise ProviderError("Provider not implemented yet", provider=payload.provider or "")
+async def _generate_turn(payload: LLMGenerateIn) -> LLMGenerateOut:
+    if payload.conversation_id is None:
+        return await _generate(payload, None)
 
-    except ValueError as e:
-        raise ConfigError(str(e))
+    conv = await _conversation(payload.conversation_id)
+    # un turno a la vez: el historial no se intercala entre peticiones concurrentes
+    async with conv.lock:
+        saved = (list(conv.messages), conv.summary)
+        try:
+            out = await _generate(payload, conv)
+        except BaseException:
+            # turno fallido o cancelado: la conversación queda como estaba
+            conv.messages, conv.summary = saved
+            raise
+        conv.messages.append(LLMMessage(role="assistant", content=out.text))
+        return out
 
+async def _generate(payload: LLMGenerateIn, conv: Optional[Conversation]) -> LLMGenerateOut:
+    try:
+        req, report = await _prepare(payload, conv)
+        res = await _llm_router.generate(req, payload.config)
+        return LLMGenerateOut(
+            text=res.text,
+            provider=res.provider,
+            model=res.model,
+            usage=res.usage,
+            cached=res.cached,
+            conversation_id=conv.id if conv is not None else None,
+            context=report.to_dict() if report is not None else None,
+        )
     except Exception as e:
-        raise ProviderError(str(e), provider=payload.provider or "")
+        raise to_app_error(e, payload.provider or "")
+
+@router.post("/conversations")
+def create_conversation(payload: ConversationIn) -> dict:
+    conv = get_conversation_store().create(
+        system_prompt=payload.system_prompt,
+        messages=[LLMMessage(role=m.role, content=m.content) for m in payload.messages],
+    )
+    return conv.to_dict()
+
+@router.get("/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str) -> dict:
+    return (await _conversation(conversation_id)).to_dict()
+
+@router.delete("/conversations/{conversation_id}")
+async def delete_conversation(conversation_id: str) -> dict:
+    if not get_conversation_store().delete(conversation_id):
+        raise await _not_here(conversation_id)
+    return {"deleted": True}
+
+@router.get("/cache/stats")
+def llm_cache_stats() -> dict:
+    return _llm_router.cache.stats()
+
+@router.get("/stats")
+def llm_stats() -> dict:
+    return _llm_router.stats()
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class _StreamTurnResponse(StreamingResponse):
+    # el stream de un turno tiene el lock de la conversación: se suelta aunque
+    # el cliente se vaya antes de leer el body
+    def __init__(self, content: AsyncIterator[str], on_close: Callable[[], Awaitable[None]], **kwargs: Any) -> None:
+        super().__init__(content, **kwargs)
+        self._on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self._on_close()
+
+@router.post("/generate/stream")
+async def generate_llm_stream(payload: LLMGenerateIn) -> StreamingResponse:
+    # SSE: "token" por cada delta, "done" con usage al final, "error" si falla a mitad
+    provider = payload.provider or payload.config.get("provider") or "openai_compat"
+    conv = await _conversation(payload.conversation_id) if payload.conversation_id is not None else None
+    saved = None
+    if conv is not None:
+        # el lock se suelta cuando termina la respuesta (finish)
+        await conv.lock.acquire()
+        saved = (list(conv.messages), conv.summary)
+    finished = False
+
+    def finish(text: Optional[str]) -> None:
+        # una sola vez: desde events() o desde _StreamTurnResponse
+        nonlocal finished
+        if conv is None or finished:
+            return
+        finished = True
+        if text is None:
+            conv.messages, conv.summary = saved
+        else:
+            conv.messages.append(LLMMessage(role="assistant", content=text))
+        conv.lock.release()
+
+    # el primer chunk se pide antes de responder: los errores de config siguen siendo HTTP 4xx/5xx
+    chunks: Optional[AsyncIterator[LLMStreamChunk]] = None
+    try:
+        req, report = await _prepare(payload, conv)
+        chunks = _llm_router.stream(req, payload.config)
+        try:
+            first: Optional[LLMStreamChunk] = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+    except BaseException as e:
+        # también si cancelan la petición: el turno se descarta y el lock se suelta
+        finish(None)
+        if chunks is not None:
+            await chunks.aclose()
+        if isinstance(e, Exception):
+            raise to_app_error(e, payload.provider or "")
+        raise
+
+    extra: dict[str, Any] = {}
+    if conv is not None:
+        extra["conversation_id"] = conv.id
+    if report is not None:
+        extra["context"] = report.to_dict()
+
+    async def events() -> AsyncIterator[str]:
+        parts: list[str] = []
+        chunk = first
+        text: Optional[str] = None
+        try:
+            while chunk is not None:
+                if chunk.delta:
+                    parts.append(chunk.delta)
+                    yield _sse("token", {"text": chunk.delta})
+                if chunk.done:
+                    text = "".join(parts)
+                    yield _sse("done", {
+                        "text": text,
+                        "provider": provider,
+                        "model": chunk.model,
+                        "usage": chunk.usage,
+                        **extra,
+                    })
+                    return
+                try:
+                    chunk = await chunks.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+            text = "".join(parts)
+            yield _sse("done", {"text": text, "provider": provider, "model": None, "usage": None, **extra})
+        except Exception as e:
+            yield _sse("error", to_app_error(e, payload.provider or "").to_dict())
+        finally:
+            await chunks.aclose()
+            finish(text)
+
+    body = events()
+
+    async def close() -> None:
+        # events() ya empezado: su finally cierra y guarda. Si nunca se iteró,
+        # el turno se descarta igual.
+        await body.aclose()
+        await chunks.aclose()
+        finish(None)
+
+    return _StreamTurnResponse(
+        body,
+        on_close=close,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _batch_item(index: int, item: LLMGenerateIn, res: Any) -> LLMBatchItemOut:
+    if isinstance(res, Exception):
+        return LLMBatchItemOut(index=index, ok=False, error=to_app_error(res, item.provider or "").to_dict()["error"])
+    return LLMBatchItemOut(
+        index=index,
+        ok=True,
+        result=LLMGenerateOut(text=res.text, provider=res.provider, model=res.model, usage=res.usage, cached=res.cached),
+    )
+
+@router.post("/batch", response_model=LLMBatchOut)
+async def generate_llm_batch(payload: LLMBatchIn) -> Any:
+    max_items = get_settings().LLM_BATCH_MAX_ITEMS
+    if len(payload.items) > max_items:
+        raise ValidationAppError(f"batch too large (max {max_items} items)", details={"items": len(payload.items)})
+    if any(item.conversation_id for item in payload.items):
+        # un batch no tiene orden entre items: los turnos de una conversación sí
+        raise ValidationAppError("conversation_id is not supported in batch items")
+
+    items = [(_to_request(item), item.config) for item in payload.items]
+
+    if not payload.stream:
+        results: list[Optional[LLMBatchItemOut]] = [None] * len(items)
+        async for index, res in _llm_router.batch(items):
+            results[index] = _batch_item(index, payload.items[index], res)
+        return LLMBatchOut(results=[r for r in results if r is not None])
+
+    async def events() -> AsyncIterator[str]:
+        ok = 0
+        async for index, res in _llm_router.batch(items):
+            out = _batch_item(index, payload.items[index], res)
+            ok += int(out.ok)
+            yield _sse("item", out.model_dump())
+        yield _sse("done", {"total": len(items), "ok": ok, "failed": len(items) - ok})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
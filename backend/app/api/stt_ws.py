@@ -1,28 +1,176 @@
 from __future__ import annotations
 import asyncio
 import json
+import time
 from typing import Any, Optional
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-from app.services.session_store import SessionStore
+from app.api.errors import to_app_error
+from app.core.config import get_settings
+from app.core.errors import NotFoundError, SessionMovedError
+from app.core.logging import log_timings
+from app.core.metrics import STT_ACTIVE_SESSIONS, STT_PARTIAL_LAG_SECONDS
+from app.core.timing import Timings, use_timings
+from app.core.models import TranscriptChunk
+from app.services.partial_engine import IncrementalPartialEngine
+from app.services.llm_router import get_llm_router
+from app.services.session_registry import SessionOwner, get_session_registry, stt_session_key
+from app.services.session_store import STTSession, SessionStore
+from app.services.stt_llm_pipeline import PipelineConfig, STTLLMPipeline, get_speculation_stats
 from app.services.stt_router import STTRouter
+from app.services.stt_scheduler import JobCancelled, JobKind, JobSuperseded
+from app.utils.audio import estimate_pcm16_bytes
+from app.utils.vad import Utterance
 
 router = APIRouter(tags=["stt"])
 
 _store = SessionStore()
+STT_ACTIVE_SESSIONS.set_function(lambda: len(_store))
 _stt_router = STTRouter(_store)
+# sesiones desconectadas a la espera de resume (STT_RESUME_GRACE_S): sid -> tarea que las cierra
+_detached: dict[str, asyncio.Task] = {}
+
+# códigos de cierre propios del WS (4000-4999)
+CLOSE_REDIRECT = 4307
+CLOSE_OWNED_ELSEWHERE = 4409
+
+def _pick_retain_s(config: dict[str, Any]) -> float:
+    v = config.get("retain_committed_s", get_settings().STT_RETAIN_COMMITTED_S)
+    try:
+        return max(0.0, float(v))
+    except (TypeError, ValueError):
+        return 0.0
+
+def _new_timings(config: dict[str, Any]) -> Optional[Timings]:
+    # solo si alguien los va a leer (mensaje con config.timings o log)
+    if config.get("timings") is True or get_settings().TIMINGS_LOG:
+        return Timings()
+    return None
+
+def _with_timings(msg: dict[str, Any], timings: Optional[Timings], config: dict[str, Any], event: str) -> dict[str, Any]:
+    if timings is None:
+        return msg
+    log_timings(event, timings, session_id=msg.get("session_id"))
+    if config.get("timings") is True:
+        msg["timings"] = timings.to_dict()
+    return msg
+
+async def _claim(sid: str) -> Optional[SessionOwner]:
+    return await asyncio.to_thread(get_session_registry().claim, stt_session_key(sid))
+
+async def _release(sid: str) -> None:
+    await asyncio.to_thread(get_session_registry().release, stt_session_key(sid))
+
+def _ws_url(http_url: str) -> str:
+    return "ws" + http_url[len("http"):] if http_url.startswith("http") else http_url
+
+def _moved(sid: str, owner: SessionOwner) -> dict[str, Any]:
+    if owner.url:
+        # el cliente reconecta a la URL directa del dueño y repite el start
+        return {"type": "redirect", "session_id": sid, "worker_id": owner.worker_id, "url": _ws_url(owner.url) + "/ws/stt"}
+    return {"type": "error", "message": "Session is owned by another worker", "session_id": sid, "worker_id": owner.worker_id}
+
+def _resumed_ready(sess: STTSession) -> dict[str, Any]:
+    sr = sess.sample_rate if sess.binary_audio else int((sess.config or {}).get("sample_rate") or 16000)
+    msg: dict[str, Any] = {
+        "type": "ready",
+        "session_id": sess.session_id,
+        "resumed": True,
+        # hasta dónde llegó el audio: el cliente sigue desde ahí
+        "audio_ms": int(sess.audio.end / (sr * 2) * 1000),
+    }
+    if sess.binary_audio:
+        msg.update({"audio_transport": "binary", "format": sess.audio_format, "sample_rate": sess.sample_rate})
+    return msg
+
+async def _expire_detached(sid: str, grace_s: float) -> None:
+    try:
+        await asyncio.sleep(grace_s)
+    except asyncio.CancelledError:
+        # reanudada (o reemplazada por un start nuevo)
+        return
+    _detached.pop(sid, None)
+    _stt_router.cancel_jobs(sid)
+    _store.close(sid)
+    await _release(sid)
+
+@router.get("/stt/sessions/{session_id}")
+def stt_session_info(session_id: str) -> dict:
+    sess = _store.get(session_id)
+    registry = get_session_registry()
+    if sess is None:
+        owner = registry.remote_owner(stt_session_key(session_id))
+        if owner is not None:
+            raise SessionMovedError("session lives on another worker", worker_id=owner.worker_id, worker_url=owner.url)
+        raise NotFoundError("session not found", details={"session_id": session_id})
+    sr = sess.sample_rate if sess.binary_audio else int((sess.config or {}).get("sample_rate") or 16000)
+    return {
+        "session_id": session_id,
+        "worker_id": registry.worker_id,
+        "attached": session_id not in _detached,
+        "audio_ms": int(sess.audio.end / (sr * 2) * 1000),
+        "created_at": sess.created_at.isoformat(),
+    }
+
+@router.get("/stt/registry")
+def stt_registry_stats() -> dict:
+    return get_session_registry().stats()
+
+@router.get("/stt/scheduler")
+def stt_scheduler_stats() -> dict:
+    return _stt_router.scheduler.stats()
+
+@router.get("/stt/speculation")
+def stt_speculation_stats() -> dict:
+    return get_speculation_stats().stats()
 
 @router.websocket("/ws/stt")
 async def ws_stt(websocket: WebSocket) -> None:
     await websocket.accept()
 
     session_id: Optional[str] = None
+    # la sesión de este socket: otro start con el mismo id (reconexión) no se la lleva al cerrar
+    session: Optional[STTSession] = None
     partial_task: Optional[asyncio.Task] = None
+    final_task: Optional[asyncio.Task] = None
+    final_queue: asyncio.Queue[Optional[Utterance]] = asyncio.Queue()
+    # locución cuyo final aún no salió (vuelve a la sesión si se desconecta)
+    inflight_utt: Optional[Utterance] = None
+    # opt-in (config.llm en start): cada final se responde con el LLM por este socket
+    pipeline: Optional[STTLLMPipeline] = None
 
     async def send(msg: dict[str, Any]) -> None:
         await websocket.send_text(json.dumps(msg, ensure_ascii=False))
 
+    async def send_out(msg: dict[str, Any]) -> None:
+        await send(msg)
+        if pipeline is None or not msg.get("text"):
+            return
+        if msg.get("type") == "final":
+            pipeline.submit(msg["text"])
+        elif msg.get("type") == "partial":
+            pipeline.on_partial(msg["text"])
+
+    def start_pipeline(sid: str) -> Optional[dict[str, Any]]:
+        nonlocal pipeline
+        sess = _store.get(sid)
+        raw = (sess.config or {}).get("llm") if sess else None
+        if raw is None or pipeline is not None:
+            return None
+        try:
+            cfg = PipelineConfig.from_start(raw)
+        except ValueError as e:
+            return {"type": "error", "message": f"Invalid llm config: {e}", "session_id": sid}
+        pipeline = STTLLMPipeline(
+            sid,
+            cfg,
+            get_llm_router(),
+            send,
+            lambda e: to_app_error(e, cfg.provider or "").to_dict()["error"],
+        )
+        return None
+
     async def partial_loop(sid: str) -> None:
         sess = _store.get(sid)
         if not sess:
@@ -37,37 +185,229 @@ async def ws_stt(websocket: WebSocket) -> None:
         every_s = float(config.get("partial_every_s") or 1.6)
         min_window_s = float(config.get("partial_min_window_s") or 2.0)
 
-        last_text = ""
+        # incremental: solo ventana final + solape, el resto queda confirmado
+        incremental = hasattr(provider, "transcribe_segments")
+        # en un resume se conserva lo ya confirmado
+        engine = sess.partial_engine or IncrementalPartialEngine.from_config(config)
+        sess.partial_engine = engine if incremental else None
+        retain_s = _pick_retain_s(config)
+
+        min_new_s = float(config.get("partial_min_new_s") or 0.5)
+        # el primer parcial, como antes, no antes de every_s desde el start
+        sess.last_partial_at = time.monotonic()
+
         while True:
-            await asyncio.sleep(every_s)
+            # dirigido por llegada de audio: sin audio nuevo no hay whisper
+            await sess.audio_event.wait()
+            sess.audio_event.clear()
+            audio_at = time.monotonic()
+            # total = desde que llegó el audio hasta que sale el parcial
+            timings = _new_timings(config)
 
             sess2 = _store.get(sid)
             if not sess2:
-                return 
+                return
+
+            # como mucho un parcial cada every_s
+            wait_s = sess2.last_partial_at + every_s - time.monotonic()
+            if wait_s > 0:
+                await asyncio.sleep(wait_s)
+                if not _store.get(sid):
+                    return
 
             sr = int((sess2.config or {}).get("sample_rate") or 16000)
 
-            snap = _store.snapshot_audio(sid)
-            if not snap:
+            total_bytes = _store.audio_len(sid)
+            if not total_bytes:
                 continue
 
-            seconds = len(snap) / (sr * 2)
+            seconds = total_bytes / (sr * 2)
             if seconds < min_window_s:
                 continue
 
+            if total_bytes - sess2.partial_audio_mark < estimate_pcm16_bytes(min_new_s, sr):
+                continue
+
+            # con VAD: solo la locución en curso; en silencio no se llama a whisper
+            floor = 0
+            if sess2.vad is not None:
+                utt_start = sess2.vad.utterance_start
+                if utt_start is None:
+                    continue
+                floor = utt_start
+
+            sess2.partial_dirty = False
+            sess2.partial_audio_mark = total_bytes
+
+            if incremental:
+                total_ms = int(seconds * 1000)
+                floor_ms = int(floor / (sr * 2) * 1000)
+                if engine.committed_until_ms < floor_ms:
+                    engine.reset(floor_ms)
+                window_s = min(engine.window_seconds(total_ms), (total_ms - floor_ms) / 1000)
+                snap = _store.snapshot_last_seconds(sid, window_s, sr)
+                offset_ms = total_ms - int(len(snap) / (sr * 2) * 1000)
+                generation = engine.generation
+                sess2.partial_running = True
+                try:
+                    with use_timings(timings):
+                        segments = await _stt_router.transcribe(
+                            sid, snap, sess2.config, kind=JobKind.partial, segments=True
+                        )
+                except JobSuperseded:
+                    # llegó otro parcial (o un final) antes de arrancar: se descarta
+                    continue
+                except JobCancelled:
+                    return
+                except Exception:
+                    segments = []
+                finally:
+                    sess2.partial_running = False
+                    sess2.last_partial_at = time.monotonic()
+                if generation != engine.generation:
+                    # la locución se cerró mientras transcribíamos
+                    continue
+                update = engine.update(segments, offset_ms, total_ms)
+                text = update.text
+
+                if retain_s > 0:
+                    # el audio confirmado más allá de la retención ya no hace falta
+                    keep_s = max(retain_s, engine.overlap_s)
+                    release_s = engine.committed_until_ms / 1000 - keep_s
+                    if release_s > 0:
+                        _store.release_audio_before(sid, estimate_pcm16_bytes(release_s, sr))
+
+                if text and text != sess2.last_partial_text:
+                    sess2.last_partial_text = text
+                    chunk = TranscriptChunk.partial(text, sid, start_ms=update.start_ms, end_ms=update.end_ms)
+                    STT_PARTIAL_LAG_SECONDS.observe(time.monotonic() - audio_at)
+                    await send_out(_with_timings({
+                        "type": "partial",
+                        "session_id": sid,
+                        "text": chunk.text,
+                        "committed": update.committed,
+                        "tail": update.tail,
+                        "start_ms": chunk.start_ms,
+                        "end_ms": chunk.end_ms,
+                    }, timings, config, "stt.partial"))
+                continue
+
+            snap = _store.snapshot_from(sid, floor) if floor else _store.snapshot_audio(sid)
+            sess2.partial_running = True
             try:
-                text = await provider.transcribe_pcm(snap, sess2.config)
+                with use_timings(timings):
+                    text = await _stt_router.transcribe(sid, snap, sess2.config, kind=JobKind.partial)
                 text = (text or "").strip()
+            except JobSuperseded:
+                continue
+            except JobCancelled:
+                return
             except Exception:
                 text = ""
+            finally:
+                sess2.partial_running = False
+                sess2.last_partial_at = time.monotonic()
+
+            if text and text != sess2.last_partial_text:
+                sess2.last_partial_text = text
+                STT_PARTIAL_LAG_SECONDS.observe(time.monotonic() - audio_at)
+                await send_out(_with_timings(
+                    {"type": "partial", "session_id": sid, "text": text}, timings, config, "stt.partial"
+                ))
+
+    async def final_loop(sid: str) -> None:
+        nonlocal inflight_utt
+        # un final por locución detectada por el VAD, en orden
+        while True:
+            utt = await final_queue.get()
+            if utt is None:
+                return
+            inflight_utt = utt
 
-            if text and text != last_text:
-                last_text = text
-                await send({"type": "partial", "session_id": sid, "text": text})
+            sess2 = _store.get(sid)
+            if not sess2:
+                return
+
+            config = sess2.config or {}
+            sr = int(config.get("sample_rate") or 16000)
+            pcm = _store.snapshot_range(sid, utt.start, utt.end)
+            timings = _new_timings(config)
+
+            try:
+                with use_timings(timings):
+                    text = (await _stt_router.transcribe(sid, pcm, config, kind=JobKind.final) or "").strip()
+            except Exception:
+                text = ""
+
+            if text:
+                chunk = TranscriptChunk.final(
+                    text,
+                    sid,
+                    start_ms=int(utt.start / (sr * 2) * 1000),
+                    end_ms=int(utt.end / (sr * 2) * 1000),
+                )
+                await send_out(_with_timings({
+                    "type": "final",
+                    "session_id": sid,
+                    "text": chunk.text,
+                    "start_ms": chunk.start_ms,
+                    "end_ms": chunk.end_ms,
+                }, timings, config, "stt.final"))
+
+            # final entregado: el audio de la locución ya no se necesita
+            _store.release_audio_before(sid, utt.end)
+            inflight_utt = None
+
+    def detach(sess: STTSession) -> None:
+        # sin final: la locución en curso y las encoladas vuelven a la sesión
+        pending = [inflight_utt] if inflight_utt is not None else []
+        while not final_queue.empty():
+            utt = final_queue.get_nowait()
+            if utt is not None:
+                pending.append(utt)
+        sess.utterances[:0] = pending
+        sess.partial_running = False
+        _detached[sess.session_id] = asyncio.create_task(
+            _expire_detached(sess.session_id, get_settings().STT_RESUME_GRACE_S)
+        )
+
+    def enqueue_utterances(sid: Optional[str], *, flush: bool = False) -> None:
+        nonlocal final_task
+        utterances = _stt_router.pop_utterances(sid, flush=flush)
+        if not sid or not utterances:
+            return
+
+        sess2 = _store.get(sid)
+        if sess2 and sess2.partial_engine is not None:
+            # los parciales siguen desde el final de la última locución
+            sr = int((sess2.config or {}).get("sample_rate") or 16000)
+            sess2.partial_engine.reset(int(utterances[-1].end / (sr * 2) * 1000))
+
+        if final_task is None:
+            final_task = asyncio.create_task(final_loop(sid))
+        for utt in utterances:
+            final_queue.put_nowait(utt)
 
     try:
         while True:
-            raw = await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            # frames binarios = PCM crudo (modo negociado en start), sin JSON ni base64
+            data = message.get("bytes")
+            if data is not None:
+                new_session_id, out_messages, should_close = await _stt_router.handle_audio_bytes(data, session_id)
+                session_id = new_session_id if new_session_id else session_id
+                for out in out_messages:
+                    await send_out(out)
+                enqueue_utterances(session_id)
+                if should_close:
+                    await websocket.close()
+                    return
+                continue
+
+            raw = message.get("text") or ""
 
             try:
                 msg = json.loads(raw)
@@ -82,15 +422,57 @@ async def ws_stt(websocket: WebSocket) -> None:
             msg_type = msg.get("type")
 
             if msg_type == "start":
-                new_session_id, out_messages, should_close = await _stt_router.handle(msg, session_id)
-                session_id = new_session_id if new_session_id else session_id
+                sid = msg.get("session_id")
+                resumed = False
+                if isinstance(sid, str) and sid:
+                    expiry = _detached.pop(sid, None)
+                    if expiry is not None:
+                        expiry.cancel()
+                        if msg.get("resume") is True and _store.get(sid) is not None:
+                            resumed = True
+                        else:
+                            # start normal sobre una sesión desconectada: la vieja se descarta
+                            _stt_router.cancel_jobs(sid)
+                            _store.close(sid)
+                    if not resumed:
+                        owner = await _claim(sid)
+                        if owner is not None:
+                            # el audio de esta sesión vive en otro worker
+                            await send(_moved(sid, owner))
+                            await websocket.close(code=CLOSE_REDIRECT if owner.url else CLOSE_OWNED_ELSEWHERE)
+                            return
+
+                if resumed:
+                    session_id = sid
+                    session = _store.get(sid)
+                    await send(_resumed_ready(session))
+                    should_close = False
+                else:
+                    new_session_id, out_messages, should_close = await _stt_router.handle(msg, session_id)
+                    if new_session_id is None and isinstance(sid, str) and sid and _store.get(sid) is None:
+                        await _release(sid)
+                    session_id = new_session_id if new_session_id else session_id
+                    if new_session_id:
+                        session = _store.get(new_session_id)
+
+                    for out in out_messages:
+                        if msg.get("resume") is True and out.get("type") == "ready":
+                            # pidió resume pero no había nada que reanudar
+                            out["resumed"] = False
+                        await send(out)
 
-                for out in out_messages:
-                    await send(out)
+                if session_id:
+                    err = start_pipeline(session_id)
+                    if err is not None:
+                        await send(err)
 
                 if session_id and partial_task is None:
                     partial_task = asyncio.create_task(partial_loop(session_id))
 
+                if resumed:
+                    # locuciones que quedaron sin final al desconectar
+                    enqueue_utterances(session_id)
+
                 if should_close:
                     await websocket.close()
                     return
@@ -100,7 +482,8 @@ async def ws_stt(websocket: WebSocket) -> None:
                 new_session_id, out_messages, should_close = await _stt_router.handle(msg, session_id)
                 session_id = new_session_id if new_session_id else session_id
                 for out in out_messages:
-                    await send(out)
+                    await send_out(out)
+                enqueue_utterances(session_id)
                 if should_close:
                     await websocket.close()
                     return
@@ -111,26 +494,69 @@ async def ws_stt(websocket: WebSocket) -> None:
                     partial_task.cancel()
                     try:
                         await partial_task
-                    except Exception:
+                    except (asyncio.CancelledError, Exception):
                         pass
                     partial_task = None
+                # ningún parcial de esta sesión debe quitarle CPU al final
+                _stt_router.cancel_jobs(session_id, JobKind.partial)
 
                 if session_id:
                     sess2 = _store.get(session_id)
-                    if sess2:
+                    if sess2 and sess2.vad is not None:
+                        # con VAD el final es por locución: cerrar la que esté abierta
+                        enqueue_utterances(session_id, flush=True)
+                        if final_task is not None:
+                            final_queue.put_nowait(None)
+                            try:
+                                await final_task
+                            except Exception:
+                                pass
+                            final_task = None
+                    elif sess2:
                         provider = _stt_router._pick_provider(sess2.config)
                         if hasattr(provider, "transcribe_pcm"):
-                            snap = _store.snapshot_audio(session_id)
-                            if snap:
+                            engine = sess2.partial_engine
+                            committed = ""
+                            if engine is not None and sess2.audio.start > 0:
+                                # parte del audio ya se liberó: final = confirmado + resto
+                                sr = int((sess2.config or {}).get("sample_rate") or 16000)
+                                committed = engine.committed_text
+                                snap = _store.snapshot_from(
+                                    session_id, estimate_pcm16_bytes(engine.committed_until_ms / 1000, sr)
+                                )
+                            else:
+                                snap = _store.snapshot_audio(session_id)
+                            if snap or committed:
+                                timings = _new_timings(sess2.config or {})
                                 try:
-                                    final_text = await provider.transcribe_pcm(snap, sess2.config)
-                                    final_text = (final_text or "").strip()
+                                    with use_timings(timings):
+                                        final_text = (
+                                            await _stt_router.transcribe(session_id, snap, sess2.config, kind=JobKind.final)
+                                            if snap
+                                            else ""
+                                        )
+                                    final_text = " ".join(t for t in (committed, (final_text or "").strip()) if t)
                                     if final_text:
-                                        await send({"type": "final", "session_id": session_id, "text": final_text})
+                                        await send_out(_with_timings(
+                                            {"type": "final", "session_id": session_id, "text": final_text},
+                                            timings,
+                                            sess2.config or {},
+                                            "stt.final",
+                                        ))
                                 except Exception:
                                     pass
-                    
+                        else:
+                            # providers sin transcribe_pcm cierran vía on_stop
+                            _, out_messages, _ = await _stt_router.handle(msg, session_id)
+                            for out in out_messages:
+                                await send_out(out)
+
                     _store.close(session_id)
+                    await _release(session_id)
+
+                if pipeline is not None:
+                    # las respuestas en curso salen antes de cerrar
+                    await pipeline.drain()
 
                 await websocket.close()
                 return
@@ -140,6 +566,16 @@ async def ws_stt(websocket: WebSocket) -> None:
     except WebSocketDisconnect:
         if partial_task:
             partial_task.cancel()
-        if session_id:
-            _store.close(session_id)
+        if final_task:
+            final_task.cancel()
+        if pipeline is not None:
+            pipeline.cancel()
+        # nadie va a leer el resultado: mata los whisper de la sesión ya
+        _stt_router.cancel_jobs(session_id)
+        if session_id and session is not None and _store.get(session_id) is session:
+            if get_settings().STT_RESUME_GRACE_S > 0:
+                detach(session)
+            else:
+                _store.close(session_id)
+                await _release(session_id)
         return
\ No newline at end of file
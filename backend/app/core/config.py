@@ -15,6 +15,101 @@ class Settings(BaseSettings):
     WHISPER_CPP_BIN: str | None = None
     WHISPER_CPP_MODEL: str | None = None
     WHISPER_CPP_LANG: str | None = None
+    # entrada de audio al CLI: auto | stdin | memfd | file (auto prueba y recuerda)
+    WHISPER_IO_MODE: str = "auto"
+    # trabajos whisper simultáneos por worker (0 = auto: STT_CPU_BUDGET // STT_THREADS_MIN)
+    WHISPER_MAX_CONCURRENCY: int = 0
+    # scheduler global de transcripción: núcleos a repartir y -t por trabajo
+    STT_CPU_BUDGET: int = 0  # de la máquina, 0 = os.cpu_count(); cada worker usa / WORKERS
+    STT_THREADS_MIN: int = 2
+    STT_THREADS_MAX: int = 8
+    # segundos de audio ya confirmado que se retienen por sesión (0 = todo)
+    STT_RETAIN_COMMITTED_S: float = 0.0
+    # VAD delante de whisper (config.vad=false lo desactiva por sesión)
+    STT_VAD_ENABLED: bool = True
+    # LLM especulativo sobre parciales estables (config.llm.speculate en el WS)
+    STT_LLM_SPECULATE_STABLE_MS: int = 700
+    STT_LLM_SPECULATE_MAX_ATTEMPTS: int = 3  # lanzamientos por turno
+    STT_LLM_SPECULATE_MAX_INFLIGHT: int = 8  # simultáneas en todo el worker
+
+    # pool de whisper-server persistentes (modelo cargado en memoria)
+    WHISPER_SERVER_BIN: str | None = None
+    WHISPER_POOL_ENABLED: bool = False
+    WHISPER_POOL_SIZE: int = 1
+    # -t de cada whisper-server; el scheduler STT reserva estos hilos por trabajo del pool
+    WHISPER_POOL_THREADS: int = 0
+    WHISPER_POOL_HOST: str = "127.0.0.1"
+    WHISPER_POOL_STARTUP_TIMEOUT_S: float = 60.0
+    WHISPER_POOL_HEALTH_INTERVAL_S: float = 10.0
+    # timeout por petición al pool si la sesión no manda config.timeout_s
+    WHISPER_POOL_REQUEST_TIMEOUT_S: float = 120.0
+
+    # clientes HTTP compartidos de los providers LLM (uno por provider + base_url)
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY_S: float = 30.0
+    LLM_HTTP2: bool = False  # requiere el paquete h2
+    # endpoint de Gemini (cambiarlo solo para proxies o el mock de bench/)
+    GEMINI_BASE_URL: str = "https://generativelanguage.googleapis.com"
+
+    # caché de respuestas LLM (memoria LRU + TTL, opcionalmente SQLite)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_TTL_S: float = 3600.0
+    LLM_CACHE_SQLITE_PATH: str | None = None
+    # solo se cachean peticiones con temperature <= este valor
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.0
+
+    # /llm/batch: peticiones simultáneas por provider (compartido entre batches)
+    LLM_BATCH_MAX_CONCURRENCY: int = 4
+    LLM_BATCH_MAX_ITEMS: int = 100
+
+    # límites por provider, ej. {"openai_compat": {"rpm": 500, "tpm": 200000}} (0/ausente = sin límite)
+    LLM_RATE_LIMITS: dict[str, dict[str, float]] = {}
+    # espera máxima en cola + backoff antes de devolver 429
+    LLM_RATE_LIMIT_MAX_WAIT_S: float = 30.0
+    LLM_RETRY_MAX_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY_S: float = 0.5
+    LLM_RETRY_MAX_DELAY_S: float = 20.0
+
+    # routing por latencia (config.targets): EWMA, hedging y circuit breaker
+    LLM_ROUTING_EWMA_ALPHA: float = 0.2
+    LLM_HEDGE_DEFAULT_DELAY_MS: float = 1500.0  # hasta tener muestras para el p95
+    LLM_HEDGE_MIN_DELAY_MS: float = 200.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_OPEN_S: float = 30.0
+
+    # conversaciones en servidor (conversation_id): el cliente manda solo lo nuevo
+    LLM_CONVERSATION_TTL_S: float = 3600.0
+    LLM_CONVERSATION_MAX: int = 1000
+    # presupuesto de contexto (tokens estimados) antes de llamar al provider
+    LLM_CONTEXT_BUDGET_TOKENS: int = 3000
+    LLM_CONTEXT_KEEP_LAST: int = 4  # turnos recientes que nunca se recortan
+    LLM_CONTEXT_SUMMARIZE: bool = False  # resumir lo recortado con el propio LLM
+    LLM_CONTEXT_SUMMARY_MAX_TOKENS: int = 200
+
+    # varios workers (run.py): WORKERS procesos comparten PORT (SO_REUSEPORT) y
+    # cada uno escucha además en PORT + 1 + i para las redirecciones de afinidad
+    WORKERS: int = 1
+    PUBLIC_HOST: str = "127.0.0.1"  # host con el que los clientes llegan a cada worker
+    WORKER_ID: str | None = None  # None = hostname-pid
+    WORKER_URL: str | None = None  # URL directa de este worker (la pone run.py)
+    # registro de dueños de sesión: memory (un proceso) | sqlite (compartido)
+    SESSION_REGISTRY: str = "memory"
+    SESSION_REGISTRY_SQLITE_PATH: str | None = None
+    SESSION_REGISTRY_TTL_S: float = 30.0
+    # segundos que una sesión STT sobrevive a una desconexión para reanudarla
+    # (start con resume=true); 0 = se cierra al desconectar
+    STT_RESUME_GRACE_S: float = 0.0
+
+    # label model de /metrics: solo estos modelos (vacío = los primeros
+    # LLM_METRICS_MAX_MODELS que se vean); el resto cuenta como "other"
+    LLM_METRICS_MODELS: list[str] = []
+    LLM_METRICS_MAX_MODELS: int = 20
+
+    # spans de tiempo por petición en el log (una línea JSON en app.timings)
+    TIMINGS_LOG: bool = False
+    TIMINGS_LOG_SLOW_MS: float = 0.0  # >0: solo peticiones más lentas que esto
 
     model_config = SettingsConfigDict(
         env_file=".env",
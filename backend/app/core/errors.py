@@ -29,9 +29,30 @@ class ConfigError(AppError):
     def __init__(self, message: str, *, details: Optional[dict[str, Any]] = None) -> None:
         super().__init__(message=message, code="CONFIG_ERROR", status_code=400, details=details or {})
 
+class NotFoundError(AppError):
+    def __init__(self, message: str, *, details: Optional[dict[str, Any]] = None) -> None:
+        super().__init__(message=message, code="NOT_FOUND", status_code=404, details=details or {})
+
+class SessionMovedError(AppError):
+    # la sesión vive en otro worker: 307 a su URL directa (421 si no se puede redirigir)
+    def __init__(self, message: str, *, worker_id: str, worker_url: Optional[str] = None) -> None:
+        d: dict[str, Any] = {"worker_id": worker_id}
+        if worker_url:
+            d["worker_url"] = worker_url
+        super().__init__(message=message, code="SESSION_MOVED", status_code=307 if worker_url else 421, details=d)
+
 class ProviderError(AppError):
     def __init__(self, message: str, *, provider: str = "", details: Optional[dict[str, Any]] = None) -> None:
         d = details or {}
         if provider:
             d = {**d, "provider": provider}
-        super().__init__(message=message, code="PROVIDER_ERROR", status_code=502, details=d)
\ No newline at end of file
+        super().__init__(message=message, code="PROVIDER_ERROR", status_code=502, details=d)
+
+class RateLimitError(AppError):
+    def __init__(self, message: str, *, provider: str = "", retry_after_s: Optional[float] = None) -> None:
+        d: dict[str, Any] = {}
+        if provider:
+            d["provider"] = provider
+        if retry_after_s is not None:
+            d["retry_after_s"] = round(retry_after_s, 3)
+        super().__init__(message=message, code="RATE_LIMITED", status_code=429, details=d)
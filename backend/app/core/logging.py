@@ -1,6 +1,13 @@
 from __future__ import annotations
+import json
 import logging
 import sys
+from typing import Any
+
+from app.core.config import get_settings
+from app.core.timing import Timings
+
+_timings_logger = logging.getLogger("app.timings")
 
 def setup_logging(level: str = "INFO") -> None:
     numeric_level = getattr(logging, level.upper(), logging.INFO)
@@ -14,3 +21,13 @@ def setup_logging(level: str = "INFO") -> None:
 
     logging.getLogger("uvicorn.error").setLevel(numeric_level)
     logging.getLogger("uvicorn.access").setLevel(numeric_level)
+
+def log_timings(event: str, timings: Timings, **fields: Any) -> None:
+    # una línea JSON por petición (TIMINGS_LOG); con TIMINGS_LOG_SLOW_MS solo las lentas
+    s = get_settings()
+    if not s.TIMINGS_LOG:
+        return
+    spans = timings.to_dict()
+    if spans["total"] < s.TIMINGS_LOG_SLOW_MS:
+        return
+    _timings_logger.info(json.dumps({"event": event, **fields, "timings_ms": spans}, ensure_ascii=False, default=str))
@@ -0,0 +1,199 @@
+from __future__ import annotations
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Optional, Union
+
+# Métricas en formato de texto Prometheus sin dependencias externas. Todo corre
+# en el event loop (un hilo), así que no hay locks: una observación es un par
+# de operaciones de dict.
+
+LabelKey = tuple[str, ...]
+GaugeFn = Callable[[], Union[float, dict[LabelKey, float]]]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+
+    def _key(self, labels: dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _labels(self, key: LabelKey, extra: str = "") -> str:
+        parts = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        ...
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: dict[LabelKey, float] = {}
+        self._fn: Optional[GaugeFn] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: GaugeFn) -> None:
+        # valor calculado al hacer scrape (p.ej. tamaño de una cola): coste cero en el hot path
+        self._fn = fn
+
+    def value(self, **labels: Any) -> float:
+        return self._current().get(self._key(labels), 0.0)
+
+    def _current(self) -> dict[LabelKey, float]:
+        if self._fn is None:
+            return self._values
+        v = self._fn()
+        return v if isinstance(v, dict) else {(): float(v)}
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {_fmt(v)}" for k, v in self._current().items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [conteo por bucket (no acumulado) + overflow, suma]
+        self._counts: dict[LabelKey, list[int]] = {}
+        self._sums: dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = [0] * (len(self.buckets) + 1)
+            self._counts[key] = counts
+            self._sums[key] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def count(self, **labels: Any) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self) -> list[str]:
+        out: list[str] = []
+        for key, counts in self._counts.items():
+            acc = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                acc += n
+                le = 'le="' + _fmt(bound) + '"'
+                out.append(f"{self.name}_bucket{self._labels(key, le)} {acc}")
+            out.append(f"{self.name}_sum{self._labels(key)} {_fmt(self._sums[key])}")
+            out.append(f"{self.name}_count{self._labels(key)} {acc}")
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> Any:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        return "".join(m.render() for m in self._metrics.values())
+
+
+REGISTRY = MetricsRegistry()
+
+# --- STT ---
+STT_ACTIVE_SESSIONS = REGISTRY.gauge("prompter_stt_active_sessions", "Sesiones STT abiertas")
+STT_AUDIO_BYTES = REGISTRY.counter("prompter_stt_audio_bytes_total", "Bytes de audio PCM recibidos", ("transport",))
+STT_TRANSCRIBE_SECONDS = REGISTRY.histogram(
+    "prompter_stt_transcription_seconds", "Tiempo de whisper por trabajo (sin cola)", ("provider", "kind")
+)
+STT_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "prompter_stt_queue_wait_seconds", "Espera en el scheduler antes de arrancar whisper", ("kind",)
+)
+STT_REAL_TIME_FACTOR = REGISTRY.histogram(
+    "prompter_stt_real_time_factor",
+    "Segundos de proceso por segundo de audio",
+    ("provider", "kind"),
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0),
+)
+STT_PARTIAL_LAG_SECONDS = REGISTRY.histogram(
+    "prompter_stt_partial_lag_seconds", "Desde que llega audio nuevo hasta que sale el parcial"
+)
+STT_QUEUE_DEPTH = REGISTRY.gauge("prompter_stt_queue_depth", "Trabajos whisper en cola", ("kind",))
+STT_JOBS_RUNNING = REGISTRY.gauge("prompter_stt_jobs_running", "Trabajos whisper en curso")
+STT_ERRORS = REGISTRY.counter("prompter_stt_errors_total", "Errores de transcripción", ("provider", "kind"))
+WHISPER_RUNS = REGISTRY.counter(
+    "prompter_whisper_runs_total", "Ejecuciones de whisper por backend de E/S", ("backend", "outcome")
+)
+
+# --- LLM ---
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "prompter_llm_request_seconds", "Latencia de /llm/generate vía LLMRouter", ("provider", "model", "outcome")
+)
+LLM_ERRORS = REGISTRY.counter("prompter_llm_errors_total", "Errores del LLM", ("provider", "model", "error"))
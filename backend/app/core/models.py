@@ -43,9 +43,33 @@ class TranscriptChunk(BaseModel):
     end_ms: Optional[int] = None
 
     @staticmethod
-    def partial(text: str, session_id: Optional[str] = None) -> "TranscriptChunk":
-        return TranscriptChunk(kind=TranscriptKind.partial, text=text, session_id=session_id, is_final=False)
+    def partial(
+        text: str,
+        session_id: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> "TranscriptChunk":
+        return TranscriptChunk(
+            kind=TranscriptKind.partial,
+            text=text,
+            session_id=session_id,
+            is_final=False,
+            start_ms=start_ms,
+            end_ms=end_ms,
+        )
 
     @staticmethod
-    def final(text: str, session_id: Optional[str] = None) -> "TranscriptChunk":
-        return TranscriptChunk(kind=TranscriptKind.final, text=text, session_id=session_id, is_final=True)
\ No newline at end of file
+    def final(
+        text: str,
+        session_id: Optional[str] = None,
+        start_ms: Optional[int] = None,
+        end_ms: Optional[int] = None,
+    ) -> "TranscriptChunk":
+        return TranscriptChunk(
+            kind=TranscriptKind.final,
+            text=text,
+            session_id=session_id,
+            is_final=True,
+            start_ms=start_ms,
+            end_ms=end_ms,
+        )
\ No newline at end of file
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import time
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+from contextlib import contextmanager
+
+# Spans de tiempo por petición. El Timings activo viaja en un contextvar, así
+# que los servicios anotan sin recibirlo como parámetro; sin Timings activo
+# span() devuelve un no-op compartido (coste: un ContextVar.get).
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("prompter_timings", default=None)
+
+
+class Timings:
+    __slots__ = ("started", "_spans")
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        # nombre -> segundos acumulados (reintentos del mismo paso se suman)
+        self._spans: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self._spans[name] = self._spans.get(name, 0.0) + max(0.0, seconds)
+
+    def total_s(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> dict[str, float]:
+        out = {name: round(s * 1000, 1) for name, s in self._spans.items()}
+        out["total"] = round(self.total_s() * 1000, 1)
+        return out
+
+    def server_timing(self) -> str:
+        # cabecera Server-Timing (la ven las devtools del navegador)
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.to_dict().items())
+
+
+class _Span:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: Timings, name: str) -> None:
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        return None
+
+
+_NO_SPAN = _NoSpan()
+
+
+def current_timings() -> Optional[Timings]:
+    return _current.get()
+
+
+def span(name: str) -> Any:
+    t = _current.get()
+    return _Span(t, name) if t is not None else _NO_SPAN
+
+
+def record(name: str, seconds: float) -> None:
+    t = _current.get()
+    if t is not None:
+        t.add(name, seconds)
+
+
+@contextmanager
+def use_timings(timings: Optional[Timings]) -> Iterator[Optional[Timings]]:
+    # activa un Timings en el contexto actual (tarea); None lo desactiva
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
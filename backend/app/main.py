@@ -1,5 +1,7 @@
 from __future__ import annotations
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -9,15 +11,28 @@ from app.core.config import get_settings
 from app.core.logging import setup_logging
 from app.api.providers import router as providers_router
 from app.api.llm import router as llm_router
-from app.core.errors import AppError
+from app.core.errors import AppError, SessionMovedError
+from app.services.http_clients import get_http_clients
+from app.services.session_registry import get_session_registry
+from app.services.whisper_pool import get_whisper_pool
 
 logger = logging.getLogger("app")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    get_session_registry().start()
+    yield
+    await get_session_registry().aclose()
+    await get_http_clients().aclose()
+    await get_whisper_pool().aclose()
+    # un pool cerrado no se reutiliza: el próximo arranque (tests, reload) crea otro
+    get_whisper_pool.cache_clear()
+
 def create_app() -> FastAPI:
     settings = get_settings()
     setup_logging(settings.LOG_LEVEL)
 
-    app = FastAPI(title=settings.APP_NAME)
+    app = FastAPI(title=settings.APP_NAME, lifespan=lifespan)
 
     origins = settings.CORS_ORIGINS or ["http://localhost:4200", "null"]
 
@@ -44,7 +59,14 @@ def create_app() -> FastAPI:
             exc.code,
             extra={"details": exc.details},
         )
-        return JSONResponse(status_code=exc.status_code, content=exc.to_dict())
+        headers = None
+        if isinstance(exc, SessionMovedError) and exc.details.get("worker_url"):
+            # 307 conserva método y body: el cliente repite la petición en el dueño
+            location = exc.details["worker_url"] + request.url.path
+            if request.url.query:
+                location += "?" + request.url.query
+            headers = {"Location": location}
+        return JSONResponse(status_code=exc.status_code, content=exc.to_dict(), headers=headers)
 
     @app.exception_handler(RequestValidationError)
     async def request_validation_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
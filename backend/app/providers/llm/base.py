@@ -1,7 +1,7 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
 @dataclass(frozen=True)
 class LLMMessage:
@@ -22,10 +22,54 @@ class LLMGenerateResponse:
     provider: str
     model: Optional[str] = None
     usage: dict[str, Any] | None = None
+    cached: bool = False
+
+@dataclass(frozen=True)
+class LLMStreamChunk:
+    # delta = texto nuevo; el último chunk trae done=True y el usage
+    # (LLMRouter.stream le añade provider y cached, como en LLMGenerateResponse)
+    delta: str = ""
+    done: bool = False
+    model: Optional[str] = None
+    usage: dict[str, Any] | None = None
+    provider: Optional[str] = None
+    cached: bool = False
+
+class LLMHTTPError(Exception):
+    # error HTTP del upstream (429/5xx se reintentan en LLMRouter)
+    def __init__(self, provider: str, status_code: int, body: str = "", retry_after_s: Optional[float] = None) -> None:
+        super().__init__(f"{provider} http {status_code}: {body[:500]}")
+        self.provider = provider
+        self.status_code = status_code
+        self.body = body
+        self.retry_after_s = retry_after_s
+
+    @property
+    def retryable(self) -> bool:
+        return self.status_code == 429 or self.status_code >= 500
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    # solo la forma en segundos (la fecha HTTP casi no se usa en APIs LLM)
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value.strip()))
+    except ValueError:
+        return None
 
 class LLMProvider(ABC):
     name: str
 
+    def check_config(self, config: dict[str, Any]) -> None:
+        # valida la config sin red (ValueError), antes de mirar la caché
+        return None
+
     @abstractmethod
     async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
-        ...
\ No newline at end of file
+        ...
+
+    async def stream(self, req: LLMGenerateRequest, config: dict[str, Any]) -> AsyncIterator[LLMStreamChunk]:
+        # providers sin streaming nativo: todo el texto en un único chunk
+        res = await self.generate(req, config)
+        yield LLMStreamChunk(delta=res.text)
+        yield LLMStreamChunk(done=True, model=res.model, usage=res.usage)
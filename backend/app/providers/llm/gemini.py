@@ -1,9 +1,17 @@
 from __future__ import annotations
-from typing import Any, Optional
-import httpx
+import json
+from typing import Any, AsyncIterator, Optional
+from app.core.config import get_settings
 from app.core.secrets import get_secret
-from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMProvider
-
+from app.providers.llm.base import (
+    LLMGenerateRequest,
+    LLMGenerateResponse,
+    LLMHTTPError,
+    LLMProvider,
+    LLMStreamChunk,
+    parse_retry_after,
+)
+from app.services.http_clients import get_http_clients
 
 class GeminiLLMProvider(LLMProvider):
     
@@ -26,6 +34,13 @@ class GeminiLLMProvider(LLMProvider):
 
         return (get_secret("GEMINI_API_KEY", required=False) or "").strip()
 
+    def check_config(self, config: dict[str, Any]) -> None:
+        if not self._pick_api_key(config):
+            raise ValueError("gemini requires config.api_key (or env GEMINI_API_KEY)")
+
+    def _base_url(self) -> str:
+        return get_settings().GEMINI_BASE_URL.rstrip("/")
+
     def _pick_timeout_s(self, config: dict[str, Any]) -> float:
         t = config.get("timeout_s", 30)
         if not isinstance(t, (int, float)) or t <= 0:
@@ -33,15 +48,17 @@ class GeminiLLMProvider(LLMProvider):
         return float(t)
 
     def _extract_system_prompt(self, config: dict[str, Any], req: LLMGenerateRequest) -> str:
+        # Gemini tiene una sola systemInstruction: se juntan todos los system
+        parts: list[str] = []
         sys = config.get("system_prompt")
         if isinstance(sys, str) and sys.strip():
-            return sys.strip()
+            parts.append(sys.strip())
 
         for m in req.messages:
             if (m.role or "").lower() == "system" and (m.content or "").strip():
-                return m.content.strip()
+                parts.append(m.content.strip())
 
-        return ""
+        return "\n\n".join(parts)
 
     def _to_gemini_contents(self, req: LLMGenerateRequest) -> list[dict[str, Any]]:
         
@@ -57,17 +74,13 @@ class GeminiLLMProvider(LLMProvider):
             contents.append({"role": gem_role, "parts": [{"text": text}]})
         return contents
 
-    async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+    def _build(self, req: LLMGenerateRequest, config: dict[str, Any]) -> tuple[str, str, float, dict[str, Any]]:
+        self.check_config(config)
         api_key = self._pick_api_key(config)
-        if not api_key:
-            raise ValueError("gemini requires config.api_key (or env GEMINI_API_KEY)")
 
         model = self._pick_model(config)
         timeout_s = self._pick_timeout_s(config)
 
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-        params = {"key": api_key}
-
         system_prompt = self._extract_system_prompt(config, req)
         contents = self._to_gemini_contents(req)
 
@@ -88,21 +101,64 @@ class GeminiLLMProvider(LLMProvider):
         if req.extra and isinstance(req.extra, dict):
             payload.update(req.extra)
 
-        async with httpx.AsyncClient(timeout=timeout_s) as client:
-            r = await client.post(url, params=params, json=payload)
-            if r.status_code >= 400:
-                raise ValueError(f"gemini http {r.status_code}: {r.text}")
-            data = r.json()
+        return api_key, model, timeout_s, payload
 
-        text: Optional[str] = None
+    def _candidate_text(self, data: dict[str, Any]) -> Optional[str]:
         try:
             parts = data["candidates"][0]["content"]["parts"]
-            text = "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+            return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
         except Exception:
-            text = None
+            return None
+
+    async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        api_key, model, timeout_s, payload = self._build(req, config)
+
+        base_url = self._base_url()
+        url = f"{base_url}/v1beta/models/{model}:generateContent"
+        params = {"key": api_key}
+
+        client = get_http_clients().get(self.name, base_url)
+        r = await client.post(url, params=params, json=payload, timeout=timeout_s)
+        if r.status_code >= 400:
+            raise LLMHTTPError(self.name, r.status_code, r.text, parse_retry_after(r.headers.get("retry-after")))
+        data = r.json()
+
+        text = self._candidate_text(data)
 
         if not text or not text.strip():
             raise ValueError("gemini: invalid response format (missing candidates[0].content.parts[].text)")
 
         usage = data.get("usageMetadata")
         return LLMGenerateResponse(text=text.strip(), provider=self.name, model=model, usage=usage)
+
+    async def stream(self, req: LLMGenerateRequest, config: dict[str, Any]) -> AsyncIterator[LLMStreamChunk]:
+        api_key, model, timeout_s, payload = self._build(req, config)
+
+        base_url = self._base_url()
+        url = f"{base_url}/v1beta/models/{model}:streamGenerateContent"
+        params = {"key": api_key, "alt": "sse"}
+
+        client = get_http_clients().get(self.name, base_url)
+        usage: dict[str, Any] | None = None
+
+        async with client.stream("POST", url, params=params, json=payload, timeout=timeout_s) as r:
+            if r.status_code >= 400:
+                body = (await r.aread()).decode("utf-8", errors="ignore")
+                raise LLMHTTPError(self.name, r.status_code, body, parse_retry_after(r.headers.get("retry-after")))
+
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    data = json.loads(line[5:].strip())
+                except json.JSONDecodeError:
+                    continue
+
+                # cada evento trae el usage acumulado: nos quedamos con el último
+                if data.get("usageMetadata"):
+                    usage = data["usageMetadata"]
+                text = self._candidate_text(data)
+                if text:
+                    yield LLMStreamChunk(delta=text)
+
+        yield LLMStreamChunk(done=True, model=model, usage=usage)
@@ -1,11 +1,15 @@
 from __future__ import annotations
-from typing import Any, Optional
-import httpx
+import json
+from typing import Any, AsyncIterator, Optional
 from app.providers.llm.base import (
     LLMGenerateRequest,
     LLMGenerateResponse,
+    LLMHTTPError,
     LLMProvider,
+    LLMStreamChunk,
+    parse_retry_after,
 )
+from app.services.http_clients import get_http_clients
 
 class OpenAICompatLLMProvider(LLMProvider):
     name = "openai_compat"
@@ -27,10 +31,10 @@ class OpenAICompatLLMProvider(LLMProvider):
 
         return base_url.rstrip("/"), api_key, model, float(timeout_s)
 
-    async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
-        base_url, api_key, model, timeout_s = self._validate(config)
+    def check_config(self, config: dict[str, Any]) -> None:
+        self._validate(config)
 
-        url = f"{base_url}/chat/completions"
+    def _payload(self, req: LLMGenerateRequest, model: str) -> dict[str, Any]:
         payload: dict[str, Any] = {
             "model": model,
             "messages": [{"role": m.role, "content": m.content} for m in req.messages],
@@ -40,16 +44,27 @@ class OpenAICompatLLMProvider(LLMProvider):
 
         if req.extra:
             payload.update(req.extra)
+        return payload
 
-        headers = {
+    def _headers(self, api_key: str) -> dict[str, str]:
+        return {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json",
         }
 
-        async with httpx.AsyncClient(timeout=timeout_s) as client:
-            r = await client.post(url, json=payload, headers=headers)
-            r.raise_for_status()
-            data = r.json()
+    async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        base_url, api_key, model, timeout_s = self._validate(config)
+
+        url = f"{base_url}/chat/completions"
+        payload = self._payload(req, model)
+        headers = self._headers(api_key)
+
+        # cliente compartido: reutiliza la conexión TLS entre peticiones
+        client = get_http_clients().get(self.name, base_url)
+        r = await client.post(url, json=payload, headers=headers, timeout=timeout_s)
+        if r.status_code >= 400:
+            raise LLMHTTPError(self.name, r.status_code, r.text, parse_retry_after(r.headers.get("retry-after")))
+        data = r.json()
 
         text: Optional[str] = None
         try:
@@ -61,4 +76,43 @@ class OpenAICompatLLMProvider(LLMProvider):
             raise ValueError("openai_compat: invalid response format (missing choices[0].message.content)")
 
         usage = data.get("usage")
-        return LLMGenerateResponse(text=text, provider=self.name, model=model, usage=usage)
\ No newline at end of file
+        return LLMGenerateResponse(text=text, provider=self.name, model=model, usage=usage)
+
+    async def stream(self, req: LLMGenerateRequest, config: dict[str, Any]) -> AsyncIterator[LLMStreamChunk]:
+        base_url, api_key, model, timeout_s = self._validate(config)
+
+        url = f"{base_url}/chat/completions"
+        payload = self._payload(req, model)
+        payload["stream"] = True
+        # usage en el último evento (algunos servers compatibles no lo soportan)
+        if config.get("stream_usage", True) and "stream_options" not in payload:
+            payload["stream_options"] = {"include_usage": True}
+
+        client = get_http_clients().get(self.name, base_url)
+        usage: dict[str, Any] | None = None
+
+        async with client.stream("POST", url, json=payload, headers=self._headers(api_key), timeout=timeout_s) as r:
+            if r.status_code >= 400:
+                body = (await r.aread()).decode("utf-8", errors="ignore")
+                raise LLMHTTPError(self.name, r.status_code, body, parse_retry_after(r.headers.get("retry-after")))
+
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data_s = line[5:].strip()
+                if data_s == "[DONE]":
+                    break
+                try:
+                    data = json.loads(data_s)
+                except json.JSONDecodeError:
+                    continue
+
+                if data.get("usage"):
+                    usage = data["usage"]
+
+                for choice in data.get("choices") or []:
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        yield LLMStreamChunk(delta=delta)
+
+        yield LLMStreamChunk(done=True, model=model, usage=usage)
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Optional
 
 @dataclass(frozen=True)
 class STTAudioFrame:
@@ -11,6 +11,13 @@ class STTAudioFrame:
     sample_rate: int
     chunk_index: int
 
+@dataclass(frozen=True)
+class STTSegment:
+    # tiempos relativos al inicio del audio transcrito
+    start_ms: int
+    end_ms: int
+    text: str
+
 class STTProvider(ABC):
     name: str
 
@@ -24,4 +31,8 @@ class STTProvider(ABC):
 
     @abstractmethod
     async def on_stop(self, session_id: str, config: dict[str, Any]) -> list[dict[str, Any]]:
-        ...
\ No newline at end of file
+        ...
+
+    def reserved_threads(self, config: dict[str, Any]) -> Optional[int]:
+        # hilos fijos que usa de verdad (pool whisper-server); None = los que dé el scheduler
+        return None
@@ -0,0 +1,267 @@
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Any, Optional
+
+from app.core.metrics import WHISPER_RUNS
+from app.core.timing import span
+from app.providers.stt.base import STTSegment
+
+logger = logging.getLogger("app.whisper_cli")
+
+
+class WhisperTimeoutError(ValueError):
+    pass
+
+
+class IOModeUnsupported(ValueError):
+    # el binario no sabe leer el audio por este modo (no es un fallo puntual)
+    pass
+
+
+async def _kill(proc: asyncio.subprocess.Process) -> None:
+    if proc.returncode is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+    # shield: aunque nos vuelvan a cancelar, recogemos el proceso (sin zombies)
+    await asyncio.shield(proc.wait())
+
+
+async def run_whisper(
+    cmd: list[str],
+    timeout_s: float,
+    label: str,
+    *,
+    stdin_data: Optional[bytes] = None,
+    pass_fds: tuple[int, ...] = (),
+) -> tuple[str, str]:
+    # la concurrencia la acota el TranscriptionScheduler (services/stt_scheduler)
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if stdin_data is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        pass_fds=pass_fds,
+    )
+
+    try:
+        out_b, err_b = await asyncio.wait_for(proc.communicate(stdin_data), timeout=timeout_s)
+    except asyncio.TimeoutError:
+        await _kill(proc)
+        raise WhisperTimeoutError(f"{label}: timeout after {timeout_s}s")
+    except asyncio.CancelledError:
+        # stop/desconexión: el hijo no debe seguir quemando CPU sin nadie esperando
+        await _kill(proc)
+        raise
+
+    out = (out_b or b"").decode("utf-8", errors="ignore").strip()
+    err = (err_b or b"").decode("utf-8", errors="ignore").strip()
+
+    if proc.returncode != 0:
+        raise ValueError(f"{label}: exit {proc.returncode}: {(err or out)[:500]}")
+
+    return out, err
+
+
+# --- entrega del audio a whisper-cli ---
+# stdin: "-f -" (whisper.cpp lee el WAV de stdin)
+# memfd: archivo anónimo en RAM heredado por el hijo como /dev/fd/N (Linux)
+# file:  directorio temporal + out.json/out.txt (comportamiento original)
+IO_MODES = ("stdin", "memfd", "file")
+
+# modo que funcionó por binario: se recuerda solo si los anteriores fallaron
+# por no estar soportados (un fallo puntual no fija el fallback)
+_io_mode_cache: dict[str, str] = {}
+
+# builds viejos que no entienden "-f -" avisan por stderr (a veces con exit 0)
+_READ_FAILED_RE = re.compile(r"failed to (read|open)", re.IGNORECASE)
+
+_STDOUT_SEGMENT_RE = re.compile(
+    r"^\[(\d+):(\d+):(\d+(?:\.\d+)?)\s*-->\s*(\d+):(\d+):(\d+(?:\.\d+)?)\]\s*(.*)$"
+)
+
+
+def _ts_ms(h: str, m: str, s: str) -> int:
+    return int((int(h) * 3600 + int(m) * 60 + float(s)) * 1000)
+
+
+def segments_from_stdout(out: str) -> list[STTSegment]:
+    # salida por defecto de whisper-cli: "[00:00:00.000 --> 00:00:02.000]  texto"
+    segments: list[STTSegment] = []
+    plain: list[str] = []
+    for line in out.splitlines():
+        m = _STDOUT_SEGMENT_RE.match(line.strip())
+        if m:
+            text = _clean_segment_text(m.group(7))
+            if text:
+                segments.append(STTSegment(start_ms=_ts_ms(*m.group(1, 2, 3)), end_ms=_ts_ms(*m.group(4, 5, 6)), text=text))
+        elif line.strip():
+            plain.append(line.strip())
+
+    if not segments and plain:
+        # -nt o builds que imprimen solo texto
+        text = _clean_segment_text(" ".join(plain))
+        if text:
+            segments.append(STTSegment(start_ms=0, end_ms=0, text=text))
+    return segments
+
+
+def resolve_io_mode(bin_path: str, requested: Any = None) -> list[str]:
+    mode = str(requested or "auto").strip().lower()
+    if mode in IO_MODES:
+        return [mode]
+    cached = _io_mode_cache.get(bin_path)
+    if cached:
+        return [cached]
+    modes = ["stdin"]
+    if hasattr(os, "memfd_create"):
+        modes.append("memfd")
+    modes.append("file")
+    return modes
+
+
+async def _run_stdin(bin_path: str, args: list[str], wav_bytes: bytes, timeout_s: float, label: str) -> list[STTSegment]:
+    out, err = await run_whisper([bin_path, *args, "-f", "-"], timeout_s, label, stdin_data=wav_bytes)
+    if not out and _READ_FAILED_RE.search(err):
+        raise IOModeUnsupported(f"{label}: stdin input not supported")
+    return segments_from_stdout(out)
+
+
+async def _run_memfd(bin_path: str, args: list[str], wav_bytes: bytes, timeout_s: float, label: str) -> list[STTSegment]:
+    try:
+        fd = os.memfd_create("prompter_audio")
+    except OSError as e:
+        raise IOModeUnsupported(f"{label}: memfd_create failed: {e}") from e
+    try:
+        with os.fdopen(os.dup(fd), "wb") as f:
+            f.write(wav_bytes)
+        out, err = await run_whisper(
+            [bin_path, *args, "-f", f"/dev/fd/{fd}"], timeout_s, label, pass_fds=(fd,)
+        )
+    finally:
+        os.close(fd)
+    if not out and _READ_FAILED_RE.search(err):
+        raise IOModeUnsupported(f"{label}: memfd input not supported")
+    return segments_from_stdout(out)
+
+
+async def _run_file(bin_path: str, args: list[str], wav_bytes: bytes, timeout_s: float, label: str) -> list[STTSegment]:
+    with tempfile.TemporaryDirectory(prefix="prompter_whisper_") as td:
+        wav_path = os.path.join(td, "audio.wav")
+        with open(wav_path, "wb") as f:
+            f.write(wav_bytes)
+
+        out_prefix = os.path.join(td, "out")
+        # -oj añade los timestamps por segmento (out.json)
+        cmd = [bin_path, *args, "-f", wav_path, "-otxt", "-oj", "-of", out_prefix]
+        out, _ = await run_whisper(cmd, timeout_s, label)
+
+        try:
+            with open(out_prefix + ".json", "r", encoding="utf-8", errors="ignore") as f:
+                return segments_from_cli_json(json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        try:
+            with open(out_prefix + ".txt", "r", encoding="utf-8", errors="ignore") as f:
+                text = _clean_segment_text(f.read())
+        except FileNotFoundError:
+            return segments_from_stdout(out)
+
+    return [STTSegment(start_ms=0, end_ms=0, text=text)] if text else []
+
+
+_RUNNERS = {"stdin": _run_stdin, "memfd": _run_memfd, "file": _run_file}
+
+
+async def transcribe_wav(
+    bin_path: str,
+    args: list[str],
+    wav_bytes: bytes,
+    timeout_s: float,
+    label: str,
+    io_mode: Any = None,
+    duration_ms: int = 0,
+) -> list[STTSegment]:
+    # args: todo menos la entrada/salida (-m, -l, -t...)
+    modes = resolve_io_mode(bin_path, io_mode)
+    last_error: Optional[ValueError] = None
+    # False si algún modo anterior falló por algo que no sea "no soportado"
+    definite = True
+
+    for mode in modes:
+        try:
+            with span("whisper_exec"):
+                segments = await _RUNNERS[mode](bin_path, args, wav_bytes, timeout_s, label)
+        except WhisperTimeoutError:
+            # un timeout no dice nada del modo de E/S: no probamos otro
+            WHISPER_RUNS.inc(backend=mode, outcome="timeout")
+            raise
+        except (ValueError, OSError) as e:
+            WHISPER_RUNS.inc(backend=mode, outcome="error")
+            last_error = e if isinstance(e, ValueError) else ValueError(f"{label}: {e}")
+            definite = definite and isinstance(e, IOModeUnsupported)
+            if len(modes) > 1:
+                logger.info("%s: io mode %s failed (%s), trying next", label, mode, e)
+            continue
+
+        WHISPER_RUNS.inc(backend=mode, outcome="ok")
+        if len(modes) > 1 and definite and bin_path not in _io_mode_cache:
+            _io_mode_cache[bin_path] = mode
+            logger.info("%s: using io mode %s for %s", label, mode, bin_path)
+        if duration_ms and segments and all(seg.end_ms == 0 for seg in segments):
+            # salida sin timestamps: un único segmento que cubre todo el audio
+            segments = [STTSegment(start_ms=0, end_ms=duration_ms, text=join_segments(segments))]
+        return segments
+
+    raise last_error or ValueError(f"{label}: no io mode available")
+
+
+# marcadores que whisper emite en silencio/ruido: no son texto
+_NON_SPEECH_RE = re.compile(r"^\s*[\[(][^\])]*[\])]\s*$")
+
+
+def _clean_segment_text(text: Any) -> str:
+    t = str(text or "").strip()
+    if not t or _NON_SPEECH_RE.match(t):
+        return ""
+    return t
+
+
+def segments_from_cli_json(data: dict[str, Any]) -> list[STTSegment]:
+    # salida de whisper-cli -oj: transcription[].offsets.{from,to} en ms
+    out: list[STTSegment] = []
+    for item in data.get("transcription") or []:
+        if not isinstance(item, dict):
+            continue
+        text = _clean_segment_text(item.get("text"))
+        offsets = item.get("offsets") or {}
+        if not text:
+            continue
+        out.append(STTSegment(start_ms=int(offsets.get("from") or 0), end_ms=int(offsets.get("to") or 0), text=text))
+    return out
+
+
+def segments_from_server_json(data: dict[str, Any]) -> list[STTSegment]:
+    # whisper-server response_format=verbose_json: segments[].{start,end} en segundos
+    out: list[STTSegment] = []
+    for item in data.get("segments") or []:
+        if not isinstance(item, dict):
+            continue
+        text = _clean_segment_text(item.get("text"))
+        if not text:
+            continue
+        start = float(item.get("start") or 0.0)
+        end = float(item.get("end") or start)
+        out.append(STTSegment(start_ms=int(start * 1000), end_ms=int(end * 1000), text=text))
+    return out
+
+
+def join_segments(segments: list[STTSegment]) -> str:
+    return " ".join(s.text for s in segments).strip()
@@ -1,14 +1,23 @@
 from __future__ import annotations
 
-import asyncio
 import os
-import tempfile
-import wave
 from pathlib import Path
 from typing import Any, Optional
 
+from app.core.config import get_settings
+from app.core.timing import span
 from app.providers.stt.base import STTAudioFrame, STTProvider
+from app.providers.stt.whisper_cli import join_segments, transcribe_wav
 from app.services.session_store import SessionStore
+from app.services.stt_scheduler import JobKind, TranscriptionScheduler, get_stt_scheduler
+from app.services.whisper_pool import (
+    get_whisper_pool,
+    pool_enabled,
+    pool_threads,
+    pool_timeout_s,
+    resolve_server_bin,
+)
+from app.utils.wav import pcm16_to_wav_bytes
 
 
 def _pick_int(v: Any, default: int) -> int:
@@ -19,20 +28,16 @@ def _pick_int(v: Any, default: int) -> int:
         return default
 
 
-def _write_wav_pcm16_mono(path: str, pcm16: bytes, sample_rate: int) -> None:
-    # PCM16 mono little-endian
-    with wave.open(path, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)
-        wf.setframerate(sample_rate)
-        wf.writeframes(pcm16)
-
-
 class WhisperCppSTTProvider(STTProvider):
     name = "whisper_cpp"
 
-    def __init__(self, store: SessionStore) -> None:
+    def __init__(self, store: SessionStore, scheduler: Optional[TranscriptionScheduler] = None) -> None:
         self.store = store
+        self.scheduler = scheduler or get_stt_scheduler()
+
+    def reserved_threads(self, config: dict[str, Any]) -> Optional[int]:
+        # con pool, whisper-server usa sus propios -t: se reservan esos en el scheduler
+        return pool_threads() if pool_enabled(config) else None
 
     def _paths(self, config: dict[str, Any]) -> tuple[Path, Path]:
         # config > env > defaults
@@ -55,10 +60,55 @@ class WhisperCppSTTProvider(STTProvider):
         # MVP: sin partials por ahora
         return []
 
+    async def _transcribe(self, pcm16: bytes, config: dict[str, Any], threads: int = 0) -> str:
+        bin_path, model_path = self._paths(config)
+        sample_rate = _pick_int(config.get("sample_rate"), 16000)
+        timeout_s = _pick_int(config.get("timeout_s"), 60)
+
+        lang = (config.get("language") or "auto").strip()
+
+        if pool_enabled(config):
+            # modelo residente en whisper-server: sin recargar el GGML por llamada
+            server_bin = resolve_server_bin(config, str(bin_path))
+            key = (server_bin, str(model_path), lang if lang != "auto" else "")
+            with span("wav_encode"):
+                wav_bytes = pcm16_to_wav_bytes(pcm16, sample_rate=sample_rate, channels=1)
+            data = await get_whisper_pool().transcribe(key, wav_bytes, pool_timeout_s(config))
+            text = str(data.get("text") or "").strip()
+            if not text:
+                raise ValueError("whisper_cpp: empty transcription output")
+            return text
+
+        args = ["-m", str(model_path)]
+        # language opcional
+        if lang and lang != "auto":
+            args += ["-l", lang]
+        # hilos asignados por el scheduler
+        if threads > 0:
+            args += ["-t", str(threads)]
+
+        with span("wav_encode"):
+            wav_bytes = pcm16_to_wav_bytes(pcm16, sample_rate=sample_rate, channels=1)
+        segments = await transcribe_wav(
+            str(bin_path),
+            args,
+            wav_bytes,
+            float(timeout_s),
+            "whisper_cpp",
+            io_mode=config.get("whisper_io") or get_settings().WHISPER_IO_MODE,
+        )
+        text = join_segments(segments)
+
+        if not text:
+            raise ValueError("whisper_cpp: empty transcription output")
+
+        return text
+
     async def on_stop(self, session_id: str, config: dict[str, Any]) -> list[dict[str, Any]]:
         bin_path, model_path = self._paths(config)
 
-        if not bin_path.exists():
+        # con pool solo hace falta whisper-server; el CLI es opcional
+        if not pool_enabled(config) and not bin_path.exists():
             raise ValueError(f"whisper_cpp: binary not found: {bin_path}")
         if not model_path.exists():
             raise ValueError(f"whisper_cpp: model not found: {model_path}")
@@ -67,43 +117,7 @@ class WhisperCppSTTProvider(STTProvider):
         if not pcm16:
             return [{"type": "final", "session_id": session_id, "text": ""}]
 
-        sample_rate = _pick_int(config.get("sample_rate"), 16000)
-        timeout_s = _pick_int(config.get("timeout_s"), 60)
-
-        lang = (config.get("language") or "auto").strip()
-
-        with tempfile.TemporaryDirectory(prefix="prompter_stt_") as td:
-            wav_path = str(Path(td) / "audio.wav")
-            _write_wav_pcm16_mono(wav_path, pcm16, sample_rate)
-
-            args = [str(bin_path), "-m", str(model_path), "-f", wav_path]
-
-            # language opcional
-            if lang and lang != "auto":
-                args += ["-l", lang]
-
-            proc = await asyncio.create_subprocess_exec(
-                *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-
-            try:
-                out_b, err_b = await asyncio.wait_for(proc.communicate(), timeout=timeout_s)
-            except asyncio.TimeoutError:
-                proc.kill()
-                raise ValueError(f"whisper_cpp: timeout after {timeout_s}s")
-
-            out = (out_b or b"").decode("utf-8", errors="ignore").strip()
-            err = (err_b or b"").decode("utf-8", errors="ignore").strip()
-
-            if proc.returncode != 0:
-                raise ValueError(f"whisper_cpp: exit {proc.returncode}: {err[:800]}")
-
-            text = out if out else err
-            text = (text or "").strip()
-
-            if not text:
-                raise ValueError("whisper_cpp: empty transcription output")
-
-            return [{"type": "final", "session_id": session_id, "text": text}]
+        text = await self.scheduler.submit(
+            session_id, JobKind.final, lambda t: self._transcribe(pcm16, config, t), self.reserved_threads(config)
+        )
+        return [{"type": "final", "session_id": session_id, "text": text}]
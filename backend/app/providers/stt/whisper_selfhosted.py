@@ -1,61 +1,105 @@
 from __future__ import annotations
 import os
 import shutil
-import tempfile
-import subprocess
-import asyncio
-import time
 from typing import Any, Optional
 from app.core.config import get_settings
-from app.providers.stt.base import STTAudioFrame, STTProvider
+from app.core.timing import span
+from app.providers.stt.base import STTAudioFrame, STTProvider, STTSegment
+from app.providers.stt.whisper_cli import join_segments, segments_from_server_json, transcribe_wav
 from app.services.session_store import SessionStore
+from app.services.stt_scheduler import JobKind, TranscriptionScheduler, get_stt_scheduler
+from app.services.whisper_pool import (
+    get_whisper_pool,
+    pool_enabled,
+    pool_threads,
+    pool_timeout_s,
+    resolve_server_bin,
+)
+from app.utils.audio import pcm16_duration_seconds
 from app.utils.wav import pcm16_to_wav_bytes
 
 
+def _duration_ms(pcm: bytes, sample_rate: int) -> int:
+    return int(pcm16_duration_seconds(len(pcm), sample_rate) * 1000)
+
+
 class WhisperSelfHostedSTTProvider(STTProvider):
     name = "whisper_selfhosted"
 
-    def __init__(self, store: SessionStore) -> None:
+    def __init__(self, store: SessionStore, scheduler: Optional[TranscriptionScheduler] = None) -> None:
         self.store = store
         self.settings = get_settings()
-        
-        
-    async def transcribe_pcm(self, pcm: bytes, config: dict[str, Any]) -> str:
-        sample_rate = int(config.get("sample_rate") or 16000)
-        wav_bytes = pcm16_to_wav_bytes(pcm, sample_rate=sample_rate, channels=1)
-
-        whisper_bin = self._pick_bin(config)
-        whisper_model = self._pick_model(config)
-        lang = self._pick_lang(config)
+        self.scheduler = scheduler or get_stt_scheduler()
 
-        with tempfile.TemporaryDirectory(prefix="prompter_whisper_") as td:
-            wav_path = os.path.join(td, "audio.wav")
-            with open(wav_path, "wb") as f:
-                f.write(wav_bytes)
+    def reserved_threads(self, config: dict[str, Any]) -> Optional[int]:
+        # con pool, whisper-server usa sus propios -t: se reservan esos en el scheduler
+        return pool_threads() if pool_enabled(config) else None
 
-            out_prefix = os.path.join(td, "out")
-
-            cmd = [
-                whisper_bin,
-                "-m", whisper_model,
-                "-f", wav_path,
-                "-otxt",
-                "-of", out_prefix,
-            ]
-            if lang:
-                cmd.extend(["-l", lang])
-
-            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if proc.returncode != 0:
-                return ""
+    async def _segments_via_pool(self, pcm: bytes, config: dict[str, Any]) -> list[STTSegment]:
+        sample_rate = int(config.get("sample_rate") or 16000)
+        with span("wav_encode"):
+            wav_bytes = pcm16_to_wav_bytes(pcm, sample_rate=sample_rate, channels=1)
+
+        server_bin = resolve_server_bin(config, self._pick_bin(config))
+        key = (server_bin, self._pick_model(config), self._pick_lang(config) or "")
+        data = await get_whisper_pool().transcribe(
+            key, wav_bytes, pool_timeout_s(config), response_format="verbose_json"
+        )
+        segments = segments_from_server_json(data)
+        if not segments and str(data.get("text") or "").strip():
+            segments = [STTSegment(start_ms=0, end_ms=_duration_ms(pcm, sample_rate), text=str(data["text"]).strip())]
+        return segments
+
+    def _pick_timeout_s(self, config: dict[str, Any]) -> float:
+        t = config.get("timeout_s", 60)
+        if not isinstance(t, (int, float)) or t <= 0:
+            return 60.0
+        return float(t)
+
+    async def _transcribe_segments(self, pcm: bytes, config: dict[str, Any], threads: int = 0) -> list[STTSegment]:
+        if pool_enabled(config):
+            return await self._segments_via_pool(pcm, config)
 
-            txt_file = out_prefix + ".txt"
-            try:
-                with open(txt_file, "r", encoding="utf-8", errors="ignore") as f:
-                    return f.read().strip()
-            except FileNotFoundError:
-                return (proc.stdout or "").strip()
+        sample_rate = int(config.get("sample_rate") or 16000)
+        with span("wav_encode"):
+            wav_bytes = pcm16_to_wav_bytes(pcm, sample_rate=sample_rate, channels=1)
 
+        whisper_bin = self._pick_bin(config)
+        args = ["-m", self._pick_model(config)]
+        lang = self._pick_lang(config)
+        if lang:
+            args.extend(["-l", lang])
+        if threads > 0:
+            args.extend(["-t", str(threads)])
+
+        # async: no bloquea el event loop mientras whisper trabaja
+        # el WAV va por stdin/memfd si el binario lo soporta (sin tocar disco)
+        return await transcribe_wav(
+            whisper_bin,
+            args,
+            wav_bytes,
+            self._pick_timeout_s(config),
+            "whisper.cpp failed",
+            io_mode=config.get("whisper_io") or self.settings.WHISPER_IO_MODE,
+            duration_ms=_duration_ms(pcm, sample_rate),
+        )
+
+    async def _transcribe(self, pcm: bytes, config: dict[str, Any], threads: int = 0) -> str:
+        return join_segments(await self._transcribe_segments(pcm, config, threads))
+
+    # transcribe_* no pasan por el scheduler: lo hace quien llama (STTRouter.transcribe)
+    async def transcribe_segments(self, pcm: bytes, config: dict[str, Any], threads: int = 0) -> list[STTSegment]:
+        try:
+            return await self._transcribe_segments(pcm, config, threads)
+        except ValueError:
+            return []
+
+    async def transcribe_pcm(self, pcm: bytes, config: dict[str, Any], threads: int = 0) -> str:
+        try:
+            return await self._transcribe(pcm, config, threads)
+        except ValueError:
+            # en parciales, no mates la sesión por fallos puntuales
+            return ""
 
     def _normalize_bin_path(self, p: str) -> str:
         p = p.strip()
@@ -130,49 +174,8 @@ class WhisperSelfHostedSTTProvider(STTProvider):
         return None
 
     async def _transcribe_pcm_to_text(self, pcm: bytes, config: dict[str, Any]) -> str:
-        sample_rate = int(config.get("sample_rate") or 16000)
-        wav_bytes = pcm16_to_wav_bytes(pcm, sample_rate=sample_rate, channels=1)
-    
-        whisper_bin = self._pick_bin(config)
-        whisper_model = self._pick_model(config)
-        lang = self._pick_lang(config)
-    
         # TIP: para parciales usa un modelo más rápido si quieres (base/small)
-        with tempfile.TemporaryDirectory(prefix="prompter_whisper_partial_") as td:
-            wav_path = os.path.join(td, "audio.wav")
-            with open(wav_path, "wb") as f:
-                f.write(wav_bytes)
-    
-            out_prefix = os.path.join(td, "out")
-    
-            cmd = [
-                whisper_bin,
-                "-m", whisper_model,
-                "-f", wav_path,
-                "-otxt",
-                "-of", out_prefix,
-            ]
-            if lang:
-                cmd.extend(["-l", lang])
-    
-            proc = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-    
-            if proc.returncode != 0:
-                # en parciales, no mates la sesión por fallos puntuales
-                return ""
-    
-            txt_file = out_prefix + ".txt"
-            try:
-                with open(txt_file, "r", encoding="utf-8", errors="ignore") as f:
-                    return f.read().strip()
-            except FileNotFoundError:
-                return (proc.stdout or "").strip()
-    
+        return await self.transcribe_pcm(pcm, config)
 
     async def on_start(self, session_id: str, config: dict[str, Any]) -> list[dict[str, Any]]:
         _ = self._pick_bin(config)
@@ -180,7 +183,7 @@ class WhisperSelfHostedSTTProvider(STTProvider):
 
         sess = self.store.get(session_id)
         if sess:
-            sess.audio_bytes.clear()
+            sess.audio.clear()
             sess.audio_chunks = 0
 
         return [{"type": "ready", "session_id": session_id}]
@@ -195,49 +198,7 @@ class WhisperSelfHostedSTTProvider(STTProvider):
         if not pcm:
             return [{"type": "final", "session_id": session_id, "text": ""}]
 
-        sample_rate = int(config.get("sample_rate") or 16000)
-        wav_bytes = pcm16_to_wav_bytes(pcm, sample_rate=sample_rate, channels=1)
-
-        whisper_bin = self._pick_bin(config)
-        whisper_model = self._pick_model(config)
-        lang = self._pick_lang(config)
-
-        with tempfile.TemporaryDirectory(prefix="prompter_whisper_") as td:
-            wav_path = os.path.join(td, "audio.wav")
-            with open(wav_path, "wb") as f:
-                f.write(wav_bytes)
-
-            out_prefix = os.path.join(td, "out")
-
-            # ✅ whisper-cli (nuevo) sigue aceptando -m -f -otxt -of
-            cmd = [
-                whisper_bin,
-                "-m", whisper_model,
-                "-f", wav_path,
-                "-otxt",
-                "-of", out_prefix,
-            ]
-            if lang:
-                cmd.extend(["-l", lang])
-
-            proc = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-            )
-
-            if proc.returncode != 0:
-                err = (proc.stderr or proc.stdout or "").strip()
-                raise ValueError(f"whisper.cpp failed: {err[:500]}")
-
-            txt_file = out_prefix + ".txt"
-            text = ""
-            try:
-                with open(txt_file, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read().strip()
-            except FileNotFoundError:
-                text = (proc.stdout or "").strip()
-
+        text = await self.scheduler.submit(
+            session_id, JobKind.final, lambda t: self._transcribe(pcm, config, t), self.reserved_threads(config)
+        )
         return [{"type": "final", "session_id": session_id, "text": text}]
-    
@@ -0,0 +1,119 @@
+from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMGenerateRequest, LLMMessage
+from app.services.conversation_store import Conversation
+
+if TYPE_CHECKING:
+    from app.services.llm_router import LLMRouter
+
+logger = logging.getLogger("app.context_budget")
+
+SUMMARY_PROMPT = (
+    "Resume la conversación en pocas frases, conservando nombres, cifras, "
+    "decisiones y preguntas abiertas. Responde solo con el resumen."
+)
+
+
+def estimate_message_tokens(m: LLMMessage) -> int:
+    # ~4 caracteres por token + overhead de rol/formato
+    return len(m.content or "") // 4 + 4
+
+
+def estimate_prompt_tokens(messages: list[LLMMessage]) -> int:
+    return sum(estimate_message_tokens(m) for m in messages)
+
+
+@dataclass
+class ContextReport:
+    prompt_tokens: int = 0
+    budget_tokens: int = 0
+    trimmed: int = 0
+    summarized: bool = False
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "prompt_tokens_est": self.prompt_tokens,
+            "budget_tokens": self.budget_tokens,
+            "trimmed": self.trimmed,
+            "summarized": self.summarized,
+        }
+
+
+@dataclass
+class ContextPlan:
+    kept: list[LLMMessage] = field(default_factory=list)
+    dropped: list[LLMMessage] = field(default_factory=list)
+
+
+def _pick_int(v: Any, default: int) -> int:
+    try:
+        n = int(v)
+        return n if n > 0 else default
+    except (TypeError, ValueError):
+        return default
+
+
+def budget_for(config: dict[str, Any]) -> int:
+    return _pick_int(config.get("context_budget_tokens"), get_settings().LLM_CONTEXT_BUDGET_TOKENS)
+
+
+def fit_context(messages: list[LLMMessage], budget: int, keep_last: int, fixed_tokens: int = 0) -> ContextPlan:
+    # se descartan los turnos más viejos (nunca los system ni los últimos keep_last)
+    plan = ContextPlan(kept=list(messages))
+    total = fixed_tokens + estimate_prompt_tokens(plan.kept)
+    i = 0
+    while total > budget and len(plan.kept) - i > keep_last:
+        m = plan.kept[i]
+        if m.role == "system":
+            i += 1
+            continue
+        plan.dropped.append(plan.kept.pop(i))
+        total -= estimate_message_tokens(m)
+    return plan
+
+
+async def _summarize(router: "LLMRouter", previous: str, dropped: list[LLMMessage], config: dict[str, Any]) -> str:
+    transcript = "\n".join(f"{m.role}: {m.content}" for m in dropped)
+    if previous:
+        transcript = f"Resumen previo: {previous}\n{transcript}"
+    req = LLMGenerateRequest(
+        messages=[LLMMessage(role="system", content=SUMMARY_PROMPT), LLMMessage(role="user", content=transcript)],
+        temperature=0.0,
+        max_tokens=get_settings().LLM_CONTEXT_SUMMARY_MAX_TOKENS,
+        provider=config.get("provider"),
+    )
+    res = await router.generate(req, {k: v for k, v in config.items() if k != "system_prompt"})
+    return res.text.strip()
+
+
+async def apply_context_budget(conv: Conversation, router: "LLMRouter", config: dict[str, Any]) -> ContextReport:
+    # recorta (o resume) el historial guardado para que el prompt quepa en el
+    # presupuesto: el coste por turno se mantiene plano aunque la reunión crezca
+    s = get_settings()
+    budget = budget_for(config)
+    keep_last = _pick_int(config.get("context_keep_last"), s.LLM_CONTEXT_KEEP_LAST)
+    summarize = config.get("summarize_context", s.LLM_CONTEXT_SUMMARIZE) is True
+
+    # system + resumen van siempre; si se va a resumir, reservamos su hueco
+    fixed = estimate_prompt_tokens(conv.head_messages())
+    if summarize and not conv.summary:
+        fixed += s.LLM_CONTEXT_SUMMARY_MAX_TOKENS
+
+    plan = fit_context(conv.messages, budget, keep_last, fixed_tokens=fixed)
+    report = ContextReport(budget_tokens=budget, trimmed=len(plan.dropped))
+
+    if plan.dropped and summarize:
+        try:
+            conv.summary = await _summarize(router, conv.summary, plan.dropped, config)
+            report.summarized = True
+        except Exception:
+            # sin resumen seguimos: mejor perder contexto viejo que fallar el turno
+            logger.warning("context summary failed for conversation %s, trimming only", conv.id, exc_info=True)
+
+    conv.messages = plan.kept
+    report.prompt_tokens = estimate_prompt_tokens(conv.prompt_messages())
+    return report
@@ -0,0 +1,121 @@
+from __future__ import annotations
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMMessage
+from app.services.session_registry import SessionRegistry, conversation_key, get_session_registry
+
+
+@dataclass
+class Conversation:
+    id: str
+    system_prompt: str = ""
+    # resumen de los turnos que ya salieron del contexto
+    summary: str = ""
+    messages: list[LLMMessage] = field(default_factory=list)
+    updated_at: float = field(default_factory=time.monotonic)
+    # una generación a la vez por conversación (el historial no se intercala)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
+
+    def head_messages(self) -> list[LLMMessage]:
+        # un único mensaje system: hay providers (gemini) que solo toman uno
+        parts: list[str] = []
+        if self.system_prompt:
+            parts.append(self.system_prompt)
+        if self.summary:
+            parts.append(f"Resumen de la conversación anterior: {self.summary}")
+        return [LLMMessage(role="system", content="\n\n".join(parts))] if parts else []
+
+    def prompt_messages(self) -> list[LLMMessage]:
+        return self.head_messages() + self.messages
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "system_prompt": self.system_prompt,
+            "summary": self.summary,
+            "messages": [{"role": m.role, "content": m.content} for m in self.messages],
+        }
+
+
+class ConversationStore:
+    # en memoria, LRU + TTL de inactividad: las reuniones largas no crecen sin límite
+
+    def __init__(
+        self, max_conversations: int = 1000, ttl_s: float = 3600.0, registry: Optional[SessionRegistry] = None
+    ) -> None:
+        self.max_conversations = max(1, max_conversations)
+        self.ttl_s = ttl_s
+        self._items: OrderedDict[str, Conversation] = OrderedDict()
+        # con varios workers: quién tiene cada conversación (para redirigir)
+        self.registry = registry
+        # un solo hilo: claim y release de una misma clave no se reordenan
+        self._registry_io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="conv-registry")
+
+    @classmethod
+    def from_settings(cls) -> "ConversationStore":
+        s = get_settings()
+        return cls(
+            max_conversations=s.LLM_CONVERSATION_MAX, ttl_s=s.LLM_CONVERSATION_TTL_S, registry=get_session_registry()
+        )
+
+    def _registry_call(self, fn: Callable[[str], Any], conversation_id: str) -> None:
+        # el registro puede ser SQLite: nunca en el event loop. Desde un hilo
+        # (endpoints sync) se llama directo.
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            fn(conversation_key(conversation_id))
+            return
+        loop.run_in_executor(self._registry_io, fn, conversation_key(conversation_id))
+
+    def _forget(self, conversation_id: str) -> None:
+        if self.registry is not None:
+            self._registry_call(self.registry.release, conversation_id)
+
+    def _expire(self) -> None:
+        limit = time.monotonic() - self.ttl_s
+        while self._items:
+            cid, conv = next(iter(self._items.items()))
+            if conv.updated_at >= limit and len(self._items) <= self.max_conversations:
+                break
+            del self._items[cid]
+            self._forget(cid)
+
+    def create(self, system_prompt: str = "", messages: Optional[list[LLMMessage]] = None) -> Conversation:
+        conv = Conversation(id=uuid.uuid4().hex, system_prompt=system_prompt.strip(), messages=list(messages or []))
+        self._items[conv.id] = conv
+        if self.registry is not None:
+            # id nuevo: el claim no puede perder contra otro worker
+            self._registry_call(self.registry.claim, conv.id)
+        self._expire()
+        return conv
+
+    def get(self, conversation_id: str) -> Optional[Conversation]:
+        self._expire()
+        conv = self._items.get(conversation_id)
+        if conv is not None:
+            conv.updated_at = time.monotonic()
+            self._items.move_to_end(conversation_id)
+        return conv
+
+    def delete(self, conversation_id: str) -> bool:
+        if self._items.pop(conversation_id, None) is None:
+            return False
+        self._forget(conversation_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+@lru_cache
+def get_conversation_store() -> ConversationStore:
+    return ConversationStore.from_settings()
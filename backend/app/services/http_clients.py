@@ -0,0 +1,94 @@
+from __future__ import annotations
+import asyncio
+import importlib.util
+import logging
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpx
+
+from app.core.config import Settings, get_settings
+
+logger = logging.getLogger("app.http_clients")
+
+
+class HTTPClientRegistry:
+    # Un AsyncClient de larga vida por (provider, base_url): las conexiones
+    # TCP/TLS se reutilizan entre peticiones. Se cierran en el lifespan.
+
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        self.settings = settings or get_settings()
+        self._clients: dict[tuple[str, str], httpx.AsyncClient] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._http2 = self._pick_http2()
+        # cierres en curso de clientes de un loop anterior (referencia fuerte)
+        self._closing: set[asyncio.Future] = set()
+
+    def _pick_http2(self) -> bool:
+        if not self.settings.LLM_HTTP2:
+            return False
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("LLM_HTTP2=true but package 'h2' is not installed, using HTTP/1.1")
+            return False
+        return True
+
+    def _new_client(self) -> httpx.AsyncClient:
+        s = self.settings
+        limits = httpx.Limits(
+            max_connections=s.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=s.LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=s.LLM_HTTP_KEEPALIVE_EXPIRY_S,
+        )
+        # el timeout real va por petición (config.timeout_s)
+        return httpx.AsyncClient(limits=limits, http2=self._http2, timeout=30.0)
+
+    def get(self, provider: str, base_url: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # las conexiones viven en un event loop: con otro loop empezamos de cero
+            self._close_stale(list(self._clients.values()), self._loop)
+            self._clients = {}
+            self._loop = loop
+
+        key = (provider, base_url.rstrip("/"))
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._new_client()
+            self._clients[key] = client
+        return client
+
+    async def _aclose_quietly(self, client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+        except Exception:
+            logger.debug("error closing stale http client", exc_info=True)
+
+    def _close_stale(self, clients: list[httpx.AsyncClient], loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        if not clients:
+            return
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            # su loop sigue vivo (otro hilo): se cierran allí
+            for client in clients:
+                asyncio.run_coroutine_threadsafe(self._aclose_quietly(client), loop)
+            return
+        # loop terminado: cierre best effort desde el loop actual
+        for client in clients:
+            fut = asyncio.ensure_future(self._aclose_quietly(client))
+            self._closing.add(fut)
+            fut.add_done_callback(self._closing.discard)
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await self._aclose_quietly(client)
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {"provider": provider, "base_url": base_url, "http2": self._http2}
+            for provider, base_url in self._clients
+        ]
+
+
+@lru_cache
+def get_http_clients() -> HTTPClientRegistry:
+    return HTTPClientRegistry()
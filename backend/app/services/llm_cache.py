@@ -0,0 +1,201 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse
+
+logger = logging.getLogger("app.llm_cache")
+
+
+def credential_hash(config: dict[str, Any]) -> str:
+    # la api_key separa entradas sin guardarla (mismo hash que el rate limiter)
+    api_key = config.get("api_key")
+    if not isinstance(api_key, str) or not api_key:
+        return ""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(provider: str, req: LLMGenerateRequest, config: dict[str, Any]) -> str:
+    # hash canónico de todo lo que cambia la respuesta y de quién la pidió
+    canonical = {
+        "provider": provider,
+        "credential": credential_hash(config),
+        "base_url": str(config.get("base_url") or "").rstrip("/"),
+        "model": config.get("model") or "",
+        "system_prompt": config.get("system_prompt") or "",
+        "messages": [[m.role, m.content] for m in req.messages],
+        "temperature": req.temperature,
+        "max_tokens": req.max_tokens,
+        "extra": req.extra or {},
+    }
+    targets = config.get("targets")
+    if isinstance(targets, list):
+        # grupo de routing: cada destino con el hash de su propia api_key
+        canonical["targets"] = [
+            [t.get("provider"), str(t.get("base_url") or "").rstrip("/"), t.get("model"), credential_hash(t)]
+            for t in targets
+            if isinstance(t, dict)
+        ]
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _SQLiteTier:
+    # segundo nivel en disco: sobrevive a reinicios. Cada operación abre su
+    # conexión y corre en un hilo para no bloquear el event loop.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def _get(self, key: str) -> Optional[tuple[float, str]]:
+        with self._connect() as db:
+            row = db.execute("SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            return float(row[0]), str(row[1])
+
+    def _put(self, key: str, expires_at: float, value: str) -> None:
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, value),
+            )
+
+    def _clear(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM llm_cache")
+
+    async def get(self, key: str) -> Optional[tuple[float, str]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, expires_at: float, value: str) -> None:
+        await asyncio.to_thread(self._put, key, expires_at, value)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear)
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        sqlite_path: Optional[str] = None,
+        max_temperature: float = 0.0,
+    ) -> None:
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.max_temperature = max_temperature
+        # key -> (expires_at en time.time(), respuesta)
+        self._mem: OrderedDict[str, tuple[float, LLMGenerateResponse]] = OrderedDict()
+        self._disk: Optional[_SQLiteTier] = None
+        if sqlite_path:
+            try:
+                self._disk = _SQLiteTier(sqlite_path)
+            except sqlite3.Error:
+                logger.exception("llm cache: cannot open sqlite tier at %s, using memory only", sqlite_path)
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls) -> "LLMResponseCache":
+        s = get_settings()
+        return cls(
+            max_entries=s.LLM_CACHE_MAX_ENTRIES,
+            ttl_s=s.LLM_CACHE_TTL_S,
+            sqlite_path=s.LLM_CACHE_SQLITE_PATH,
+            max_temperature=s.LLM_CACHE_MAX_TEMPERATURE,
+        )
+
+    def cacheable(self, req: LLMGenerateRequest, config: dict[str, Any]) -> bool:
+        # opt-out por petición (config.cache=false); con temperatura alta se
+        # espera variedad, así que no se cachea
+        if config.get("cache") is False or not get_settings().LLM_CACHE_ENABLED:
+            return False
+        return req.temperature <= self.max_temperature
+
+    def _remember(self, key: str, expires_at: float, res: LLMGenerateResponse) -> None:
+        self._mem[key] = (expires_at, res)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[LLMGenerateResponse]:
+        now = time.time()
+        entry = self._mem.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._mem[key]
+
+        if self._disk is not None:
+            try:
+                row = await self._disk.get(key)
+            except sqlite3.Error:
+                logger.exception("llm cache: sqlite read failed")
+                row = None
+            if row is not None:
+                res = LLMGenerateResponse(**json.loads(row[1]))
+                self._remember(key, row[0], res)
+                self.hits += 1
+                self.disk_hits += 1
+                return res
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, res: LLMGenerateResponse) -> None:
+        expires_at = time.time() + self.ttl_s
+        self._remember(key, expires_at, res)
+        if self._disk is not None:
+            try:
+                await self._disk.put(key, expires_at, json.dumps(asdict(res), ensure_ascii=False))
+            except sqlite3.Error:
+                logger.exception("llm cache: sqlite write failed")
+
+    async def clear(self) -> None:
+        self._mem.clear()
+        if self._disk is not None:
+            await self._disk.clear()
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "sqlite": self._disk.path if self._disk is not None else None,
+        }
+
+
+@lru_cache
+def get_llm_cache() -> LLMResponseCache:
+    return LLMResponseCache.from_settings()
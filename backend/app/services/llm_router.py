@@ -1,15 +1,57 @@
 from __future__ import annotations
-from typing import Any
-from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMProvider
+import asyncio
+import random
+import time
+from dataclasses import replace
+from functools import lru_cache
+from typing import Any, AsyncIterator, Optional
+import httpx
+from app.core.config import get_settings
+from app.core.metrics import LLM_ERRORS, LLM_REQUEST_SECONDS
+from app.core.timing import record, span
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMHTTPError, LLMProvider, LLMStreamChunk
 from app.providers.llm.openai_compat import OpenAICompatLLMProvider
 from app.providers.llm.gemini import GeminiLLMProvider
+from app.services.llm_cache import LLMResponseCache, cache_key, get_llm_cache
+from app.services.llm_routing import LLMHealthTracker, TargetKey, get_llm_health, target_key
+from app.services.rate_limiter import ProviderRateLimiter, RateLimitTimeout, get_rate_limiter
+from app.services.singleflight import SingleFlight
+
+def _target_failed(e: BaseException) -> bool:
+    # fallo del target (5xx/429/red): cuenta para el circuito y pasa al siguiente.
+    # Un 4xx o una config inválida son errores de la petición: se devuelven tal cual.
+    if isinstance(e, LLMHTTPError):
+        return e.retryable
+    return isinstance(e, httpx.TransportError)
 
 class LLMRouter:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        cache: Optional[LLMResponseCache] = None,
+        limiter: Optional[ProviderRateLimiter] = None,
+        health: Optional[LLMHealthTracker] = None,
+    ) -> None:
         self._providers: dict[str, LLMProvider] = {
             OpenAICompatLLMProvider.name: OpenAICompatLLMProvider(),
             GeminiLLMProvider.name: GeminiLLMProvider(),
         }
+        self.cache = cache or get_llm_cache()
+        self.limiter = limiter or get_rate_limiter()
+        self.health = health or get_llm_health()
+        self._inflight: SingleFlight[LLMGenerateResponse] = SingleFlight()
+        # cupos de /llm/batch por provider (ligados al event loop que los creó)
+        self._batch_slots: dict[str, asyncio.Semaphore] = {}
+        self._batch_loop: Optional[asyncio.AbstractEventLoop] = None
+        # modelos con serie propia en /metrics (el cliente elige el nombre)
+        self._metric_models: set[str] = set()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "cache": self.cache.stats(),
+            "coalescing": self._inflight.stats(),
+            "rate_limit": self.limiter.stats(),
+            "routing": self.health.stats(),
+        }
 
     def list_providers(self) -> list[str]:
         return sorted(self._providers.keys())
@@ -23,6 +65,283 @@ class LLMRouter:
             raise ValueError(f"Unknown LLM provider: {name}")
         return provider
 
+    def _max_wait_s(self, config: dict[str, Any]) -> float:
+        v = config.get("max_wait_s")
+        if isinstance(v, (int, float)) and v >= 0:
+            return float(v)
+        return get_settings().LLM_RATE_LIMIT_MAX_WAIT_S
+
+    def _backoff_s(self, attempt: int) -> float:
+        s = get_settings()
+        # exponencial con jitter: evita que todos reintenten a la vez
+        return min(s.LLM_RETRY_MAX_DELAY_S, s.LLM_RETRY_BASE_DELAY_S * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    async def _call(self, provider: LLMProvider, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        # cola del rate limiter + reintentos (429/5xx/red) dentro del mismo presupuesto de espera
+        budget = self._max_wait_s(config)
+        attempts = max(1, get_settings().LLM_RETRY_MAX_ATTEMPTS)
+        waited = 0.0
+
+        for attempt in range(attempts):
+            t0 = time.monotonic()
+            await self.limiter.acquire(provider.name, req, config, t0 + budget - waited)
+            waited += time.monotonic() - t0
+            record("llm_queue", time.monotonic() - t0)
+
+            try:
+                with span("llm_upstream"):
+                    return await provider.generate(req, config)
+            except LLMHTTPError as e:
+                if not e.retryable or attempt == attempts - 1:
+                    raise
+                delay = e.retry_after_s if e.retry_after_s is not None else self._backoff_s(attempt)
+                if e.status_code == 429:
+                    # el resto de peticiones con esta key también esperan
+                    self.limiter.penalize(provider.name, config, delay)
+                if waited + delay > budget:
+                    raise
+            except httpx.TransportError:
+                if attempt == attempts - 1:
+                    raise
+                delay = self._backoff_s(attempt)
+                if waited + delay > budget:
+                    raise
+
+            with span("llm_backoff"):
+                await asyncio.sleep(delay)
+            waited += delay
+
+        raise RuntimeError("unreachable")
+
+    def _targets(self, req: LLMGenerateRequest, config: dict[str, Any]) -> list[dict[str, Any]]:
+        # cada target se superpone a la config base (sin la lista de targets)
+        base = {k: v for k, v in config.items() if k != "targets"}
+        out = []
+        for t in config.get("targets") or []:
+            if not isinstance(t, dict):
+                raise ValueError("config.targets items must be objects")
+            merged = {**base, **t}
+            merged["provider"] = t.get("provider") or req.provider or base.get("provider") or "openai_compat"
+            self._pick_provider(merged, None).check_config(merged)
+            out.append(merged)
+        return out
+
+    async def _attempt(self, key: TargetKey, req: LLMGenerateRequest, target: dict[str, Any]) -> LLMGenerateResponse:
+        provider = self._pick_provider(target, None)
+        t0 = time.monotonic()
+        try:
+            res = await self._call(provider, req, target)
+        except asyncio.CancelledError:
+            self.health.abandon(key)
+            raise
+        except Exception as e:
+            if _target_failed(e):
+                self.health.record(key, time.monotonic() - t0, ok=False)
+            else:
+                self.health.abandon(key)
+            raise
+        self.health.record(key, time.monotonic() - t0, ok=True)
+        return res
+
+    async def _generate_routed(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        # el target más rápido y sano del grupo; con hedge, un segundo intento si
+        # el primero tarda más que su p95 (gana el primero que responda)
+        targets = {target_key(t): t for t in self._targets(req, config)}
+        ranked = self.health.rank(list(targets))
+        if not ranked:
+            raise LLMHTTPError("router", 503, "all targets have an open circuit")
+
+        hedge = bool(config.get("hedge"))
+        pending: set[asyncio.Task[LLMGenerateResponse]] = set()
+        last_error: Optional[Exception] = None
+        queue = list(ranked)
+
+        def launch() -> None:
+            key = queue.pop(0)
+            self.health.claim(key)
+            pending.add(asyncio.create_task(self._attempt(key, req, targets[key])))
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if hedge and queue and len(pending) == 1:
+                    timeout = self.health.hedge_delay_s(ranked[0], config.get("hedge_after_ms"))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # el primario va lento: segundo intento en paralelo
+                    launch()
+                    continue
+
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                    # cola local llena: otro target puede tener cupo
+                    if not isinstance(last_error, RateLimitTimeout) and not _target_failed(last_error):
+                        raise last_error
+
+                if not pending and queue:
+                    # falló: siguiente target del ranking
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error or LLMHTTPError("router", 503, "no target answered")
+
+    def _metric_labels(self, req: LLMGenerateRequest, config: dict[str, Any]) -> dict[str, str]:
+        # labels acotados: un cliente no puede crear series nuevas sin límite
+        if config.get("targets"):
+            provider = "routed"
+        else:
+            name = req.provider or config.get("provider") or "openai_compat"
+            provider = name if name in self._providers else "unknown"
+
+        s = get_settings()
+        model = config.get("model")
+        model = model if isinstance(model, str) else ""
+        if s.LLM_METRICS_MODELS:
+            if model not in s.LLM_METRICS_MODELS:
+                model = "other"
+        elif model not in self._metric_models:
+            if len(self._metric_models) < s.LLM_METRICS_MAX_MODELS:
+                self._metric_models.add(model)
+            else:
+                model = "other"
+        return {"provider": provider, "model": model}
+
     async def generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        labels = self._metric_labels(req, config)
+        started = time.monotonic()
+        try:
+            res = await self._generate(req, config)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e.status_code) if isinstance(e, LLMHTTPError) else type(e).__name__
+            LLM_ERRORS.inc(error=error, **labels)
+            LLM_REQUEST_SECONDS.observe(time.monotonic() - started, outcome="error", **labels)
+            raise
+        LLM_REQUEST_SECONDS.observe(time.monotonic() - started, outcome="cached" if res.cached else "ok", **labels)
+        return res
+
+    async def _generate(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        routed = bool(config.get("targets"))
+        provider = None if routed else self._pick_provider(config, req.provider)
+        if provider is not None:
+            # una config inválida nunca se responde desde la caché
+            provider.check_config(config)
+        cacheable = self.cache.cacheable(req, config)
+        coalesce = config.get("coalesce") is not False
+
+        async def upstream() -> LLMGenerateResponse:
+            if provider is None:
+                return await self._generate_routed(req, config)
+            return await self._call(provider, req, config)
+
+        if not cacheable and not coalesce:
+            return await upstream()
+
+        key = cache_key(provider.name if provider else "routed", req, config)
+        if cacheable:
+            with span("llm_cache"):
+                hit = await self.cache.get(key)
+            if hit is not None:
+                return replace(hit, cached=True)
+
+        async def fetch() -> LLMGenerateResponse:
+            res = await upstream()
+            if cacheable:
+                await self.cache.put(key, res)
+            return res
+
+        if not coalesce:
+            return await fetch()
+        # peticiones idénticas en vuelo (misma api_key incluida) comparten una sola llamada upstream
+        return await self._inflight.do(key, fetch)
+
+    async def stream(self, req: LLMGenerateRequest, config: dict[str, Any]) -> AsyncIterator[LLMStreamChunk]:
+        if config.get("targets"):
+            # en streaming no hay hedge: el mejor target del ranking
+            targets = {target_key(t): t for t in self._targets(req, config)}
+            ranked = self.health.rank(list(targets))
+            if not ranked:
+                raise LLMHTTPError("router", 503, "all targets have an open circuit")
+            config = targets[ranked[0]]
+            req = replace(req, provider=config["provider"])
         provider = self._pick_provider(config, req.provider)
-        return await provider.generate(req, config)
+        provider.check_config(config)
+        key = cache_key(provider.name, req, config) if self.cache.cacheable(req, config) else None
+
+        if key is not None:
+            hit = await self.cache.get(key)
+            if hit is not None:
+                yield LLMStreamChunk(delta=hit.text)
+                yield LLMStreamChunk(done=True, model=hit.model, usage=hit.usage, provider=hit.provider, cached=True)
+                return
+
+        await self.limiter.acquire(provider.name, req, config, time.monotonic() + self._max_wait_s(config))
+
+        parts: list[str] = []
+        try:
+            async for chunk in provider.stream(req, config):
+                parts.append(chunk.delta)
+                if chunk.done and key is not None and "".join(parts).strip():
+                    # solo streams completos entran en la caché
+                    await self.cache.put(
+                        key,
+                        LLMGenerateResponse(text="".join(parts), provider=provider.name, model=chunk.model, usage=chunk.usage),
+                    )
+                if chunk.done:
+                    chunk = replace(chunk, provider=provider.name)
+                yield chunk
+        except LLMHTTPError as e:
+            # sin reintento (ya pudo salir texto), pero el 429 frena a los siguientes
+            if e.status_code == 429:
+                self.limiter.penalize(provider.name, config, e.retry_after_s or self._backoff_s(0))
+            raise
+
+    def _batch_slot(self, provider_name: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._batch_loop is not loop:
+            self._batch_slots = {}
+            self._batch_loop = loop
+        sem = self._batch_slots.get(provider_name)
+        if sem is None:
+            sem = asyncio.Semaphore(max(1, get_settings().LLM_BATCH_MAX_CONCURRENCY))
+            self._batch_slots[provider_name] = sem
+        return sem
+
+    async def _generate_in_batch(self, req: LLMGenerateRequest, config: dict[str, Any]) -> LLMGenerateResponse:
+        provider = self._pick_provider(config, req.provider)
+        async with self._batch_slot(provider.name):
+            return await self.generate(req, config)
+
+    async def batch(
+        self, items: list[tuple[LLMGenerateRequest, dict[str, Any]]]
+    ) -> AsyncIterator[tuple[int, LLMGenerateResponse | Exception]]:
+        # todas concurrentes (acotadas por provider); se entregan según terminan
+        async def run(i: int, req: LLMGenerateRequest, config: dict[str, Any]) -> tuple[int, LLMGenerateResponse | Exception]:
+            try:
+                return i, await self._generate_in_batch(req, config)
+            except Exception as e:
+                return i, e
+
+        tasks = [asyncio.create_task(run(i, req, config)) for i, (req, config) in enumerate(items)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            # el cliente se fue a mitad: no seguimos gastando cuota
+            for t in tasks:
+                if not t.done():
+                    t.cancel()
+
+
+@lru_cache
+def get_llm_router() -> LLMRouter:
+    # compartido por /llm y el pipeline del WS: misma caché, coalescing y cupos
+    return LLMRouter()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.core.config import get_settings
+
+# (provider, base_url, model)
+TargetKey = tuple[str, str, str]
+
+
+def target_key(config: dict[str, Any]) -> TargetKey:
+    return (
+        str(config.get("provider") or "openai_compat"),
+        str(config.get("base_url") or "").rstrip("/"),
+        str(config.get("model") or ""),
+    )
+
+
+@dataclass
+class TargetHealth:
+    ewma_latency_s: Optional[float] = None
+    ewma_error: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=200))
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    half_open: bool = False
+    requests: int = 0
+    failures: int = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < 5:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+class LLMHealthTracker:
+    # EWMA de latencia/errores por target y circuit breaker:
+    # closed -> (N fallos seguidos) open -> (tras open_s) half-open: una prueba
+
+    def __init__(self) -> None:
+        self._targets: dict[TargetKey, TargetHealth] = {}
+
+    def _get(self, key: TargetKey) -> TargetHealth:
+        h = self._targets.get(key)
+        if h is None:
+            h = TargetHealth()
+            self._targets[key] = h
+        return h
+
+    def available(self, key: TargetKey) -> bool:
+        h = self._get(key)
+        if h.open_until == 0.0:
+            return True
+        # abierto y vencido: admite una sola petición de prueba a la vez
+        return time.monotonic() >= h.open_until and not h.half_open
+
+    def claim(self, key: TargetKey) -> None:
+        # se va a usar el target: si el circuito estaba abierto, esta es la prueba
+        h = self._get(key)
+        if h.open_until != 0.0:
+            h.half_open = True
+
+    def score(self, key: TargetKey) -> float:
+        h = self._get(key)
+        # sin datos = 0: se prueba pronto y empieza a tener estadística
+        if h.ewma_latency_s is None:
+            return 0.0
+        return h.ewma_latency_s * (1.0 + 4.0 * h.ewma_error)
+
+    def rank(self, keys: list[TargetKey]) -> list[TargetKey]:
+        healthy = [k for k in keys if self.available(k)]
+        return sorted(healthy, key=self.score)
+
+    def hedge_delay_s(self, key: TargetKey, configured_ms: Any = None) -> float:
+        s = get_settings()
+        if isinstance(configured_ms, (int, float)) and configured_ms > 0:
+            return float(configured_ms) / 1000.0
+        p95 = self._get(key).p95()
+        if p95 is None:
+            return s.LLM_HEDGE_DEFAULT_DELAY_MS / 1000.0
+        return max(s.LLM_HEDGE_MIN_DELAY_MS / 1000.0, p95)
+
+    def record(self, key: TargetKey, latency_s: float, ok: bool) -> None:
+        s = get_settings()
+        alpha = s.LLM_ROUTING_EWMA_ALPHA
+        h = self._get(key)
+        h.requests += 1
+        h.ewma_error = (1 - alpha) * h.ewma_error + alpha * (0.0 if ok else 1.0)
+
+        if ok:
+            h.samples.append(latency_s)
+            h.ewma_latency_s = latency_s if h.ewma_latency_s is None else (1 - alpha) * h.ewma_latency_s + alpha * latency_s
+            h.consecutive_failures = 0
+            h.open_until = 0.0
+            h.half_open = False
+            return
+
+        h.failures += 1
+        h.consecutive_failures += 1
+        if h.half_open or h.consecutive_failures >= s.LLM_CIRCUIT_FAILURE_THRESHOLD:
+            h.open_until = time.monotonic() + s.LLM_CIRCUIT_OPEN_S
+            h.half_open = False
+
+    def abandon(self, key: TargetKey) -> None:
+        # la petición de prueba se canceló (p.ej. perdió un hedge): otra podrá probar
+        self._get(key).half_open = False
+
+    def stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        out = []
+        for (provider, base_url, model), h in self._targets.items():
+            p95 = h.p95()
+            out.append({
+                "provider": provider,
+                "base_url": base_url,
+                "model": model,
+                "ewma_latency_ms": round(h.ewma_latency_s * 1000, 1) if h.ewma_latency_s is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "error_rate": round(h.ewma_error, 4),
+                "requests": h.requests,
+                "failures": h.failures,
+                "circuit": "open" if h.open_until > now else ("half_open" if h.half_open else "closed"),
+            })
+        return out
+
+
+@lru_cache
+def get_llm_health() -> LLMHealthTracker:
+    return LLMHealthTracker()
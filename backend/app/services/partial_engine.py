@@ -0,0 +1,113 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.providers.stt.base import STTSegment
+
+
+def _pick_float(v: Any, default: float) -> float:
+    try:
+        f = float(v)
+        return f if f > 0 else default
+    except Exception:
+        return default
+
+
+@dataclass(frozen=True)
+class PartialUpdate:
+    committed: str
+    tail: str
+    start_ms: Optional[int] = None
+    end_ms: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return " ".join(t for t in (self.committed, self.tail) if t)
+
+
+@dataclass
+class IncrementalPartialEngine:
+    # ventana deslizante: solo se transcribe el audio no confirmado + un solape
+    window_s: float = 6.0
+    overlap_s: float = 1.0
+    stable_s: float = 1.0
+    # tolerancia para reconocer el mismo segmento entre dos ticks
+    match_tolerance_ms: int = 400
+
+    committed: list[STTSegment] = field(default_factory=list)
+    committed_until_ms: int = 0
+    # cambia en cada reset: descarta resultados de una ventana ya obsoleta
+    generation: int = 0
+    _pending: list[STTSegment] = field(default_factory=list)
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "IncrementalPartialEngine":
+        return cls(
+            window_s=_pick_float(config.get("partial_window_s"), 6.0),
+            overlap_s=_pick_float(config.get("partial_overlap_s"), 1.0),
+            stable_s=_pick_float(config.get("partial_stable_s"), 1.0),
+        )
+
+    @property
+    def committed_text(self) -> str:
+        return " ".join(s.text for s in self.committed)
+
+    def reset(self, base_ms: int = 0) -> None:
+        self.generation += 1
+        self.committed.clear()
+        self._pending.clear()
+        self.committed_until_ms = base_ms
+
+    def window_seconds(self, total_ms: int) -> float:
+        # desde lo último confirmado (menos el solape) hasta el final, con tope
+        start_ms = max(0, self.committed_until_ms - int(self.overlap_s * 1000))
+        max_ms = int((self.window_s + self.overlap_s) * 1000)
+        return min(total_ms - start_ms, max_ms) / 1000.0
+
+    def _was_pending(self, seg: STTSegment) -> bool:
+        for p in self._pending:
+            if p.text == seg.text and abs(p.start_ms - seg.start_ms) <= self.match_tolerance_ms:
+                return True
+        return False
+
+    def update(self, segments: list[STTSegment], offset_ms: int, total_ms: int) -> PartialUpdate:
+        # segments vienen relativos a la ventana; los pasamos a tiempo de sesión
+        absolute = [
+            STTSegment(start_ms=s.start_ms + offset_ms, end_ms=s.end_ms + offset_ms, text=s.text)
+            for s in segments
+        ]
+
+        # lo que cae en el solape ya está confirmado
+        fresh = [s for s in absolute if (s.start_ms + s.end_ms) // 2 >= self.committed_until_ms]
+
+        stable_limit = total_ms - int(self.stable_s * 1000)
+        # si la ventana está llena, lo más viejo sale en el próximo tick: se confirma ya
+        force_limit = total_ms - int(self.window_s * 1000)
+
+        i = 0
+        while i < len(fresh):
+            seg = fresh[i]
+            stable = seg.end_ms <= stable_limit and self._was_pending(seg)
+            forced = seg.end_ms <= force_limit
+            if not (stable or forced):
+                break
+            self.committed.append(seg)
+            self.committed_until_ms = max(self.committed_until_ms, seg.end_ms)
+            i += 1
+
+        tail = fresh[i:]
+        self._pending = tail
+
+        if tail:
+            start_ms, end_ms = tail[0].start_ms, tail[-1].end_ms
+        elif self.committed:
+            start_ms, end_ms = self.committed[-1].start_ms, self.committed[-1].end_ms
+        else:
+            start_ms, end_ms = None, None
+
+        return PartialUpdate(
+            committed=self.committed_text,
+            tail=" ".join(s.text for s in tail),
+            start_ms=start_ms,
+            end_ms=end_ms,
+        )
@@ -0,0 +1,153 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMGenerateRequest
+
+
+class RateLimitTimeout(Exception):
+    # la cola no iba a liberar cupo antes del deadline
+    def __init__(self, provider: str, wait_s: float) -> None:
+        super().__init__(f"{provider}: rate limit queue wait would exceed deadline ({wait_s:.1f}s)")
+        self.provider = provider
+        self.wait_s = wait_s
+
+
+def estimate_tokens(req: LLMGenerateRequest) -> int:
+    # ~4 caracteres por token + lo que puede generar
+    chars = sum(len(m.content or "") for m in req.messages)
+    return chars // 4 + 1 + req.max_tokens
+
+
+class TokenBucket:
+    # capacity = ráfaga máxima; rate = reposición por segundo. Los que esperan
+    # pasan de a uno (FIFO) para que nadie se cuele delante de una petición grande.
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = float(per_minute) / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float, deadline: float, label: str) -> None:
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self.blocked_until - now)
+                if wait == 0.0:
+                    if self.tokens >= amount:
+                        self.tokens -= amount
+                        return
+                    wait = (amount - self.tokens) / self.rate
+                if now + wait > deadline:
+                    raise RateLimitTimeout(label, wait)
+                await asyncio.sleep(wait)
+
+    def penalize(self, seconds: float) -> None:
+        # el upstream devolvió 429: vaciamos el cubo y todos esperan Retry-After
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + max(0.0, seconds))
+
+
+class _Limits:
+    def __init__(self, rpm: float, tpm: float) -> None:
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+
+class ProviderRateLimiter:
+    # un par de cubos (peticiones/min y tokens/min) por provider + base_url + api key
+
+    def __init__(self) -> None:
+        self._limits: dict[tuple[str, str, str], _Limits] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waited_s = 0.0
+        self.timeouts = 0
+        self.penalties = 0
+
+    def _pick_limits(self, provider: str, config: dict[str, Any]) -> tuple[float, float]:
+        custom = config.get("rate_limit")
+        if not isinstance(custom, dict):
+            custom = get_settings().LLM_RATE_LIMITS.get(provider) or {}
+        try:
+            rpm, tpm = float(custom.get("rpm") or 0), float(custom.get("tpm") or 0)
+        except (TypeError, ValueError):
+            return 0.0, 0.0
+        # el límite es de la cuenta: con varios workers cada uno usa su parte
+        workers = max(1, get_settings().WORKERS)
+        return rpm / workers, tpm / workers
+
+    def _get(self, provider: str, config: dict[str, Any]) -> Optional[_Limits]:
+        rpm, tpm = self._pick_limits(provider, config)
+        if rpm <= 0 and tpm <= 0:
+            return None
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._limits = {}
+            self._loop = loop
+
+        # la api_key solo como hash: no la guardamos en claro
+        api_key = str(config.get("api_key") or "")
+        key = (
+            provider,
+            str(config.get("base_url") or "").rstrip("/"),
+            hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16],
+        )
+        limits = self._limits.get(key)
+        if limits is None:
+            limits = _Limits(rpm, tpm)
+            self._limits[key] = limits
+        return limits
+
+    async def acquire(self, provider: str, req: LLMGenerateRequest, config: dict[str, Any], deadline: float) -> None:
+        limits = self._get(provider, config)
+        if limits is None:
+            return
+        started = time.monotonic()
+        try:
+            if limits.requests is not None:
+                await limits.requests.acquire(1, deadline, provider)
+            if limits.tokens is not None:
+                await limits.tokens.acquire(estimate_tokens(req), deadline, provider)
+        except RateLimitTimeout:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waited_s += time.monotonic() - started
+
+    def penalize(self, provider: str, config: dict[str, Any], seconds: float) -> None:
+        limits = self._get(provider, config)
+        if limits is None:
+            return
+        self.penalties += 1
+        for bucket in (limits.requests, limits.tokens):
+            if bucket is not None:
+                bucket.penalize(seconds)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limited_keys": len(self._limits),
+            "queue_wait_s": round(self.waited_s, 3),
+            "timeouts": self.timeouts,
+            "penalties": self.penalties,
+        }
+
+
+@lru_cache
+def get_rate_limiter() -> ProviderRateLimiter:
+    return ProviderRateLimiter()
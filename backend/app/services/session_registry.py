@@ -0,0 +1,239 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger("app.session_registry")
+
+# Qué worker es dueño de cada sesión STT (su audio vive en memoria de ese
+# proceso) y de cada conversación LLM. Con varios workers, el que recibe algo
+# que no es suyo redirige al dueño en vez de crear una copia vacía.
+#
+#   memory: un solo proceso (por defecto); todo es local
+#   sqlite: archivo compartido por los workers de una máquina (o un volumen
+#           compartido); cada worker renueva sus claves con un heartbeat y
+#           si muere, expiran a los SESSION_REGISTRY_TTL_S
+
+
+def stt_session_key(session_id: str) -> str:
+    return f"stt:{session_id}"
+
+
+def conversation_key(conversation_id: str) -> str:
+    return f"conv:{conversation_id}"
+
+
+@dataclass(frozen=True)
+class SessionOwner:
+    key: str
+    worker_id: str
+    url: Optional[str] = None  # URL directa del worker (None: no redirigible)
+
+
+class SessionRegistry(ABC):
+    backend = "base"
+
+    def __init__(self, worker_id: str, worker_url: Optional[str] = None, ttl_s: float = 30.0) -> None:
+        self.worker_id = worker_id
+        self.worker_url = worker_url.rstrip("/") if worker_url else None
+        self.ttl_s = max(1.0, ttl_s)
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    def claim(self, key: str) -> Optional[SessionOwner]:
+        # None: la clave es nuestra (nueva o ya lo era). Si no, el dueño vivo.
+        ...
+
+    @abstractmethod
+    def lookup(self, key: str) -> Optional[SessionOwner]:
+        ...
+
+    @abstractmethod
+    def release(self, key: str) -> None:
+        ...
+
+    def refresh(self) -> None:
+        # heartbeat: renueva el TTL de todas nuestras claves
+        return None
+
+    def release_all(self) -> None:
+        return None
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def remote_owner(self, key: str) -> Optional[SessionOwner]:
+        owner = self.lookup(key)
+        if owner is None or owner.worker_id == self.worker_id:
+            return None
+        return owner
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "worker_id": self.worker_id,
+            "worker_url": self.worker_url,
+            "ttl_s": self.ttl_s,
+            "keys": self.count(),
+        }
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl_s / 3)
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                logger.exception("session registry heartbeat failed")
+
+    def start(self) -> None:
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def aclose(self) -> None:
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            try:
+                await self._heartbeat
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._heartbeat = None
+        # al apagar, lo nuestro queda libre ya (no tras el TTL)
+        try:
+            await asyncio.to_thread(self.release_all)
+        except Exception:
+            logger.exception("session registry release on shutdown failed")
+
+
+class InProcessSessionRegistry(SessionRegistry):
+    backend = "memory"
+
+    def __init__(self, worker_id: str, worker_url: Optional[str] = None, ttl_s: float = 30.0) -> None:
+        super().__init__(worker_id, worker_url, ttl_s)
+        self._owners: dict[str, SessionOwner] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, key: str) -> Optional[SessionOwner]:
+        # un único proceso: todo es nuestro
+        with self._lock:
+            self._owners[key] = SessionOwner(key, self.worker_id, self.worker_url)
+        return None
+
+    def start(self) -> None:
+        # sin nada compartido no hay TTL que renovar
+        return None
+
+    def lookup(self, key: str) -> Optional[SessionOwner]:
+        return self._owners.get(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._owners.pop(key, None)
+
+    def release_all(self) -> None:
+        with self._lock:
+            self._owners.clear()
+
+    def count(self) -> int:
+        return len(self._owners)
+
+
+class SQLiteSessionRegistry(SessionRegistry):
+    # operaciones cortas de una fila; WAL para que los lectores no esperen
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, worker_id: str, worker_url: Optional[str] = None, ttl_s: float = 30.0) -> None:
+        super().__init__(worker_id, worker_url, ttl_s)
+        self.path = path
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS session_owners ("
+                "key TEXT PRIMARY KEY, worker_id TEXT NOT NULL, url TEXT, expires_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS session_owners_worker ON session_owners (worker_id)")
+            # proceso nuevo con el mismo WORKER_ID: lo anterior ya no existe
+            db.execute("DELETE FROM session_owners WHERE worker_id = ?", (worker_id,))
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5.0)
+
+    def claim(self, key: str) -> Optional[SessionOwner]:
+        now = time.time()
+        with self._connect() as db:
+            # todo en una transacción: dos workers no pueden quedarse la misma clave
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM session_owners WHERE key = ? AND expires_at <= ?", (key, now))
+            row = db.execute("SELECT worker_id, url FROM session_owners WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] != self.worker_id:
+                return SessionOwner(key, row[0], row[1])
+            db.execute(
+                "INSERT OR REPLACE INTO session_owners (key, worker_id, url, expires_at) VALUES (?, ?, ?, ?)",
+                (key, self.worker_id, self.worker_url, now + self.ttl_s),
+            )
+        return None
+
+    def lookup(self, key: str) -> Optional[SessionOwner]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT worker_id, url FROM session_owners WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return SessionOwner(key, row[0], row[1]) if row is not None else None
+
+    def release(self, key: str) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM session_owners WHERE key = ? AND worker_id = ?", (key, self.worker_id))
+
+    def refresh(self) -> None:
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "UPDATE session_owners SET expires_at = ? WHERE worker_id = ?", (now + self.ttl_s, self.worker_id)
+            )
+            # limpieza de workers muertos
+            db.execute("DELETE FROM session_owners WHERE expires_at <= ?", (now,))
+
+    def release_all(self) -> None:
+        with self._connect() as db:
+            db.execute("DELETE FROM session_owners WHERE worker_id = ?", (self.worker_id,))
+
+    def count(self) -> int:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT COUNT(*) FROM session_owners WHERE worker_id = ? AND expires_at > ?",
+                (self.worker_id, time.time()),
+            ).fetchone()
+        return int(row[0])
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def build_session_registry() -> SessionRegistry:
+    s = get_settings()
+    worker_id = s.WORKER_ID or default_worker_id()
+    backend = (s.SESSION_REGISTRY or "memory").strip().lower()
+    if backend == "sqlite":
+        if not s.SESSION_REGISTRY_SQLITE_PATH:
+            raise ValueError("SESSION_REGISTRY=sqlite requires SESSION_REGISTRY_SQLITE_PATH")
+        return SQLiteSessionRegistry(s.SESSION_REGISTRY_SQLITE_PATH, worker_id, s.WORKER_URL, s.SESSION_REGISTRY_TTL_S)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_REGISTRY: {backend} (allowed: memory,sqlite)")
+    return InProcessSessionRegistry(worker_id, s.WORKER_URL, s.SESSION_REGISTRY_TTL_S)
+
+
+@lru_cache
+def get_session_registry() -> SessionRegistry:
+    return build_session_registry()
@@ -1,21 +1,38 @@
 from __future__ import annotations
+import asyncio
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from typing import Any, Optional
 
+from app.services.partial_engine import IncrementalPartialEngine
+from app.utils.audio_buffer import PCMBuffer
+from app.utils.vad import Utterance, VADSegmenter
+
 @dataclass
 class STTSession:
     session_id: str
     config: dict[str, Any]
     audio_chunks: int = 0
-    audio_bytes: bytearray = field(default_factory=bytearray)
+    audio: PCMBuffer = field(default_factory=PCMBuffer)
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
+    # --- audio negociado en start (frames binarios) ---
+    audio_format: str = "pcm16"
+    sample_rate: int = 16000
+    binary_audio: bool = False
+
     # --- NUEVO: parciales ---
     partial_running: bool = False
     partial_dirty: bool = False
     last_partial_text: str = ""
-    last_partial_at: float = 0.0
+    last_partial_at: float = 0.0  # time.monotonic() del último parcial
+    partial_audio_mark: int = 0  # audio_len() cuando corrió el último parcial
+    audio_event: asyncio.Event = field(default_factory=asyncio.Event)
+    partial_engine: Optional[IncrementalPartialEngine] = None
+
+    # --- VAD: locuciones cerradas pendientes de final ---
+    vad: Optional[VADSegmenter] = None
+    utterances: list[Utterance] = field(default_factory=list)
 
 class SessionStore:
     def __init__(self) -> None:
@@ -34,6 +51,9 @@ class SessionStore:
     def close(self, session_id: str) -> None:
         self._sessions.pop(session_id, None)
 
+    def __len__(self) -> int:
+        return len(self._sessions)
+
     def reset_audio_count(self, session_id: str) -> None:
         sess = self.get(session_id)
         if sess:
@@ -50,33 +70,60 @@ class SessionStore:
         sess = self.get(session_id)
         if not sess:
             raise ValueError("Send 'start' first")
-        sess.audio_bytes.extend(chunk)
+        sess.audio.append(chunk)
+        sess.partial_dirty = True
+        sess.audio_event.set()
 
-    def pop_audio(self, session_id: str) -> bytes:
+    # Las lecturas devuelven memoryviews de solo lectura: sin copia si el rango
+    # cae en un bloque, y como mucho una copia del rango pedido (no del total).
+    def pop_audio(self, session_id: str) -> memoryview:
         sess = self.get(session_id)
         if not sess:
-            return b""
-        data = bytes(sess.audio_bytes)
-        sess.audio_bytes.clear()
+            return memoryview(b"")
+        data = sess.audio.snapshot()
+        sess.audio.clear()
         return data
 
+    def audio_len(self, session_id: str) -> int:
+        # total recibido en la sesión (offset absoluto), no solo lo retenido
+        sess = self.get(session_id)
+        return sess.audio.end if sess else 0
+
     # --- NUEVO: snapshot sin vaciar (para parciales) ---
-    def snapshot_audio(self, session_id: str) -> bytes:
+    def snapshot_audio(self, session_id: str) -> memoryview:
         sess = self.get(session_id)
         if not sess:
-            return b""
-        return bytes(sess.audio_bytes)
-    
-    def snapshot_last_seconds(self, session_id: str, seconds: float, sample_rate: int, channels: int = 1) -> bytes:
-            sess = self.get(session_id)
-            if not sess:
-                return b""
-            if seconds <= 0 or sample_rate <= 0 or channels <= 0:
-                return bytes(sess.audio_bytes)
-        
-            bytes_per_second = sample_rate * channels * 2  # pcm16
-            n = int(seconds * bytes_per_second)
-            data = sess.audio_bytes
-            if n <= 0 or n >= len(data):
-                return bytes(data)
-            return bytes(data[-n:])
+            return memoryview(b"")
+        return sess.audio.snapshot()
+
+    def snapshot_from(self, session_id: str, offset: int) -> memoryview:
+        sess = self.get(session_id)
+        if not sess:
+            return memoryview(b"")
+        return sess.audio.view(offset, sess.audio.end)
+
+    def snapshot_range(self, session_id: str, start: int, end: int) -> memoryview:
+        sess = self.get(session_id)
+        if not sess:
+            return memoryview(b"")
+        return sess.audio.view(start, end)
+
+    def snapshot_last_seconds(self, session_id: str, seconds: float, sample_rate: int, channels: int = 1) -> memoryview:
+        sess = self.get(session_id)
+        if not sess:
+            return memoryview(b"")
+        if seconds <= 0 or sample_rate <= 0 or channels <= 0:
+            return sess.audio.snapshot()
+
+        bytes_per_second = sample_rate * channels * 2  # pcm16
+        n = int(seconds * bytes_per_second)
+        n -= n % (channels * 2)  # no partir muestras
+        if n <= 0:
+            return sess.audio.snapshot()
+        return sess.audio.tail(n)
+
+    def release_audio_before(self, session_id: str, offset: int) -> None:
+        # retención acotada: suelta audio ya confirmado anterior a offset
+        sess = self.get(session_id)
+        if sess:
+            sess.audio.release_before(offset)
@@ -0,0 +1,49 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(self, task: asyncio.Task[T]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[T]):
+    # Llamadas concurrentes con la misma clave comparten una sola ejecución:
+    # todas reciben su resultado (o su excepción). Si todos los que esperan se
+    # van, la ejecución se cancela.
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call[T]] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, c=call: self._forget(key, c))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # nadie espera ya el resultado: fuera del mapa y cancelada
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call[T]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict[str, Any]:
+        return {"inflight": len(self._calls), "executed": self.executed, "coalesced": self.coalesced}
@@ -0,0 +1,375 @@
+from __future__ import annotations
+import asyncio
+import logging
+import re
+import time
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional, Union
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMMessage, LLMStreamChunk
+from app.services.context_budget import apply_context_budget
+from app.services.conversation_store import Conversation, get_conversation_store
+from app.services.llm_router import LLMRouter
+
+logger = logging.getLogger("app.stt_llm")
+
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+ErrorMapper = Callable[[Exception], dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class PipelineConfig:
+    provider: Optional[str]
+    config: dict[str, Any]
+    prompt_template: str
+    system_prompt: str
+    temperature: float
+    max_tokens: int
+    stream: bool
+    # true: cada final es un turno de una conversación en servidor (ver /llm/conversations)
+    history: bool
+    # lanzar el LLM con parciales estables antes del final (no aplica con history)
+    speculate: bool = False
+    speculate_stable_s: float = 0.7
+
+    @classmethod
+    def from_start(cls, raw: Any) -> "PipelineConfig":
+        # raw = config.llm del mensaje start
+        if not isinstance(raw, dict):
+            raise ValueError("llm must be an object")
+        config = raw.get("config") or {}
+        if not isinstance(config, dict):
+            raise ValueError("llm.config must be an object")
+        template = raw.get("prompt_template") or "{text}"
+        if not isinstance(template, str) or "{text}" not in template:
+            raise ValueError("llm.prompt_template must contain {text}")
+        try:
+            temperature = float(raw.get("temperature", 0.7))
+            max_tokens = int(raw.get("max_tokens", 256))
+        except (TypeError, ValueError):
+            raise ValueError("llm.temperature / llm.max_tokens must be numbers")
+        if not 0.0 <= temperature <= 2.0 or not 1 <= max_tokens <= 8192:
+            raise ValueError("llm.temperature / llm.max_tokens out of range")
+        provider = raw.get("provider") or config.get("provider")
+        stable_ms = raw.get("speculate_stable_ms", get_settings().STT_LLM_SPECULATE_STABLE_MS)
+        if not isinstance(stable_ms, (int, float)) or stable_ms < 0:
+            raise ValueError("llm.speculate_stable_ms must be a non-negative number")
+        return cls(
+            provider=provider if isinstance(provider, str) else None,
+            config=config,
+            prompt_template=template,
+            system_prompt=str(raw.get("system_prompt") or ""),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=raw.get("stream", True) is not False,
+            history=raw.get("history") is True,
+            speculate=raw.get("speculate") is True and raw.get("history") is not True,
+            speculate_stable_s=float(stable_ms) / 1000.0,
+        )
+
+
+def normalize_text(text: str) -> str:
+    # el final suele diferir del parcial solo en mayúsculas/puntuación
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class SpeculationStats:
+    # global (todas las sesiones): el tope de inflight es el presupuesto de tokens
+    # que estamos dispuestos a gastar en especulaciones que pueden tirarse
+
+    def __init__(self) -> None:
+        self.launched = 0
+        self.hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.skipped_budget = 0
+        self.inflight = 0
+        self.head_start_s = 0.0
+
+    def stats(self) -> dict[str, Any]:
+        decided = self.hits + self.misses
+        return {
+            "launched": self.launched,
+            "hits": self.hits,
+            "misses": self.misses,
+            "cancelled": self.cancelled,
+            "skipped_budget": self.skipped_budget,
+            "inflight": self.inflight,
+            "hit_rate": round(self.hits / decided, 4) if decided else 0.0,
+            # cuánto antes del final arrancó el LLM en los aciertos (latencia escondida)
+            "avg_head_start_ms": round(self.head_start_s / self.hits * 1000, 1) if self.hits else 0.0,
+        }
+
+
+@lru_cache
+def get_speculation_stats() -> SpeculationStats:
+    return SpeculationStats()
+
+
+# chunk, fin del stream (None) o el error con el que terminó
+_SpecItem = Union[LLMStreamChunk, None, Exception]
+
+
+class _Speculation:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.key = normalize_text(text)
+        self.started = time.monotonic()
+        self.chunks: asyncio.Queue[_SpecItem] = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+
+
+class STTLLMPipeline:
+    # finales del STT -> LLM en el servidor, respuesta por el mismo WS.
+    # Un worker por sesión: las respuestas salen en el orden de los finales,
+    # pero la del turno N corre mientras el STT sigue con el turno N+1.
+
+    def __init__(self, session_id: str, cfg: PipelineConfig, router: LLMRouter, send: Send, on_error: ErrorMapper) -> None:
+        self.session_id = session_id
+        self.cfg = cfg
+        self.router = router
+        self._send = send
+        self._on_error = on_error
+        self._queue: asyncio.Queue[Optional[tuple[int, str, Optional[_Speculation]]]] = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._turns = 0
+        self.spec_stats = get_speculation_stats()
+        self._spec: Optional[_Speculation] = None
+        self._stable_timer: Optional[asyncio.Task] = None
+        self._spec_attempts = 0
+        self.conversation: Optional[Conversation] = None
+        if cfg.history:
+            self.conversation = get_conversation_store().create(system_prompt=cfg.system_prompt)
+
+    def prompt(self, text: str) -> str:
+        # replace y no format: el transcript puede traer llaves
+        return self.cfg.prompt_template.replace("{text}", text)
+
+    def _request(self, text: str) -> LLMGenerateRequest:
+        messages = [LLMMessage(role="user", content=self.prompt(text))]
+        if self.cfg.system_prompt and self.conversation is None:
+            messages.insert(0, LLMMessage(role="system", content=self.cfg.system_prompt))
+        return LLMGenerateRequest(
+            messages=messages,
+            temperature=self.cfg.temperature,
+            max_tokens=self.cfg.max_tokens,
+            provider=self.cfg.provider,
+        )
+
+    def on_partial(self, text: str) -> None:
+        # cada parcial nuevo reinicia el reloj de estabilidad
+        if not self.cfg.speculate or not text:
+            return
+        if self._spec is not None and self._spec.key == normalize_text(text):
+            return
+        self._stop_timer()
+        self._stable_timer = asyncio.create_task(self._launch_when_stable(text))
+
+    def _stop_timer(self) -> None:
+        if self._stable_timer is not None:
+            self._stable_timer.cancel()
+            self._stable_timer = None
+
+    def _drop_spec(self) -> None:
+        if self._spec is not None:
+            self.spec_stats.cancelled += 1
+            self._spec.cancel()
+            self._spec = None
+
+    async def _launch_when_stable(self, text: str) -> None:
+        await asyncio.sleep(self.cfg.speculate_stable_s)
+        self._stable_timer = None
+        s = get_settings()
+        if self._spec_attempts >= s.STT_LLM_SPECULATE_MAX_ATTEMPTS or self.spec_stats.inflight >= s.STT_LLM_SPECULATE_MAX_INFLIGHT:
+            self.spec_stats.skipped_budget += 1
+            return
+        # el texto cambió desde la especulación anterior: esa ya no sirve
+        self._drop_spec()
+        spec = _Speculation(text)
+        spec.task = asyncio.create_task(self._speculate(spec))
+        self._spec = spec
+        self._spec_attempts += 1
+        self.spec_stats.launched += 1
+
+    async def _speculate(self, spec: _Speculation) -> None:
+        # el resultado se acumula en spec.chunks hasta que llegue el final
+        self.spec_stats.inflight += 1
+        try:
+            req = self._request(spec.text)
+            if not self.cfg.stream:
+                res = await self.router.generate(req, self.cfg.config)
+                spec.chunks.put_nowait(LLMStreamChunk(
+                    delta=res.text, done=True, model=res.model, usage=res.usage, provider=res.provider, cached=res.cached,
+                ))
+                return
+            chunks = self.router.stream(req, self.cfg.config)
+            try:
+                async for chunk in chunks:
+                    spec.chunks.put_nowait(chunk)
+                    if chunk.done:
+                        return
+            finally:
+                await chunks.aclose()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            spec.chunks.put_nowait(e)
+        finally:
+            spec.chunks.put_nowait(None)
+            self.spec_stats.inflight -= 1
+
+    def _claim_spec(self, text: str) -> Optional[_Speculation]:
+        self._stop_timer()
+        self._spec_attempts = 0
+        spec, self._spec = self._spec, None
+        if spec is None:
+            return None
+        if spec.key != normalize_text(text):
+            self.spec_stats.misses += 1
+            spec.cancel()
+            return None
+        self.spec_stats.hits += 1
+        self.spec_stats.head_start_s += time.monotonic() - spec.started
+        return spec
+
+    def submit(self, text: str) -> int:
+        self._turns += 1
+        self._queue.put_nowait((self._turns, text, self._claim_spec(text)))
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+        return self._turns
+
+    async def drain(self) -> None:
+        # stop: se esperan las respuestas pendientes antes de cerrar el socket
+        self._stop_timer()
+        self._drop_spec()
+        if self._worker is None:
+            self._forget_conversation()
+            return
+        self._queue.put_nowait(None)
+        try:
+            await self._worker
+        except Exception:
+            pass
+        finally:
+            self._worker = None
+            self._forget_conversation()
+
+    def cancel(self) -> None:
+        self._stop_timer()
+        self._drop_spec()
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._forget_conversation()
+
+    def _forget_conversation(self) -> None:
+        # el historial vive lo que el socket: no espera al TTL del store
+        if self.conversation is not None:
+            get_conversation_store().delete(self.conversation.id)
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            turn, text, spec = item
+            try:
+                await self._answer(turn, text, spec)
+            except asyncio.CancelledError:
+                if spec is not None:
+                    spec.cancel()
+                raise
+            except Exception as e:
+                logger.info("llm pipeline turn %s failed for session %s: %s", turn, self.session_id, e)
+                await self._send({
+                    "type": "llm_error",
+                    "session_id": self.session_id,
+                    "turn": turn,
+                    "error": self._on_error(e),
+                })
+
+    async def _answer(self, turn: int, text: str, spec: Optional[_Speculation] = None) -> None:
+        if spec is not None:
+            first = await spec.chunks.get()
+            if isinstance(first, LLMStreamChunk):
+                await self._send({"type": "llm_start", "session_id": self.session_id, "turn": turn, "text": text})
+                done = await self._forward(turn, self._replay(first, spec), self._request(spec.text))
+                done["speculative"] = True
+                await self._send({"type": "llm_done", "session_id": self.session_id, "turn": turn, **done})
+                return
+            # la especulación falló antes de dar nada: se repite normal
+            logger.info("speculative llm call failed for session %s, retrying: %s", self.session_id, first)
+
+        req = self._request(text)
+        conv = self.conversation
+        saved = None
+        context = None
+        if conv is not None:
+            saved = (list(conv.messages), conv.summary)
+            conv.messages.extend(req.messages)
+            context = (await apply_context_budget(conv, self.router, self.cfg.config)).to_dict()
+            req = replace(req, messages=conv.prompt_messages())
+
+        await self._send({"type": "llm_start", "session_id": self.session_id, "turn": turn, "text": text})
+        try:
+            if self.cfg.stream:
+                done = await self._forward(turn, self.router.stream(req, self.cfg.config), req)
+            else:
+                done = self._done(await self.router.generate(req, self.cfg.config))
+        except BaseException:
+            if conv is not None and saved is not None:
+                conv.messages, conv.summary = saved
+            raise
+
+        if conv is not None:
+            conv.messages.append(LLMMessage(role="assistant", content=done["text"]))
+            done["conversation_id"] = conv.id
+        if context is not None:
+            done["context"] = context
+        await self._send({"type": "llm_done", "session_id": self.session_id, "turn": turn, **done})
+
+    def _done(self, res: LLMGenerateResponse) -> dict[str, Any]:
+        return {"text": res.text, "provider": res.provider, "model": res.model, "usage": res.usage, "cached": res.cached}
+
+    async def _replay(self, first: LLMStreamChunk, spec: _Speculation) -> AsyncGenerator[LLMStreamChunk, None]:
+        # lo ya generado sale de golpe; el resto según llega
+        item: _SpecItem = first
+        try:
+            while item is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                item = await spec.chunks.get()
+        finally:
+            spec.cancel()
+
+    async def _forward(self, turn: int, chunks: AsyncGenerator[LLMStreamChunk, None], req: LLMGenerateRequest) -> dict[str, Any]:
+        parts: list[str] = []
+        last: Optional[LLMStreamChunk] = None
+        try:
+            async for chunk in chunks:
+                if chunk.delta:
+                    parts.append(chunk.delta)
+                    if self.cfg.stream:
+                        await self._send({"type": "llm_token", "session_id": self.session_id, "turn": turn, "text": chunk.delta})
+                if chunk.done:
+                    last = chunk
+                    break
+        finally:
+            await chunks.aclose()
+        # mismos campos que _done: provider y cached salen del router, no de la config
+        provider = (last.provider if last else None) or req.provider or self.cfg.config.get("provider") or "openai_compat"
+        return self._done(LLMGenerateResponse(
+            text="".join(parts),
+            provider=provider,
+            model=last.model if last else None,
+            usage=last.usage if last else None,
+            cached=last.cached if last else False,
+        ))
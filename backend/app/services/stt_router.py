@@ -1,7 +1,20 @@
 from __future__ import annotations
+import asyncio
+import time
 from typing import Any, Optional
 
-from app.services.session_store import SessionStore
+from app.core.config import get_settings
+from app.core.metrics import (
+    STT_AUDIO_BYTES,
+    STT_ERRORS,
+    STT_QUEUE_WAIT_SECONDS,
+    STT_REAL_TIME_FACTOR,
+    STT_TRANSCRIBE_SECONDS,
+)
+from app.core.timing import current_timings, use_timings
+from app.services.session_store import SessionStore, STTSession
+from app.services.stt_scheduler import JobKind, TranscriptionScheduler, get_stt_scheduler
+from app.utils.vad import Utterance, VADConfig, VADSegmenter
 from app.utils.ws_protocol import b64_to_bytes
 from app.utils.validate import (
     DEFAULT_AUDIO_CONSTRAINTS,
@@ -18,14 +31,15 @@ from app.providers.stt.whisper_cpp import WhisperCppSTTProvider
 
 
 class STTRouter:
-    def __init__(self, store: SessionStore) -> None:
+    def __init__(self, store: SessionStore, scheduler: Optional[TranscriptionScheduler] = None) -> None:
         self.store = store
+        self.scheduler = scheduler or get_stt_scheduler()
 
         self._providers: dict[str, STTProvider] = {
             CloudStubSTTProvider.name: CloudStubSTTProvider(),
             CustomWSProxySTTProvider.name: CustomWSProxySTTProvider(),
-            WhisperSelfHostedSTTProvider.name: WhisperSelfHostedSTTProvider(self.store),
-            WhisperCppSTTProvider.name: WhisperCppSTTProvider(self.store),
+            WhisperSelfHostedSTTProvider.name: WhisperSelfHostedSTTProvider(self.store, self.scheduler),
+            WhisperCppSTTProvider.name: WhisperCppSTTProvider(self.store, self.scheduler),
         }
 
 
@@ -40,6 +54,69 @@ class STTRouter:
             raise ValueError(f"Unknown STT provider: {name}")
         return provider
 
+    async def transcribe(
+        self,
+        session_id: str,
+        pcm: bytes,
+        config: dict[str, Any],
+        *,
+        kind: JobKind,
+        segments: bool = False,
+    ) -> Any:
+        # todo whisper pasa por el scheduler global (prioridad + hilos)
+        provider = self._pick_provider(config)
+        fn = provider.transcribe_segments if segments else provider.transcribe_pcm
+        submitted = time.monotonic()
+        # la tarea del scheduler puede nacer en el contexto de otra sesión
+        timings = current_timings()
+
+        async def run(threads: int) -> Any:
+            started = time.monotonic()
+            STT_QUEUE_WAIT_SECONDS.observe(started - submitted, kind=kind.name)
+            if timings is not None:
+                timings.add("stt_queue", started - submitted)
+            try:
+                with use_timings(timings):
+                    result = await fn(pcm, config, threads)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                STT_ERRORS.inc(provider=provider.name, kind=kind.name)
+                raise
+            elapsed = time.monotonic() - started
+            if timings is not None:
+                timings.add("stt_transcribe", elapsed)
+            STT_TRANSCRIBE_SECONDS.observe(elapsed, provider=provider.name, kind=kind.name)
+            audio_s = len(pcm) / (int(config.get("sample_rate") or 16000) * 2)
+            if audio_s > 0:
+                STT_REAL_TIME_FACTOR.observe(elapsed / audio_s, provider=provider.name, kind=kind.name)
+            return result
+
+        return await self.scheduler.submit(session_id, kind, run, provider.reserved_threads(config))
+
+    def cancel_jobs(self, session_id: Optional[str], kind: Optional[JobKind] = None) -> int:
+        # stop/desconexión: fuera de la cola y whisper en curso matado
+        if not session_id:
+            return 0
+        return self.scheduler.cancel(session_id, kind)
+
+    def _vad_enabled(self, config: dict[str, Any]) -> bool:
+        v = config.get("vad")
+        if isinstance(v, bool):
+            return v
+        if isinstance(v, dict):
+            return True
+        return bool(get_settings().STT_VAD_ENABLED)
+
+    def pop_utterances(self, session_id: Optional[str], *, flush: bool = False) -> list[Utterance]:
+        sess = self.store.get(session_id) if session_id else None
+        if not sess or sess.vad is None:
+            return []
+        if flush:
+            sess.utterances.extend(sess.vad.flush())
+        out, sess.utterances = sess.utterances, []
+        return out
+
     async def handle(
         self,
         msg: dict[str, Any],
@@ -70,11 +147,35 @@ class STTRouter:
         if not isinstance(config, dict):
             return None, [{"type": "error", "message": "Invalid config (must be object)"}], False
 
-        self.store.create(session_id=session_id, config=config)
+        transport = config.get("audio_transport") or "json"
+        if transport not in ("json", "binary"):
+            return None, [{"type": "error", "message": "Invalid audio_transport (allowed: json,binary)"}], False
+
+        fmt = "pcm16"
+        sr = 16000
+        if transport == "binary":
+            # en modo binario el formato y el sample_rate se fijan aquí, no por frame
+            try:
+                fmt = validate_format(config.get("format", "pcm16"), self._audio_constraints)
+                sr = validate_sample_rate(config.get("sample_rate", 16000), self._audio_constraints)
+            except ValueError as e:
+                return None, [{"type": "error", "message": str(e), "session_id": session_id}], False
+
+        sess = self.store.create(session_id=session_id, config=config)
+        sess.audio_format = fmt
+        sess.sample_rate = sr
+        sess.binary_audio = transport == "binary"
 
         try:
             provider = self._pick_provider(config)
             out = await provider.on_start(session_id, config)
+            if hasattr(provider, "transcribe_pcm") and self._vad_enabled(config):
+                vad_sr = sr if sess.binary_audio else int(config.get("sample_rate") or 16000)
+                sess.vad = VADSegmenter(sample_rate=vad_sr, config=VADConfig.from_config(config))
+            if sess.binary_audio:
+                for m in out:
+                    if m.get("type") == "ready":
+                        m.update({"audio_transport": "binary", "format": fmt, "sample_rate": sr})
             return session_id, out, False
         except Exception as e:
             self.store.close(session_id)
@@ -104,11 +205,47 @@ class STTRouter:
         except ValueError as e:
             return current_session_id, [{"type": "error", "message": str(e), "session_id": current_session_id}], False
 
+        return await self._ingest_audio(current_session_id, sess, audio_bytes, fmt, sr)
+
+    async def handle_audio_bytes(
+        self,
+        data: bytes,
+        current_session_id: Optional[str],
+    ) -> tuple[Optional[str], list[dict[str, Any]], bool]:
+        # frame binario: PCM crudo con el formato/sample_rate negociados en start
+        if not current_session_id:
+            return None, [{"type": "error", "message": "Send 'start' first"}], False
+
+        sess = self.store.get(current_session_id)
+        if not sess:
+            return None, [{"type": "error", "message": "Send 'start' first"}], False
+
+        if not sess.binary_audio:
+            msg = "Binary audio not negotiated (start with config.audio_transport='binary')"
+            return current_session_id, [{"type": "error", "message": msg, "session_id": current_session_id}], False
+
+        if not data:
+            return current_session_id, [{"type": "error", "message": "Missing audio data", "session_id": current_session_id}], False
+        if len(data) % 2:
+            return current_session_id, [{"type": "error", "message": "Invalid pcm16 frame (odd length)", "session_id": current_session_id}], False
+
+        return await self._ingest_audio(current_session_id, sess, data, sess.audio_format, sess.sample_rate)
+
+    async def _ingest_audio(
+        self,
+        current_session_id: str,
+        sess: STTSession,
+        audio_bytes: bytes,
+        fmt: str,
+        sr: int,
+    ) -> tuple[Optional[str], list[dict[str, Any]], bool]:
         try:
             validate_audio_bytes_size(audio_bytes, self._audio_constraints)
         except ValueError as e:
             return current_session_id, [{"type": "error", "message": str(e), "session_id": current_session_id}], False
 
+        STT_AUDIO_BYTES.inc(len(audio_bytes), transport="binary" if sess.binary_audio else "json")
+
         try:
             chunk_index = self.store.inc_audio_count(current_session_id)
         except ValueError as e:
@@ -124,6 +261,8 @@ class STTRouter:
                 chunk_index=chunk_index,
             )
             out = await provider.on_audio(frame, sess.config)
+            if sess.vad is not None:
+                sess.utterances.extend(sess.vad.feed(audio_bytes))
             return current_session_id, out, False
         except NotImplementedError:
             return current_session_id, [{"type": "error", "message": "Provider not implemented yet", "session_id": current_session_id}], False
@@ -0,0 +1,235 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import get_settings
+from app.core.metrics import STT_JOBS_RUNNING, STT_QUEUE_DEPTH
+
+
+# una sesión que pidió algo hace menos de esto sigue contando para el reparto
+_ACTIVE_SESSION_WINDOW_S = 10.0
+
+
+class JobKind(IntEnum):
+    # menor = más prioritario
+    final = 0
+    partial = 1
+
+
+class JobSuperseded(Exception):
+    # un parcial en cola que ya no sirve (hay uno más nuevo o un final)
+    pass
+
+
+class JobCancelled(Exception):
+    # la sesión terminó (stop/desconexión) con el trabajo en cola o en curso
+    pass
+
+
+@dataclass(order=True)
+class _Job:
+    kind: JobKind
+    seq: int
+    session_id: str = field(compare=False)
+    fn: Callable[[int], Awaitable[Any]] = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    dropped: bool = field(default=False, compare=False)
+    threads: int = field(default=0, compare=False)
+    # hilos fijos que usará de verdad (pool whisper-server); 0 = los reparte el scheduler
+    fixed_threads: int = field(default=0, compare=False)
+    task: Optional[asyncio.Task] = field(default=None, compare=False)
+
+
+class TranscriptionScheduler:
+    # Cola global de trabajos whisper: finales antes que parciales, un único
+    # parcial pendiente por sesión y un presupuesto fijo de hilos repartido
+    # entre los trabajos en curso (se pasa a whisper como -t).
+
+    def __init__(
+        self,
+        core_budget: int = 0,
+        min_threads: int = 2,
+        max_threads: int = 8,
+        max_jobs: int = 0,
+    ) -> None:
+        self.core_budget = core_budget if core_budget > 0 else (os.cpu_count() or 4)
+        self.min_threads = max(1, min(min_threads, self.core_budget))
+        self.max_threads = max(self.min_threads, max_threads)
+        self.max_jobs = max_jobs if max_jobs > 0 else max(1, self.core_budget // self.min_threads)
+
+        self._queue: list[_Job] = []
+        self._pending_partial: dict[str, _Job] = {}
+        self._running: dict[int, _Job] = {}
+        self._threads_in_use = 0
+        self._seq = itertools.count()
+        # session_id -> último submit (monotonic)
+        self._last_seen: dict[str, float] = {}
+
+        self.completed = 0
+        self.superseded = 0
+        self.cancelled = 0
+
+    @classmethod
+    def from_settings(cls) -> "TranscriptionScheduler":
+        s = get_settings()
+        # el presupuesto es de la máquina: con varios workers cada uno usa su parte
+        budget = s.STT_CPU_BUDGET if s.STT_CPU_BUDGET > 0 else (os.cpu_count() or 4)
+        return cls(
+            core_budget=max(1, budget // max(1, s.WORKERS)),
+            min_threads=s.STT_THREADS_MIN,
+            max_threads=s.STT_THREADS_MAX,
+            max_jobs=s.WHISPER_MAX_CONCURRENCY,
+        )
+
+    def _drop(self, job: _Job, exc: Exception) -> None:
+        job.dropped = True
+        if not job.future.done():
+            job.future.set_exception(exc)
+        self.superseded += 1
+
+    async def submit(
+        self,
+        session_id: str,
+        kind: JobKind,
+        fn: Callable[[int], Awaitable[Any]],
+        threads: Optional[int] = None,
+    ) -> Any:
+        loop = asyncio.get_running_loop()
+        self._last_seen[session_id] = time.monotonic()
+
+        # un parcial pendiente de la misma sesión queda obsoleto
+        stale = self._pending_partial.pop(session_id, None)
+        if stale is not None:
+            self._drop(stale, JobSuperseded("partial superseded"))
+
+        job = _Job(kind=kind, seq=next(self._seq), session_id=session_id, fn=fn, future=loop.create_future())
+        if threads:
+            job.fixed_threads = max(1, min(threads, self.core_budget))
+        if kind == JobKind.partial:
+            self._pending_partial[session_id] = job
+        heapq.heappush(self._queue, job)
+        self._dispatch()
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # quien esperaba se fue: fuera de la cola o cancelar el que corre
+            job.dropped = True
+            if self._pending_partial.get(session_id) is job:
+                self._pending_partial.pop(session_id, None)
+            if job.task is not None:
+                job.task.cancel()
+            raise
+
+    def cancel(self, session_id: str, kind: Optional[JobKind] = None) -> int:
+        # saca de la cola y cancela en curso (el subproceso whisper muere con la tarea)
+        n = 0
+        if kind is None:
+            self._last_seen.pop(session_id, None)
+        if kind in (None, JobKind.partial):
+            self._pending_partial.pop(session_id, None)
+        for job in self._queue:
+            if job.session_id == session_id and not job.dropped and kind in (None, job.kind):
+                job.dropped = True
+                if not job.future.done():
+                    job.future.set_exception(JobCancelled("session closed"))
+                n += 1
+        for job in list(self._running.values()):
+            if job.session_id == session_id and kind in (None, job.kind):
+                if not job.future.done():
+                    job.future.set_exception(JobCancelled("session closed"))
+                if job.task is not None:
+                    job.task.cancel()
+                n += 1
+        self.cancelled += n
+        return n
+
+    def _active_sessions(self) -> int:
+        limit = time.monotonic() - _ACTIVE_SESSION_WINDOW_S
+        for sid in [sid for sid, t in self._last_seen.items() if t < limit]:
+            del self._last_seen[sid]
+        return len(self._last_seen)
+
+    def _pick_threads(self, job: _Job) -> int:
+        if job.fixed_threads:
+            return job.fixed_threads
+        # el presupuesto se reparte entre lo que corre, lo que espera y las
+        # sesiones que siguen mandando audio: el primero no se lo queda entero
+        free = self.core_budget - self._threads_in_use
+        waiting = sum(1 for j in self._queue if not j.dropped)
+        active = max(1, len(self._running) + waiting, self._active_sessions())
+        share = self.core_budget // active
+        return max(self.min_threads, min(self.max_threads, share, free))
+
+    def _dispatch(self) -> None:
+        while self._queue and len(self._running) < self.max_jobs:
+            if self._queue[0].dropped:
+                heapq.heappop(self._queue)
+                continue
+            needed = self._queue[0].fixed_threads or self.min_threads
+            if self.core_budget - self._threads_in_use < needed:
+                return
+
+            threads = self._pick_threads(self._queue[0])
+            job = heapq.heappop(self._queue)
+            if self._pending_partial.get(job.session_id) is job:
+                self._pending_partial.pop(job.session_id, None)
+
+            job.threads = threads
+            self._threads_in_use += threads
+            self._running[job.seq] = job
+            job.task = asyncio.create_task(self._run(job))
+
+    async def _run(self, job: _Job) -> None:
+        try:
+            result = await job.fn(job.threads)
+            if not job.future.done():
+                job.future.set_result(result)
+        except asyncio.CancelledError:
+            if not job.future.done():
+                job.future.cancel()
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            self._running.pop(job.seq, None)
+            self._threads_in_use -= job.threads
+            self.completed += 1
+            self._dispatch()
+
+    def queue_depth(self) -> dict[tuple[str, ...], float]:
+        depth = {(k.name,): 0.0 for k in JobKind}
+        for j in self._queue:
+            if not j.dropped:
+                depth[(j.kind.name,)] += 1
+        return depth
+
+    def stats(self) -> dict[str, Any]:
+        queued = [j for j in self._queue if not j.dropped]
+        return {
+            "queue_depth": len(queued),
+            "queued_finals": sum(1 for j in queued if j.kind == JobKind.final),
+            "queued_partials": sum(1 for j in queued if j.kind == JobKind.partial),
+            "running": len(self._running),
+            "threads_in_use": self._threads_in_use,
+            "core_budget": self.core_budget,
+            "max_jobs": self.max_jobs,
+            "completed": self.completed,
+            "superseded": self.superseded,
+            "cancelled": self.cancelled,
+        }
+
+
+@lru_cache
+def get_stt_scheduler() -> TranscriptionScheduler:
+    scheduler = TranscriptionScheduler.from_settings()
+    STT_QUEUE_DEPTH.set_function(scheduler.queue_depth)
+    STT_JOBS_RUNNING.set_function(lambda: len(scheduler._running))
+    return scheduler
@@ -0,0 +1,344 @@
+from __future__ import annotations
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+from functools import lru_cache
+from typing import Any, Optional
+
+import httpx
+
+from app.core.config import Settings, get_settings
+from app.core.metrics import WHISPER_RUNS
+from app.core.timing import span
+
+logger = logging.getLogger("app.whisper_pool")
+
+# (bin, model, language) -> workers con el modelo ya cargado
+PoolKey = tuple[str, str, str]
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return int(s.getsockname()[1])
+
+
+def resolve_server_bin(config: dict[str, Any], cli_bin: Optional[str] = None) -> str:
+    # config > env > junto al binario CLI > PATH
+    b = config.get("whisper_server_bin") or get_settings().WHISPER_SERVER_BIN
+    if isinstance(b, str) and b.strip():
+        b = b.strip()
+        resolved = shutil.which(b) if "/" not in b and "\\" not in b else b
+        if resolved and os.path.exists(resolved):
+            return resolved
+        raise ValueError(f"WHISPER_SERVER_BIN not found: {b}")
+
+    if cli_bin:
+        candidate = os.path.join(os.path.dirname(cli_bin), "whisper-server")
+        if os.path.exists(candidate):
+            return candidate
+
+    which = shutil.which("whisper-server")
+    if which:
+        return which
+
+    raise ValueError("whisper-server not found (set env WHISPER_SERVER_BIN)")
+
+
+def pool_enabled(config: dict[str, Any]) -> bool:
+    v = config.get("whisper_pool")
+    if isinstance(v, bool):
+        return v
+    return bool(get_settings().WHISPER_POOL_ENABLED)
+
+
+def pool_threads() -> int:
+    # hilos reales de cada whisper-server (su default es min(4, núcleos));
+    # el scheduler reserva estos y no los que reparte para el CLI
+    threads = get_settings().WHISPER_POOL_THREADS
+    return threads if threads > 0 else min(4, os.cpu_count() or 4)
+
+
+def pool_timeout_s(config: dict[str, Any]) -> float:
+    # config.timeout_s manda; si no, WHISPER_POOL_REQUEST_TIMEOUT_S
+    t = config.get("timeout_s")
+    if isinstance(t, (int, float)) and not isinstance(t, bool) and t > 0:
+        return float(t)
+    return float(get_settings().WHISPER_POOL_REQUEST_TIMEOUT_S)
+
+
+class WhisperServerWorker:
+    def __init__(self, key: PoolKey, host: str, threads: int = 0) -> None:
+        self.key = key
+        self.host = host
+        self.threads = threads
+        self.port: int = 0
+        self.proc: Optional[asyncio.subprocess.Process] = None
+        self.client: Optional[httpx.AsyncClient] = None
+        self.restarts = 0
+        self.health_failures = 0
+        self.busy = False
+        self.started_at = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self, startup_timeout_s: float) -> None:
+        bin_path, model_path, lang = self.key
+        self.port = _free_port(self.host)
+
+        args = [bin_path, "-m", model_path, "--host", self.host, "--port", str(self.port)]
+        if lang:
+            args += ["-l", lang]
+        if self.threads > 0:
+            args += ["-t", str(self.threads)]
+
+        self.proc = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        self.client = httpx.AsyncClient(base_url=f"http://{self.host}:{self.port}")
+        self.started_at = time.monotonic()
+        self.health_failures = 0
+
+        # el modelo se carga una sola vez aquí; esperamos a que el server responda
+        deadline = time.monotonic() + startup_timeout_s
+        while time.monotonic() < deadline:
+            if not self.alive:
+                code = self.proc.returncode if self.proc else None
+                await self.stop()
+                raise ValueError(f"whisper-server exited during startup (exit {code})")
+            if await self.healthy():
+                logger.info("whisper-server ready on port %s (model=%s)", self.port, model_path)
+                return
+            await asyncio.sleep(0.2)
+
+        await self.stop()
+        raise ValueError(f"whisper-server: startup timeout after {startup_timeout_s}s")
+
+    async def healthy(self) -> bool:
+        if not self.alive or self.client is None:
+            return False
+        try:
+            r = await self.client.get("/health", timeout=2.0)
+            if r.status_code == 404:
+                # builds viejos sin /health: basta con que el server conteste
+                r = await self.client.get("/", timeout=2.0)
+                return r.status_code < 500
+            return r.status_code == 200
+        except httpx.HTTPError:
+            return False
+
+    async def stop(self) -> None:
+        if self.client is not None:
+            try:
+                await self.client.aclose()
+            except Exception:
+                pass
+            self.client = None
+
+        proc, self.proc = self.proc, None
+        if proc is None or proc.returncode is not None:
+            return
+        try:
+            proc.terminate()
+            await asyncio.wait_for(proc.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+        except ProcessLookupError:
+            pass
+
+    async def restart(self, startup_timeout_s: float) -> None:
+        await self.stop()
+        self.restarts += 1
+        await self.start(startup_timeout_s)
+
+    async def transcribe(self, wav_bytes: bytes, timeout_s: float, response_format: str = "json") -> dict[str, Any]:
+        if self.client is None:
+            raise ValueError("whisper-server worker not started")
+
+        _, _, lang = self.key
+        data = {"response_format": response_format, "temperature": "0.0"}
+        if lang:
+            data["language"] = lang
+
+        r = await self.client.post(
+            "/inference",
+            files={"file": ("audio.wav", wav_bytes, "audio/wav")},
+            data=data,
+            timeout=timeout_s,
+        )
+        if r.status_code >= 400:
+            raise ValueError(f"whisper-server http {r.status_code}: {r.text[:300]}")
+        return r.json()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "port": self.port,
+            "alive": self.alive,
+            "busy": self.busy,
+            "restarts": self.restarts,
+            "health_failures": self.health_failures,
+        }
+
+
+class _ModelPool:
+    def __init__(self, key: PoolKey, size: int) -> None:
+        self.key = key
+        self.size = max(1, size)
+        self.workers: list[WhisperServerWorker] = []
+        self.idle: asyncio.Queue[WhisperServerWorker] = asyncio.Queue()
+        self.spawn_lock = asyncio.Lock()
+
+
+class WhisperWorkerPool:
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        self.settings = settings or get_settings()
+        self._pools: dict[PoolKey, _ModelPool] = {}
+        self._health_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    def _pool(self, key: PoolKey) -> _ModelPool:
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = _ModelPool(key, self.settings.WHISPER_POOL_SIZE)
+            self._pools[key] = pool
+        return pool
+
+    def _ensure_health_task(self) -> None:
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _acquire(self, pool: _ModelPool) -> WhisperServerWorker:
+        startup_timeout_s = self.settings.WHISPER_POOL_STARTUP_TIMEOUT_S
+
+        if pool.idle.empty() and len(pool.workers) < pool.size:
+            async with pool.spawn_lock:
+                if pool.idle.empty() and len(pool.workers) < pool.size:
+                    worker = WhisperServerWorker(pool.key, self.settings.WHISPER_POOL_HOST, self.settings.WHISPER_POOL_THREADS)
+                    pool.workers.append(worker)
+                    try:
+                        await worker.start(startup_timeout_s)
+                    except Exception:
+                        pool.workers.remove(worker)
+                        raise
+                    if self._closed:
+                        # aclose() llegó mientras arrancaba: no dejamos el proceso vivo
+                        pool.workers.remove(worker)
+                        await worker.stop()
+                        raise ValueError("whisper pool is closed")
+                    worker.busy = True
+                    return worker
+
+        worker = await pool.idle.get()
+        worker.busy = True
+        async with worker.lock:
+            if not worker.alive:
+                # se cayó mientras estaba libre: lo levantamos antes de usarlo
+                logger.warning("whisper-server on port %s died, restarting", worker.port)
+                try:
+                    await worker.restart(startup_timeout_s)
+                except Exception:
+                    worker.busy = False
+                    pool.idle.put_nowait(worker)
+                    raise
+        return worker
+
+    def _release(self, pool: _ModelPool, worker: WhisperServerWorker) -> None:
+        worker.busy = False
+        if worker in pool.workers:
+            pool.idle.put_nowait(worker)
+
+    async def transcribe(
+        self,
+        key: PoolKey,
+        wav_bytes: bytes,
+        timeout_s: float,
+        response_format: str = "json",
+    ) -> dict[str, Any]:
+        if self._closed:
+            raise ValueError("whisper pool is closed")
+
+        self._ensure_health_task()
+        pool = self._pool(key)
+        with span("whisper_pool_wait"):
+            worker = await self._acquire(pool)
+        try:
+            with span("whisper_server"):
+                res = await worker.transcribe(wav_bytes, timeout_s, response_format)
+            WHISPER_RUNS.inc(backend="server", outcome="ok")
+            return res
+        except httpx.TimeoutException:
+            # un worker colgado no vuelve al pool sano
+            WHISPER_RUNS.inc(backend="server", outcome="timeout")
+            await worker.stop()
+            raise ValueError(f"whisper-server: timeout after {timeout_s}s")
+        except httpx.HTTPError as e:
+            WHISPER_RUNS.inc(backend="server", outcome="error")
+            if not worker.alive:
+                await worker.stop()
+            raise ValueError(f"whisper-server: {e}") from e
+        finally:
+            self._release(pool, worker)
+
+    async def _health_loop(self) -> None:
+        interval = max(0.5, float(self.settings.WHISPER_POOL_HEALTH_INTERVAL_S))
+        while not self._closed:
+            await asyncio.sleep(interval)
+            for pool in list(self._pools.values()):
+                for worker in list(pool.workers):
+                    if worker.busy or worker.lock.locked():
+                        continue
+                    if worker.alive and await worker.healthy():
+                        worker.health_failures = 0
+                        continue
+
+                    worker.health_failures += 1
+                    if worker.alive and worker.health_failures < 3:
+                        continue
+
+                    logger.warning("whisper-server on port %s unhealthy, restarting", worker.port)
+                    async with worker.lock:
+                        try:
+                            await worker.restart(self.settings.WHISPER_POOL_STARTUP_TIMEOUT_S)
+                        except Exception:
+                            logger.exception("whisper-server restart failed (model=%s)", pool.key[1])
+
+    async def aclose(self) -> None:
+        self._closed = True
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._health_task = None
+
+        for pool in self._pools.values():
+            for worker in pool.workers:
+                await worker.stop()
+        self._pools.clear()
+
+    def stats(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "model": key[1],
+                "language": key[2],
+                "size": pool.size,
+                "idle": pool.idle.qsize(),
+                "workers": [w.stats() for w in pool.workers],
+            }
+            for key, pool in self._pools.items()
+        ]
+
+
+@lru_cache
+def get_whisper_pool() -> WhisperWorkerPool:
+    return WhisperWorkerPool()
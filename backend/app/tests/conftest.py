@@ -0,0 +1,71 @@
+import sys
+import textwrap
+
+import pytest
+
+# whisper-cli falso: duerme un poco, imprime/escribe "hola mundo" y registra
+# cada llamada (duración del WAV y modo de entrada)
+FAKE_WHISPER_CLI = textwrap.dedent(
+    """
+    import io, os, sys, time, wave
+    args = sys.argv[1:]
+    log = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calls.log")
+    src = args[args.index("-f") + 1] if "-f" in args else ""
+    if src == "-" and os.environ.get("FAKE_WHISPER_NO_STDIN"):
+        # como los builds viejos: avisa por stderr y sale con 0
+        print("error: failed to read WAV file '-'", file=sys.stderr)
+        sys.exit(0)
+    mode = "stdin" if src == "-" else ("memfd" if src.startswith("/dev/fd/") else "file")
+    secs = 0.0
+    if src:
+        fp = io.BytesIO(sys.stdin.buffer.read()) if src == "-" else src
+        with wave.open(fp, "rb") as wf:
+            secs = wf.getnframes() / wf.getframerate()
+    with open(log, "a") as f:
+        f.write(f"{secs:.3f} {mode}\\n")
+    time.sleep(float(os.environ.get("FAKE_WHISPER_SLEEP", "0.3")))
+    if "-of" in args:
+        with open(args[args.index("-of") + 1] + ".txt", "w") as f:
+            f.write("hola mundo\\n")
+    print("[00:00:00.000 --> 00:00:00.100]   hola mundo")
+    """
+)
+
+
+@pytest.fixture
+def fake_whisper_cli(tmp_path):
+    script = tmp_path / "whisper-cli"
+    script.write_text(f"#!{sys.executable}\n" + FAKE_WHISPER_CLI)
+    script.chmod(0o755)
+    return str(script)
+
+
+def read_calls(cli_path: str) -> list[float]:
+    import os
+
+    log = os.path.join(os.path.dirname(cli_path), "calls.log")
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return [float(line.split()[0]) for line in f if line.strip()]
+
+
+def read_call_modes(cli_path: str) -> list[str]:
+    import os
+
+    log = os.path.join(os.path.dirname(cli_path), "calls.log")
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return [line.split()[1] for line in f if line.strip()]
+
+
+def mock_llm_http(monkeypatch, handler, provider: str = "openai_compat") -> None:
+    # el provider LLM habla con un httpx.MockTransport en vez de la red
+    import httpx
+
+    from app.services.http_clients import HTTPClientRegistry
+
+    registry = HTTPClientRegistry()
+    monkeypatch.setattr(registry, "_new_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(f"app.providers.llm.{provider}.get_http_clients", lambda: registry)
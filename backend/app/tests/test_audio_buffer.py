@@ -0,0 +1,44 @@
+import pytest
+
+from app.utils.audio_buffer import PCMBuffer
+
+
+def test_append_and_views_across_blocks():
+    buf = PCMBuffer(block_size=4)
+    for chunk in (b"\x00\x01", b"\x02\x03\x04\x05", b"\x06\x07\x08"):
+        buf.append(chunk)
+
+    assert len(buf) == 9
+    assert bytes(buf.snapshot()) == bytes(range(9))
+    assert bytes(buf.tail(3)) == b"\x06\x07\x08"
+    assert bytes(buf.view(2, 6)) == b"\x02\x03\x04\x05"
+
+
+def test_tail_inside_one_block_is_a_readonly_view():
+    buf = PCMBuffer(block_size=8)
+    buf.append(b"abcdef")
+
+    tail = buf.tail(4)
+    assert tail.readonly
+    with pytest.raises(TypeError):
+        tail[0] = 0
+
+    # append posterior no altera la vista ya entregada
+    buf.append(b"gh")
+    assert bytes(tail) == b"cdef"
+
+
+def test_release_keeps_absolute_offsets():
+    buf = PCMBuffer(block_size=4)
+    buf.append(bytes(range(10)))
+
+    buf.release_before(6)
+    assert buf.start == 6 and buf.end == 10
+    assert len(buf) == 4
+    assert bytes(buf.snapshot()) == b"\x06\x07\x08\x09"
+    assert bytes(buf.view(0, 8)) == b"\x06\x07"
+
+    buf.clear()
+    buf.append(b"\x0a\x0b")
+    assert buf.start == 10
+    assert bytes(buf.snapshot()) == b"\x0a\x0b"
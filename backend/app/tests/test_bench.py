@@ -0,0 +1,104 @@
+import io
+import os
+import subprocess
+import sys
+import time
+import wave
+
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.main import app
+from app.services.http_clients import HTTPClientRegistry
+from bench import mock_llm
+from bench.common import compare, percentiles
+from bench.ws_stt import FAKE_WHISPER, SR, synthetic_audio
+
+
+def test_percentiles_and_compare():
+    p = percentiles([i / 1000 for i in range(1, 101)])
+    assert p["p50"] == 50.0 and p["p99"] == 99.0 and p["max"] == 100.0
+    assert percentiles([])["p95"] is None
+
+    baseline = {"finals": {"latency_ms": {"p95": 100.0}}, "throughput": {"realtime_streams": 8.0}}
+    keys = [("finals.latency_ms.p95", True), ("throughput.realtime_streams", False)]
+    ok = {"finals": {"latency_ms": {"p95": 110.0}}, "throughput": {"realtime_streams": 7.5}}
+    bad = {"finals": {"latency_ms": {"p95": 150.0}}, "throughput": {"realtime_streams": 4.0}}
+    assert compare(ok, baseline, keys, 0.2) == []
+    assert len(compare(bad, baseline, keys, 0.2)) == 2
+
+
+def test_synthetic_audio_alternates_speech_and_silence():
+    pcm = np.frombuffer(synthetic_audio(4.8), dtype="<i2").astype(np.float32)
+    assert len(pcm) == int(4.8 * SR)
+    speech = pcm[: int(1.6 * SR)]
+    silence = pcm[int(1.7 * SR) : int(2.3 * SR)]
+    assert np.sqrt(np.mean(speech**2)) > 50 * np.sqrt(np.mean(silence**2))
+
+
+def test_fake_whisper_honours_rtf():
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SR)
+        wf.writeframes(b"\x00\x00" * SR)
+
+    env = {**os.environ, "FAKE_WHISPER_RTF": "0.2", "FAKE_WHISPER_TEXT": "prueba"}
+    t0 = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, str(FAKE_WHISPER), "-m", "x.bin", "-f", "-"],
+        input=buf.getvalue(), capture_output=True, env=env, timeout=10,
+    )
+    elapsed = time.perf_counter() - t0
+
+    assert out.returncode == 0
+    assert "prueba" in out.stdout.decode()
+    assert elapsed >= 0.2
+
+
+def _route_to_mock(monkeypatch, provider: str) -> None:
+    # el backend habla con el mock en proceso (ASGI), sin sockets
+    registry = HTTPClientRegistry()
+    monkeypatch.setattr(
+        registry, "_new_client", lambda: httpx.AsyncClient(transport=httpx.ASGITransport(app=mock_llm.app))
+    )
+    monkeypatch.setattr(f"app.providers.llm.{provider}.get_http_clients", lambda: registry)
+    monkeypatch.setattr(mock_llm.app.state, "config", mock_llm.MockConfig(latency_ms=0, jitter_ms=0, tokens=3, token_ms=0))
+    mock_llm.app.state.stats.reset()
+
+
+def test_mock_llm_speaks_both_provider_shapes(monkeypatch):
+    monkeypatch.setattr(get_settings(), "GEMINI_BASE_URL", "http://mock-llm")
+    client = TestClient(app)
+    messages = [{"role": "user", "content": "hola"}]
+
+    _route_to_mock(monkeypatch, "gemini")
+    r = client.post("/llm/generate", json={
+        "messages": messages, "provider": "gemini", "config": {"api_key": "k", "cache": False},
+    })
+    assert r.status_code == 200
+    assert r.json()["text"] == "palabra0 palabra1 palabra2"
+
+    _route_to_mock(monkeypatch, "openai_compat")
+    r = client.post("/llm/generate/stream", json={
+        "messages": messages,
+        "config": {"base_url": "http://mock-llm/v1", "api_key": "k", "model": "m", "cache": False},
+    })
+    assert '"text": "palabra0"' in r.text and "event: done" in r.text
+    assert mock_llm.app.state.stats.to_dict()["requests"] == {"chat/completions": 1}
+
+
+def test_mock_llm_injects_429():
+    mock_llm.app.state.stats.reset()
+    client = TestClient(mock_llm.app)
+    client.post("/_mock/config", json={"latency_ms": 0, "jitter_ms": 0, "rate_429": 1.0, "retry_after_s": 2})
+    try:
+        r = client.post("/v1/chat/completions", json={"model": "m", "messages": []})
+        assert r.status_code == 429 and r.headers["retry-after"] == "2.0"
+        stats = client.get("/_mock/stats").json()
+        assert stats["status"] == {"429": 1} and stats["inflight"] == 0
+    finally:
+        mock_llm.app.state.config = mock_llm.MockConfig()
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.providers.llm.base import LLMGenerateRequest, LLMMessage
+from app.providers.llm.openai_compat import OpenAICompatLLMProvider
+from app.services.http_clients import HTTPClientRegistry
+
+
+@pytest.mark.asyncio
+async def test_clients_are_shared_per_provider_and_base_url():
+    registry = HTTPClientRegistry()
+
+    a = registry.get("openai_compat", "https://api.example.com/v1")
+    b = registry.get("openai_compat", "https://api.example.com/v1/")
+    c = registry.get("openai_compat", "https://other.example.com/v1")
+
+    assert a is b
+    assert a is not c
+
+    await registry.aclose()
+    assert a.is_closed and c.is_closed
+    assert registry.stats() == []
+
+
+@pytest.mark.asyncio
+async def test_openai_compat_reuses_pooled_client(monkeypatch):
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "hola"}}]})
+
+    registry = HTTPClientRegistry()
+    created = []
+
+    def new_client() -> httpx.AsyncClient:
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(registry, "_new_client", new_client)
+    monkeypatch.setattr("app.providers.llm.openai_compat.get_http_clients", lambda: registry)
+
+    provider = OpenAICompatLLMProvider()
+    req = LLMGenerateRequest(messages=[LLMMessage(role="user", content="hola")])
+    config = {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m"}
+
+    for _ in range(3):
+        res = await provider.generate(req, config)
+        assert res.text == "hola"
+
+    assert len(created) == 1
+    assert seen == ["https://api.example.com/v1/chat/completions"] * 3
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_clients_of_a_previous_loop_are_closed():
+    registry = HTTPClientRegistry()
+
+    async def make() -> httpx.AsyncClient:
+        return registry.get("openai_compat", "https://api.example.com/v1")
+
+    # loop ya terminado (p.ej. otro TestClient): se cierra desde el loop actual
+    result: list[httpx.AsyncClient] = []
+    thread = threading.Thread(target=lambda: result.append(asyncio.run(make())))
+    thread.start()
+    thread.join(5)
+    stale = result[0]
+
+    fresh = await make()
+    await asyncio.sleep(0)
+    assert fresh is not stale and stale.is_closed and not fresh.is_closed
+
+    # loop vivo en otro hilo: el cierre se agenda allí
+    other = asyncio.new_event_loop()
+    thread = threading.Thread(target=other.run_forever)
+    thread.start()
+    try:
+        on_other = asyncio.run_coroutine_threadsafe(make(), other).result(5)
+        # el de este loop se cierra aquí en cuanto el loop vuelve a correr
+        await asyncio.sleep(0.01)
+        assert fresh.is_closed
+        again = await make()
+        for _ in range(50):
+            if on_other.is_closed:
+                break
+            await asyncio.sleep(0.01)
+        assert on_other.is_closed and again is not on_other
+    finally:
+        other.call_soon_threadsafe(other.stop)
+        thread.join(5)
+        other.close()
+    await registry.aclose()
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.api import llm as llm_api
+from app.core.config import get_settings
+from app.main import app
+from app.providers.llm.base import LLMGenerateResponse, LLMProvider
+
+
+class FakeProvider(LLMProvider):
+    name = "openai_compat"
+
+    def __init__(self) -> None:
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, req, config):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            prompt = req.messages[-1].content
+            # los primeros tardan más: el orden de llegada no es el de la petición
+            await asyncio.sleep(0.05 if prompt == "0" else 0.01)
+            if prompt == "boom":
+                raise ValueError("bad prompt")
+            return LLMGenerateResponse(text=f"echo {prompt}", provider=self.name, model="m")
+        finally:
+            self.active -= 1
+
+
+def _items(prompts):
+    return [
+        {"messages": [{"role": "user", "content": p}], "provider": "openai_compat", "config": {"cache": False}}
+        for p in prompts
+    ]
+
+
+def test_batch_returns_results_in_order_with_per_item_errors(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setitem(llm_api._llm_router._providers, "openai_compat", provider)
+    monkeypatch.setattr(get_settings(), "LLM_BATCH_MAX_CONCURRENCY", 2)
+
+    client = TestClient(app)
+    r = client.post("/llm/batch", json={"items": _items(["0", "1", "boom", "3", "4"])})
+
+    assert r.status_code == 200
+    results = r.json()["results"]
+    assert [x["index"] for x in results] == [0, 1, 2, 3, 4]
+    assert [x["ok"] for x in results] == [True, True, False, True, True]
+    assert results[0]["result"]["text"] == "echo 0"
+    assert results[2]["error"]["code"] == "CONFIG_ERROR"
+    assert provider.peak == 2
+
+
+def test_batch_stream_emits_items_as_they_finish(monkeypatch):
+    provider = FakeProvider()
+    monkeypatch.setitem(llm_api._llm_router._providers, "openai_compat", provider)
+
+    client = TestClient(app)
+    r = client.post("/llm/batch", json={"items": _items(["0", "1"]), "stream": True})
+
+    assert r.status_code == 200
+    blocks = [dict(line.split(": ", 1) for line in b.splitlines()) for b in r.text.strip().split("\n\n")]
+    events = [(b["event"], json.loads(b["data"])) for b in blocks]
+    assert [e for e, _ in events] == ["item", "item", "done"]
+    assert events[0][1]["index"] == 1
+    assert events[-1][1] == {"total": 2, "ok": 2, "failed": 0}
+
+
+def test_batch_rejects_oversized_requests(monkeypatch):
+    monkeypatch.setattr(get_settings(), "LLM_BATCH_MAX_ITEMS", 2)
+    client = TestClient(app)
+    r = client.post("/llm/batch", json={"items": _items(["a", "b", "c"])})
+    assert r.status_code == 400
+    assert r.json()["error"]["code"] == "VALIDATION_ERROR"
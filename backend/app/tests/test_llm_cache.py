@@ -0,0 +1,146 @@
+import pytest
+
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMMessage, LLMProvider
+from app.services.llm_cache import LLMResponseCache, cache_key
+from app.services.llm_router import LLMRouter
+
+
+def _req(text: str = "hola", temperature: float = 0.0) -> LLMGenerateRequest:
+    return LLMGenerateRequest(messages=[LLMMessage(role="user", content=text)], temperature=temperature)
+
+
+class CountingProvider(LLMProvider):
+    name = "openai_compat"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def generate(self, req, config):
+        self.calls += 1
+        return LLMGenerateResponse(text=f"resp {self.calls}", provider=self.name, model="m")
+
+
+def test_key_depends_on_api_key_and_model():
+    base = {"base_url": "https://a/v1", "model": "m", "api_key": "one"}
+    assert cache_key("openai_compat", _req(), base) == cache_key("openai_compat", _req(), dict(base))
+    assert cache_key("openai_compat", _req(), base) != cache_key("openai_compat", _req(), {**base, "api_key": "two"})
+    assert cache_key("openai_compat", _req(), base) != cache_key("openai_compat", _req(), {**base, "api_key": None})
+    assert cache_key("openai_compat", _req(), base) != cache_key("openai_compat", _req(), {**base, "model": "m2"})
+    assert cache_key("openai_compat", _req(), base) != cache_key("openai_compat", _req("chau"), base)
+
+    routed = {"targets": [{"provider": "openai_compat", "model": "m", "api_key": "one"}]}
+    other = {"targets": [{"provider": "openai_compat", "model": "m", "api_key": "two"}]}
+    assert cache_key("routed", _req(), routed) != cache_key("routed", _req(), other)
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_ttl(monkeypatch):
+    cache = LLMResponseCache(max_entries=2, ttl_s=10)
+    res = LLMGenerateResponse(text="x", provider="p")
+
+    await cache.put("a", res)
+    await cache.put("b", res)
+    assert await cache.get("a") is not None  # "a" pasa a ser el más reciente
+    await cache.put("c", res)
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None
+
+    import app.services.llm_cache as llm_cache
+
+    now = llm_cache.time.time()
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now + 11)
+    assert await cache.get("a") is None
+    assert cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    first = LLMResponseCache(sqlite_path=path)
+    await first.put("k", LLMGenerateResponse(text="hola", provider="p", model="m", usage={"t": 1}))
+
+    second = LLMResponseCache(sqlite_path=path)
+    hit = await second.get("k")
+
+    assert hit == LLMGenerateResponse(text="hola", provider="p", model="m", usage={"t": 1})
+    assert second.stats()["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_router_serves_repeats_from_cache_and_honours_opt_out():
+    router = LLMRouter(cache=LLMResponseCache())
+    provider = CountingProvider()
+    router._providers[provider.name] = provider
+    config = {"base_url": "https://a/v1", "model": "m"}
+
+    first = await router.generate(_req(), config)
+    second = await router.generate(_req(), config)
+    assert (first.text, first.cached) == ("resp 1", False)
+    assert (second.text, second.cached) == ("resp 1", True)
+
+    await router.generate(_req(), {**config, "cache": False})
+    await router.generate(_req(temperature=0.7), config)
+    assert provider.calls == 3
+    assert router.cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_router_coalesces_identical_concurrent_calls():
+    import asyncio
+
+    class SlowProvider(CountingProvider):
+        async def generate(self, req, config):
+            await asyncio.sleep(0.05)
+            return await super().generate(req, config)
+
+    router = LLMRouter(cache=LLMResponseCache())
+    provider = SlowProvider()
+    router._providers[provider.name] = provider
+    config = {"base_url": "https://a/v1", "model": "m"}
+
+    results = await asyncio.gather(*(router.generate(_req(temperature=0.7), config) for _ in range(4)))
+
+    assert {r.text for r in results} == {"resp 1"}
+    assert provider.calls == 1
+    assert router.stats()["coalescing"]["coalesced"] == 3
+
+
+@pytest.mark.asyncio
+async def test_router_does_not_coalesce_across_api_keys():
+    import asyncio
+
+    class SlowProvider(CountingProvider):
+        async def generate(self, req, config):
+            await asyncio.sleep(0.05)
+            return await super().generate(req, config)
+
+    router = LLMRouter(cache=LLMResponseCache())
+    provider = SlowProvider()
+    router._providers[provider.name] = provider
+    config = {"base_url": "https://a/v1", "model": "m", "cache": False}
+
+    results = await asyncio.gather(
+        router.generate(_req(), {**config, "api_key": "one"}),
+        router.generate(_req(), {**config, "api_key": "two"}),
+        router.generate(_req(), {**config, "api_key": "two"}),
+    )
+
+    assert provider.calls == 2
+    assert len({r.text for r in results}) == 2
+    assert router.stats()["coalescing"]["coalesced"] == 1
+
+
+@pytest.mark.asyncio
+async def test_invalid_config_is_rejected_before_the_cache():
+    router = LLMRouter(cache=LLMResponseCache())
+    config = {"base_url": "https://a/v1", "model": "m", "api_key": "k"}
+    key = cache_key("openai_compat", _req(), {**config, "api_key": None})
+    await router.cache.put(key, LLMGenerateResponse(text="de otro", provider="openai_compat"))
+
+    with pytest.raises(ValueError, match="api_key"):
+        await router.generate(_req(), {**config, "api_key": None})
+    with pytest.raises(ValueError, match="api_key"):
+        async for _ in router.stream(_req(), {**config, "api_key": ""}):
+            pass
+    assert router.cache.stats()["hits"] == 0
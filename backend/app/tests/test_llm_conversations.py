@@ -0,0 +1,174 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import Response
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.api.llm import LLMGenerateIn, MessageIn, generate_llm
+from app.main import app
+from app.providers.llm.base import LLMMessage
+from app.services.context_budget import fit_context
+from app.services.conversation_store import get_conversation_store
+from app.tests.conftest import mock_llm_http
+
+CONFIG = {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m", "cache": False}
+
+
+def _reply(text: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}], "model": "m"})
+
+
+def test_fit_context_drops_oldest_but_keeps_system_and_recent():
+    msgs = [LLMMessage(role="system", content="s")] + [
+        LLMMessage(role="user", content=f"turno {i} " + "x" * 400) for i in range(6)
+    ]
+    plan = fit_context(msgs, budget=350, keep_last=2)
+
+    assert plan.kept[0].role == "system"
+    assert [m.content[:7] for m in plan.kept[-2:]] == ["turno 4", "turno 5"]
+    assert plan.dropped and plan.dropped[0].content.startswith("turno 0")
+
+
+def test_conversation_appends_deltas_and_stays_within_budget(monkeypatch):
+    sent: list[list[dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content)["messages"])
+        return _reply(f"respuesta {len(sent)}")
+
+    mock_llm_http(monkeypatch, handler)
+    monkeypatch.setattr(get_settings(), "LLM_CONTEXT_KEEP_LAST", 2)
+
+    client = TestClient(app)
+    r = client.post("/llm/conversations", json={"system_prompt": "Eres un asistente"})
+    assert r.status_code == 200
+    cid = r.json()["id"]
+
+    for i in range(8):
+        r = client.post("/llm/generate", json={
+            "conversation_id": cid,
+            "messages": [{"role": "user", "content": f"pregunta {i} " + "y" * 200}],
+            "config": {**CONFIG, "context_budget_tokens": 250},
+        })
+        assert r.status_code == 200
+        body = r.json()
+        assert body["conversation_id"] == cid
+        assert body["context"]["prompt_tokens_est"] <= 250
+
+    # el primer turno llega entero; los últimos se recortan pero conservan system y el turno nuevo
+    assert sent[0][0] == {"role": "system", "content": "Eres un asistente"}
+    assert sent[-1][0]["role"] == "system"
+    assert sent[-1][-1]["content"].startswith("pregunta 7")
+    assert len(sent[-1]) < 2 * 8
+
+    history = client.get(f"/llm/conversations/{cid}").json()["messages"]
+    assert history[-1] == {"role": "assistant", "content": "respuesta 8"}
+
+
+def test_failed_turn_leaves_conversation_unchanged(monkeypatch):
+    mock_llm_http(monkeypatch, lambda request: httpx.Response(400, text="bad"))
+
+    client = TestClient(app)
+    cid = client.post("/llm/conversations", json={"messages": [{"role": "user", "content": "hola"}]}).json()["id"]
+
+    r = client.post("/llm/generate", json={
+        "conversation_id": cid,
+        "messages": [{"role": "user", "content": "otra"}],
+        "config": CONFIG,
+    })
+    assert r.status_code == 502
+    assert client.get(f"/llm/conversations/{cid}").json()["messages"] == [{"role": "user", "content": "hola"}]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_turn_leaves_conversation_unchanged(monkeypatch):
+    started = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        started.set()
+        await asyncio.sleep(10)
+        return _reply("tarde")
+
+    mock_llm_http(monkeypatch, handler)
+    conv = get_conversation_store().create(messages=[LLMMessage(role="user", content="hola")])
+    payload = LLMGenerateIn(messages=[MessageIn(role="user", content="otra")], conversation_id=conv.id, config=CONFIG)
+
+    # el cliente se va a mitad de turno
+    task = asyncio.create_task(generate_llm(payload, Response()))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert [m.content for m in conv.messages] == ["hola"]
+    assert not conv.lock.locked()
+    get_conversation_store().delete(conv.id)
+
+
+def test_summarize_folds_dropped_turns(monkeypatch):
+    calls: list[list[dict]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        msgs = json.loads(request.content)["messages"]
+        calls.append(msgs)
+        if msgs[0]["content"].startswith("Resume"):
+            return _reply("RESUMEN")
+        return _reply("ok")
+
+    mock_llm_http(monkeypatch, handler)
+    monkeypatch.setattr(get_settings(), "LLM_CONTEXT_KEEP_LAST", 1)
+    monkeypatch.setattr(get_settings(), "LLM_CONTEXT_SUMMARY_MAX_TOKENS", 20)
+
+    client = TestClient(app)
+    old = [{"role": "user", "content": "z" * 800}, {"role": "assistant", "content": "w" * 800}]
+    cid = client.post("/llm/conversations", json={"messages": old}).json()["id"]
+
+    r = client.post("/llm/generate", json={
+        "conversation_id": cid,
+        "messages": [{"role": "user", "content": "¿y ahora?"}],
+        "config": {**CONFIG, "context_budget_tokens": 100, "summarize_context": True},
+    })
+    assert r.status_code == 200
+    assert r.json()["context"]["summarized"] is True
+
+    final = calls[-1]
+    assert "RESUMEN" in final[0]["content"]
+    assert final[-1] == {"role": "user", "content": "¿y ahora?"}
+    assert client.get(f"/llm/conversations/{cid}").json()["summary"] == "RESUMEN"
+
+
+def test_unknown_conversation_is_404():
+    client = TestClient(app)
+    r = client.post("/llm/generate", json={"conversation_id": "nope", "messages": [], "config": CONFIG})
+    assert r.status_code == 404
+    assert r.json()["error"]["code"] == "NOT_FOUND"
+    assert client.delete("/llm/conversations/nope").status_code == 404
+
+
+def test_gemini_keeps_system_prompt_and_summary(monkeypatch):
+    sent: list[dict] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "ok"}]}}]})
+
+    mock_llm_http(monkeypatch, handler, provider="gemini")
+
+    conv = get_conversation_store().create(system_prompt="Eres breve")
+    conv.summary = "hablamos del tiempo"
+    client = TestClient(app)
+    r = client.post("/llm/generate", json={
+        "conversation_id": conv.id,
+        "provider": "gemini",
+        "messages": [{"role": "user", "content": "¿y mañana?"}],
+        "config": {"api_key": "k", "cache": False},
+    })
+    assert r.status_code == 200
+
+    system = sent[0]["systemInstruction"]["parts"][0]["text"]
+    assert "Eres breve" in system and "hablamos del tiempo" in system
+    assert [c["role"] for c in sent[0]["contents"]] == ["user"]
+    get_conversation_store().delete(conv.id)
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMHTTPError, LLMMessage, LLMProvider
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_router import LLMRouter
+from app.services.llm_routing import LLMHealthTracker
+from app.services.rate_limiter import ProviderRateLimiter
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, name: str, delay: float = 0.0, fail: int = 0) -> None:
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def generate(self, req, config):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise LLMHTTPError(self.name, self.fail, "broken")
+        return LLMGenerateResponse(text=f"from {self.name}", provider=self.name)
+
+
+def _router(*providers: FakeProvider) -> LLMRouter:
+    router = LLMRouter(cache=LLMResponseCache(), limiter=ProviderRateLimiter(), health=LLMHealthTracker())
+    for p in providers:
+        router._providers[p.name] = p
+    return router
+
+
+def _req() -> LLMGenerateRequest:
+    return LLMGenerateRequest(messages=[LLMMessage(role="user", content="hola")], temperature=0.7)
+
+
+@pytest.mark.asyncio
+async def test_routes_to_fastest_target():
+    slow, fast = FakeProvider("slow"), FakeProvider("fast")
+    router = _router(slow, fast)
+    router.health.record(("slow", "", ""), 1.0, ok=True)
+    router.health.record(("fast", "", ""), 0.1, ok=True)
+
+    res = await router.generate(_req(), {"targets": [{"provider": "slow"}, {"provider": "fast"}], "coalesce": False})
+
+    assert res.text == "from fast"
+    assert slow.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_wins_and_loser_is_cancelled():
+    stuck, backup = FakeProvider("stuck", delay=2.0), FakeProvider("backup", delay=0.02)
+    router = _router(stuck, backup)
+    router.health.record(("stuck", "", ""), 0.01, ok=True)
+    router.health.record(("backup", "", ""), 0.5, ok=True)
+    config = {"targets": [{"provider": "stuck"}, {"provider": "backup"}], "hedge": True, "hedge_after_ms": 50}
+
+    t0 = time.monotonic()
+    res = await router.generate(_req(), config)
+    await asyncio.sleep(0)
+
+    assert res.text == "from backup"
+    assert time.monotonic() - t0 < 0.5
+    assert stuck.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_failover_and_circuit_breaker(monkeypatch):
+    monkeypatch.setattr(get_settings(), "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(get_settings(), "LLM_RETRY_MAX_ATTEMPTS", 1)
+    broken, healthy = FakeProvider("broken", fail=503), FakeProvider("healthy")
+    router = _router(broken, healthy)
+    # broken parece el más rápido hasta que falla
+    router.health.record(("healthy", "", ""), 0.5, ok=True)
+    config = {"targets": [{"provider": "broken"}, {"provider": "healthy"}], "coalesce": False}
+
+    for _ in range(3):
+        res = await router.generate(_req(), config)
+        assert res.text == "from healthy"
+
+    # tras 2 fallos seguidos el circuito se abre y ya no se le manda tráfico
+    assert broken.calls == 2
+    circuits = {t["provider"]: t["circuit"] for t in router.health.stats()}
+    assert circuits == {"broken": "open", "healthy": "closed"}
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_failed_over():
+    rejecting, healthy = FakeProvider("rejecting", fail=400), FakeProvider("healthy")
+    router = _router(rejecting, healthy)
+    router.health.record(("healthy", "", ""), 0.5, ok=True)
+    config = {"targets": [{"provider": "rejecting"}, {"provider": "healthy"}], "coalesce": False}
+
+    for _ in range(3):
+        with pytest.raises(LLMHTTPError) as exc:
+            await router.generate(_req(), config)
+        assert exc.value.status_code == 400
+
+    # la petición era mala, no el target: ni failover ni circuito abierto
+    assert healthy.calls == 0
+    stats = {t["provider"]: t for t in router.health.stats()}
+    assert stats["rejecting"]["circuit"] == "closed" and stats["rejecting"]["failures"] == 0
@@ -0,0 +1,141 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from app.api.llm import LLMGenerateIn, MessageIn, generate_llm_stream
+from app.main import app
+from app.providers.llm.base import LLMMessage
+from app.services.conversation_store import get_conversation_store
+from app.tests.conftest import mock_llm_http
+
+SSE_BODY = (
+    'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n'
+    'data: {"choices":[{"delta":{"content":"Ho"}}]}\n\n'
+    'data: {"choices":[{"delta":{"content":"la"}}]}\n\n'
+    'data: {"choices":[],"usage":{"prompt_tokens":3,"completion_tokens":2}}\n\n'
+    "data: [DONE]\n\n"
+)
+
+
+def _parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_forwards_tokens_and_usage(monkeypatch):
+    sent = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.update(json.loads(request.content))
+        return httpx.Response(200, text=SSE_BODY, headers={"content-type": "text/event-stream"})
+
+    mock_llm_http(monkeypatch, handler)
+
+    client = TestClient(app)
+    payload = {
+        "messages": [{"role": "user", "content": "Hola"}],
+        "provider": "openai_compat",
+        "config": {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m"},
+    }
+    r = client.post("/llm/generate/stream", json=payload)
+
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    assert sent["stream"] is True
+
+    events = _parse_events(r.text)
+    assert events[:2] == [("token", {"text": "Ho"}), ("token", {"text": "la"})]
+    name, done = events[-1]
+    assert name == "done"
+    assert done["text"] == "Hola"
+    assert done["usage"] == {"prompt_tokens": 3, "completion_tokens": 2}
+
+
+def test_stream_config_error_is_http_400():
+    client = TestClient(app)
+    payload = {"messages": [{"role": "user", "content": "Hola"}], "provider": "openai_compat", "config": {}}
+    r = client.post("/llm/generate/stream", json=payload)
+
+    assert r.status_code == 400
+    assert r.json()["error"]["code"] == "CONFIG_ERROR"
+
+
+def test_stream_upstream_error_is_http_502(monkeypatch):
+    mock_llm_http(monkeypatch, lambda request: httpx.Response(500, text="boom"))
+
+    client = TestClient(app)
+    payload = {
+        "messages": [{"role": "user", "content": "Hola"}],
+        "provider": "openai_compat",
+        "config": {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m"},
+    }
+    r = client.post("/llm/generate/stream", json=payload)
+
+    assert r.status_code == 502
+    assert r.json()["error"]["code"] == "PROVIDER_ERROR"
+
+
+@pytest.mark.asyncio
+async def test_stream_turn_released_when_client_leaves_before_body(monkeypatch):
+    mock_llm_http(
+        monkeypatch,
+        lambda request: httpx.Response(200, text=SSE_BODY, headers={"content-type": "text/event-stream"}),
+    )
+    conv = get_conversation_store().create(messages=[LLMMessage(role="user", content="antes")])
+    payload = LLMGenerateIn(
+        messages=[MessageIn(role="user", content="Hola")],
+        conversation_id=conv.id,
+        config={"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m", "cache": False},
+    )
+    response = await generate_llm_stream(payload)
+    assert conv.lock.locked()
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # el socket ya está cerrado: ni siquiera sale la cabecera
+        raise OSError("connection reset")
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        await response(scope, receive, send)
+
+    assert not conv.lock.locked()
+    assert [m.content for m in conv.messages] == ["antes"]
+    get_conversation_store().delete(conv.id)
+
+
+@pytest.mark.asyncio
+async def test_stream_turn_released_when_cancelled_before_first_chunk(monkeypatch):
+    started = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        started.set()
+        await asyncio.sleep(10)
+        return httpx.Response(200, text=SSE_BODY, headers={"content-type": "text/event-stream"})
+
+    mock_llm_http(monkeypatch, handler)
+    conv = get_conversation_store().create(messages=[LLMMessage(role="user", content="antes")])
+    payload = LLMGenerateIn(
+        messages=[MessageIn(role="user", content="Hola")],
+        conversation_id=conv.id,
+        config={"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m", "cache": False},
+    )
+
+    task = asyncio.create_task(generate_llm_stream(payload))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert not conv.lock.locked()
+    assert [m.content for m in conv.messages] == ["antes"]
+    get_conversation_store().delete(conv.id)
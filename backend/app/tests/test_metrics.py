@@ -0,0 +1,85 @@
+import base64
+
+import httpx
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.core.metrics import LLM_REQUEST_SECONDS, STT_AUDIO_BYTES, MetricsRegistry
+from app.main import app
+from app.providers.llm.base import LLMGenerateRequest, LLMMessage
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_router import LLMRouter
+from app.tests.conftest import mock_llm_http
+
+
+def test_registry_renders_prometheus_text():
+    reg = MetricsRegistry()
+    c = reg.counter("t_requests_total", "peticiones", ("route",))
+    h = reg.histogram("t_latency_seconds", "latencia", buckets=(0.1, 1.0))
+    g = reg.gauge("t_depth", "cola", ("kind",))
+    c.inc(route='a"b')
+    c.inc(2, route='a"b')
+    h.observe(0.05)
+    h.observe(0.5)
+    h.observe(3)
+    g.set_function(lambda: {("final",): 2, ("partial",): 0})
+
+    text = reg.render()
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{route="a\\"b"} 3' in text
+    assert 't_latency_seconds_bucket{le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{le="1"} 2' in text
+    assert 't_latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "t_latency_seconds_count 3" in text
+    assert 't_depth{kind="final"} 2' in text
+    # registrar dos veces el mismo nombre devuelve la misma métrica
+    assert reg.counter("t_requests_total", "x", ("route",)) is c
+
+
+def test_metrics_endpoint_reflects_stt_and_llm_traffic(monkeypatch):
+    mock_llm_http(monkeypatch, lambda r: httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]}))
+
+    before_bytes = STT_AUDIO_BYTES.value(transport="json")
+    labels = {"provider": "openai_compat", "model": "metrics-m", "outcome": "ok"}
+    before_llm = LLM_REQUEST_SECONDS.count(**labels)
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-metrics", "config": {}})
+        ws.receive_json()
+        data = base64.b64encode(b"\x00\x01" * 8).decode("ascii")
+        ws.send_json({"type": "audio", "format": "pcm16", "sample_rate": 16000, "data": data})
+        ws.receive_json()
+        ws.send_json({"type": "stop"})
+
+    r = client.post("/llm/generate", json={
+        "messages": [{"role": "user", "content": "hola"}],
+        "config": {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "metrics-m", "cache": False},
+    })
+    assert r.status_code == 200
+
+    assert STT_AUDIO_BYTES.value(transport="json") == before_bytes + 16
+    assert LLM_REQUEST_SECONDS.count(**labels) == before_llm + 1
+
+    m = client.get("/metrics")
+    assert m.status_code == 200
+    assert m.headers["content-type"].startswith("text/plain")
+    assert "prompter_stt_active_sessions" in m.text
+    assert 'prompter_stt_queue_depth{kind="final"}' in m.text
+    assert 'prompter_llm_request_seconds_count{provider="openai_compat",model="metrics-m",outcome="ok"}' in m.text
+
+
+def test_llm_metric_labels_are_bounded(monkeypatch):
+    monkeypatch.setattr(get_settings(), "LLM_METRICS_MAX_MODELS", 2)
+    router = LLMRouter(cache=LLMResponseCache())
+    req = LLMGenerateRequest(messages=[LLMMessage(role="user", content="hola")])
+
+    labels = [router._metric_labels(req, {"model": f"m{i}"}) for i in range(4)]
+    assert [l["model"] for l in labels] == ["m0", "m1", "other", "other"]
+    assert router._metric_labels(req, {"model": "m1"})["model"] == "m1"
+    assert router._metric_labels(req, {"provider": "x" * 64})["provider"] == "unknown"
+    assert router._metric_labels(req, {"targets": [{}]})["provider"] == "routed"
+
+    monkeypatch.setattr(get_settings(), "LLM_METRICS_MODELS", ["m3"])
+    assert router._metric_labels(req, {"model": "m3"})["model"] == "m3"
+    assert router._metric_labels(req, {"model": "m0"})["model"] == "other"
@@ -0,0 +1,52 @@
+from app.providers.stt.base import STTSegment
+from app.services.partial_engine import IncrementalPartialEngine
+
+
+def test_commits_segments_stable_across_ticks():
+    engine = IncrementalPartialEngine(window_s=6.0, overlap_s=1.0, stable_s=1.0)
+
+    first = engine.update(
+        [STTSegment(0, 1500, "hola"), STTSegment(1500, 2900, "qué tal")],
+        offset_ms=0,
+        total_ms=3000,
+    )
+    assert first.committed == ""
+    assert first.text == "hola qué tal"
+
+    second = engine.update(
+        [STTSegment(0, 1500, "hola"), STTSegment(1500, 2900, "qué tal"), STTSegment(2900, 4500, "cómo estás")],
+        offset_ms=0,
+        total_ms=4600,
+    )
+    assert second.committed == "hola qué tal"
+    assert second.tail == "cómo estás"
+    assert (second.start_ms, second.end_ms) == (2900, 4500)
+    assert engine.committed_until_ms == 2900
+
+
+def test_window_stays_bounded_for_long_sessions():
+    engine = IncrementalPartialEngine(window_s=6.0, overlap_s=1.0, stable_s=1.0)
+    engine.committed_until_ms = 2900
+
+    short = engine.window_seconds(4600)
+    long = engine.window_seconds(10 * 60 * 1000)
+
+    assert short == 2.7
+    assert long == 7.0
+
+
+def test_overlap_is_not_duplicated_and_old_audio_is_forced():
+    engine = IncrementalPartialEngine(window_s=6.0, overlap_s=1.0, stable_s=1.0)
+    engine.update([STTSegment(0, 2000, "uno")], offset_ms=0, total_ms=3000)
+    engine.update([STTSegment(0, 2000, "uno"), STTSegment(2000, 2500, "dos")], offset_ms=0, total_ms=3500)
+    assert engine.committed_text == "uno"
+
+    # la ventana empieza en el solape: "uno" reaparece y no se duplica;
+    # "dos" ya cae fuera de la ventana siguiente y se confirma aunque cambie el tail
+    update = engine.update(
+        [STTSegment(0, 1000, "uno"), STTSegment(1000, 1600, "dos"), STTSegment(1600, 6000, "tres")],
+        offset_ms=1000,
+        total_ms=9000,
+    )
+    assert update.committed == "uno dos"
+    assert update.tail == "tres"
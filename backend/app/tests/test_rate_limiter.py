@@ -0,0 +1,84 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import llm as llm_api
+from app.core.config import get_settings
+from app.main import app
+from app.providers.llm.base import LLMGenerateRequest, LLMGenerateResponse, LLMHTTPError, LLMMessage, LLMProvider
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_router import LLMRouter
+from app.services.rate_limiter import ProviderRateLimiter, RateLimitTimeout, TokenBucket
+
+
+class FlakyProvider(LLMProvider):
+    name = "openai_compat"
+
+    def __init__(self, failures: list[LLMHTTPError]) -> None:
+        self.failures = failures
+        self.calls = 0
+
+    async def generate(self, req, config):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return LLMGenerateResponse(text="ok", provider=self.name)
+
+
+def _req() -> LLMGenerateRequest:
+    return LLMGenerateRequest(messages=[LLMMessage(role="user", content="hola")], temperature=0.7)
+
+
+@pytest.mark.asyncio
+async def test_bucket_queues_until_refill_and_respects_deadline():
+    bucket = TokenBucket(per_minute=120)  # 2 por segundo
+    await bucket.acquire(120, time.monotonic() + 1, "p")
+
+    t0 = time.monotonic()
+    await bucket.acquire(1, time.monotonic() + 2, "p")
+    assert 0.4 <= time.monotonic() - t0 < 1.0
+
+    with pytest.raises(RateLimitTimeout):
+        await bucket.acquire(60, time.monotonic() + 0.1, "p")
+
+
+@pytest.mark.asyncio
+async def test_router_retries_429_honouring_retry_after():
+    provider = FlakyProvider([LLMHTTPError("openai_compat", 429, retry_after_s=0.05)] * 2)
+    router = LLMRouter(cache=LLMResponseCache(), limiter=ProviderRateLimiter())
+    router._providers[provider.name] = provider
+    config = {"rate_limit": {"rpm": 600}, "coalesce": False}
+
+    t0 = time.monotonic()
+    res = await router.generate(_req(), config)
+
+    assert res.text == "ok"
+    assert provider.calls == 3
+    assert time.monotonic() - t0 >= 0.1
+    assert router.limiter.stats()["penalties"] == 2
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    provider = FlakyProvider([LLMHTTPError("openai_compat", 400, body="bad request")])
+    router = LLMRouter(cache=LLMResponseCache(), limiter=ProviderRateLimiter())
+    router._providers[provider.name] = provider
+
+    with pytest.raises(LLMHTTPError):
+        await router.generate(_req(), {})
+    assert provider.calls == 1
+
+
+def test_exhausted_429_is_reported_as_rate_limited(monkeypatch):
+    provider = FlakyProvider([LLMHTTPError("openai_compat", 429, retry_after_s=7)])
+    monkeypatch.setitem(llm_api._llm_router._providers, "openai_compat", provider)
+    monkeypatch.setattr(get_settings(), "LLM_RETRY_MAX_ATTEMPTS", 1)
+
+    client = TestClient(app)
+    r = client.post("/llm/generate", json={"messages": [{"role": "user", "content": "hola"}], "provider": "openai_compat"})
+
+    assert r.status_code == 429
+    err = r.json()["error"]
+    assert err["code"] == "RATE_LIMITED"
+    assert err["details"]["retry_after_s"] == 7
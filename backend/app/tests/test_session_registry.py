@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import get_settings
+from app.main import app
+from app.services import session_registry
+from app.services.conversation_store import ConversationStore
+from app.services.session_registry import (
+    InProcessSessionRegistry,
+    SQLiteSessionRegistry,
+    conversation_key,
+    stt_session_key,
+)
+
+CFG = {"provider": "cloud_stub", "audio_transport": "binary", "sample_rate": 16000}
+
+
+@pytest.fixture
+def two_workers(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionRegistry(path, "w0", "http://127.0.0.1:9001", ttl_s=30)
+    b = SQLiteSessionRegistry(path, "w1", "http://127.0.0.1:9002", ttl_s=30)
+    return a, b
+
+
+def test_sqlite_registry_ownership_and_expiry(two_workers, monkeypatch):
+    a, b = two_workers
+    assert a.claim("stt:s1") is None
+    owner = b.claim("stt:s1")
+    assert owner.worker_id == "w0" and owner.url == "http://127.0.0.1:9001"
+    assert b.remote_owner("stt:s1") == owner and a.remote_owner("stt:s1") is None
+
+    a.release("stt:s1")
+    assert b.claim("stt:s1") is None and a.lookup("stt:s1").worker_id == "w1"
+
+    # w1 deja de renovar (proceso muerto): pasado el TTL w0 puede quedársela
+    now = [session_registry.time.time() + 31]
+    monkeypatch.setattr(session_registry, "time", types.SimpleNamespace(time=lambda: now[0]))
+    a.refresh()
+    assert a.lookup("stt:s1") is None and a.claim("stt:s1") is None
+
+
+def test_ws_start_redirects_to_owner(two_workers, monkeypatch):
+    a, b = two_workers
+    a.claim(stt_session_key("owned"))
+    monkeypatch.setattr("app.api.stt_ws.get_session_registry", lambda: b)
+
+    client = TestClient(app)
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "owned", "config": CFG})
+        msg = ws.receive_json()
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+
+    assert msg == {"type": "redirect", "session_id": "owned", "worker_id": "w0", "url": "ws://127.0.0.1:9001/ws/stt"}
+    assert exc.value.code == 4307
+    assert b.lookup(stt_session_key("owned")).worker_id == "w0"
+
+
+def test_ws_resume_after_disconnect(monkeypatch):
+    monkeypatch.setattr(get_settings(), "STT_RESUME_GRACE_S", 30.0)
+    client = TestClient(app)
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-resume", "config": CFG})
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_bytes(b"\x00\x00" * 1600)
+
+    info = client.get("/stt/sessions/s-resume").json()
+    assert info["attached"] is False
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-resume", "config": CFG, "resume": True})
+        ready = ws.receive_json()
+        assert ready["resumed"] is True and ready["sample_rate"] == 16000
+        assert client.get("/stt/sessions/s-resume").json()["attached"] is True
+        ws.send_json({"type": "stop"})
+        assert ws.receive_json()["type"] == "final"
+
+    assert client.get("/stt/sessions/s-resume").status_code == 404
+
+
+def test_conversation_on_other_worker_redirects(two_workers, monkeypatch):
+    a, b = two_workers
+    a.claim(conversation_key("c-remote"))
+    monkeypatch.setattr("app.api.llm.get_session_registry", lambda: b)
+
+    client = TestClient(app)
+    r = client.post(
+        "/llm/generate?x=1",
+        json={"conversation_id": "c-remote", "messages": [{"role": "user", "content": "hola"}]},
+        follow_redirects=False,
+    )
+    assert r.status_code == 307
+    assert r.headers["location"] == "http://127.0.0.1:9001/llm/generate?x=1"
+    assert r.json()["error"]["code"] == "SESSION_MOVED"
+
+    assert client.get("/llm/conversations/nope").status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_conversation_store_keeps_registry_io_off_the_loop():
+    calls = []
+
+    class RecordingRegistry(InProcessSessionRegistry):
+        def claim(self, key):
+            calls.append(("claim", key, threading.current_thread()))
+            return super().claim(key)
+
+        def release(self, key):
+            calls.append(("release", key, threading.current_thread()))
+            super().release(key)
+
+    registry = RecordingRegistry("w0")
+    store = ConversationStore(registry=registry)
+    conv = store.create()
+    assert store.delete(conv.id)
+    await asyncio.get_running_loop().run_in_executor(store._registry_io, lambda: None)
+
+    key = conversation_key(conv.id)
+    assert [(op, k) for op, k, _ in calls] == [("claim", key), ("release", key)]
+    assert all(t is not threading.main_thread() for _, _, t in calls)
+    assert registry.lookup(key) is None
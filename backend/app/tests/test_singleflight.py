@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(5)))
+
+    assert results == ["ok"] * 5
+    assert calls == 1
+    assert flight.stats() == {"inflight": 0, "executed": 1, "coalesced": 4}
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("k", fetch) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_upstream_call_is_cancelled_only_when_every_waiter_leaves():
+    flight = SingleFlight()
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def fetch():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    a = asyncio.create_task(flight.do("k", fetch))
+    b = asyncio.create_task(flight.do("k", fetch))
+    await started.wait()
+
+    a.cancel()
+    await asyncio.sleep(0.01)
+    assert not cancelled.is_set()
+
+    b.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flight.stats()["inflight"] == 0
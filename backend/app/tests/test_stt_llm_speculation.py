@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.providers.llm.base import LLMStreamChunk
+from app.services.stt_llm_pipeline import PipelineConfig, SpeculationStats, STTLLMPipeline
+
+
+class FakeRouter:
+    def __init__(self, delay_s: float = 0.05) -> None:
+        self.delay_s = delay_s
+        self.prompts: list[str] = []
+        self.cancelled = 0
+
+    async def stream(self, req, config):
+        self.prompts.append(req.messages[-1].content)
+        try:
+            await asyncio.sleep(self.delay_s)
+            yield LLMStreamChunk(delta="re")
+            yield LLMStreamChunk(delta="spuesta")
+            yield LLMStreamChunk(done=True, model="m", provider="fake")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def _pipeline(router: FakeRouter, sent: list[dict]) -> STTLLMPipeline:
+    async def send(msg):
+        sent.append(msg)
+
+    cfg = PipelineConfig.from_start({"speculate": True, "speculate_stable_ms": 20})
+    p = STTLLMPipeline("s1", cfg, router, send, lambda e: {"message": str(e)})
+    p.spec_stats = SpeculationStats()
+    return p
+
+
+@pytest.mark.asyncio
+async def test_stable_partial_is_reused_by_matching_final():
+    router = FakeRouter()
+    sent: list[dict] = []
+    p = _pipeline(router, sent)
+
+    p.on_partial("hola mundo")
+    await asyncio.sleep(0.1)
+    p.submit("Hola, mundo.")
+    await p.drain()
+
+    assert router.prompts == ["hola mundo"]
+    done = [m for m in sent if m["type"] == "llm_done"]
+    assert done[0]["speculative"] is True
+    assert done[0]["text"] == "respuesta"
+    # mismo formato que un turno normal
+    assert (done[0]["provider"], done[0]["cached"]) == ("fake", False)
+    assert p.spec_stats.hits == 1 and p.spec_stats.misses == 0
+    assert p.spec_stats.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_diverged_final_cancels_and_restarts():
+    router = FakeRouter(delay_s=0.5)
+    sent: list[dict] = []
+    p = _pipeline(router, sent)
+
+    p.on_partial("hola mun")
+    await asyncio.sleep(0.05)
+    p.submit("hola mundo entero")
+    router.delay_s = 0.0
+    await p.drain()
+
+    assert router.prompts == ["hola mun", "hola mundo entero"]
+    assert router.cancelled == 1
+    done = [m for m in sent if m["type"] == "llm_done"]
+    assert len(done) == 1 and "speculative" not in done[0]
+    assert set(done[0]) == {"type", "session_id", "turn", "text", "provider", "model", "usage", "cached"}
+    assert p.spec_stats.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_speculation_respects_attempt_budget(monkeypatch):
+    monkeypatch.setattr(get_settings(), "STT_LLM_SPECULATE_MAX_ATTEMPTS", 1)
+    router = FakeRouter(delay_s=0.5)
+    p = _pipeline(router, [])
+
+    p.on_partial("uno")
+    await asyncio.sleep(0.05)
+    p.on_partial("uno dos")
+    await asyncio.sleep(0.05)
+
+    assert router.prompts == ["uno"]
+    assert p.spec_stats.launched == 1
+    assert p.spec_stats.skipped_budget == 1
+    p.cancel()
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+
+from app.services.stt_scheduler import JobCancelled, JobKind, JobSuperseded, TranscriptionScheduler
+
+
+@pytest.mark.asyncio
+async def test_finals_run_before_partials_and_stale_partials_are_dropped():
+    sched = TranscriptionScheduler(core_budget=4, min_threads=4, max_threads=4)
+    gate = asyncio.Event()
+    order: list[str] = []
+
+    def job(name: str):
+        async def run(threads: int) -> str:
+            assert threads == 4
+            if name == "blocker":
+                await gate.wait()
+            order.append(name)
+            return name
+        return run
+
+    blocker = asyncio.create_task(sched.submit("a", JobKind.final, job("blocker")))
+    await asyncio.sleep(0)
+    old_partial = asyncio.create_task(sched.submit("b", JobKind.partial, job("partial-old")))
+    await asyncio.sleep(0)
+    new_partial = asyncio.create_task(sched.submit("b", JobKind.partial, job("partial-new")))
+    final = asyncio.create_task(sched.submit("c", JobKind.final, job("final")))
+    await asyncio.sleep(0)
+
+    assert sched.stats()["queue_depth"] == 2
+    gate.set()
+
+    assert await blocker == "blocker"
+    assert await final == "final"
+    assert await new_partial == "partial-new"
+    with pytest.raises(JobSuperseded):
+        await old_partial
+
+    assert order == ["blocker", "final", "partial-new"]
+    stats = sched.stats()
+    assert stats["superseded"] == 1
+    assert stats["threads_in_use"] == 0
+
+
+@pytest.mark.asyncio
+async def test_thread_budget_is_split_between_jobs():
+    sched = TranscriptionScheduler(core_budget=8, min_threads=2, max_threads=8)
+    gate = asyncio.Event()
+    seen: list[int] = []
+
+    async def run(threads: int) -> None:
+        seen.append(threads)
+        await gate.wait()
+
+    tasks = [asyncio.create_task(sched.submit(f"s{i}", JobKind.final, run)) for i in range(6)]
+    await asyncio.sleep(0.01)
+
+    assert sched.stats()["threads_in_use"] <= 8
+    assert sched.stats()["running"] + sched.stats()["queue_depth"] == 6
+
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert len(seen) == 6
+    assert all(2 <= t <= 8 for t in seen)
+    assert sched.stats()["threads_in_use"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_sessions_get_a_fair_share():
+    sched = TranscriptionScheduler(core_budget=32, min_threads=2, max_threads=8)
+
+    async def noop(threads: int) -> int:
+        return threads
+
+    # una sola sesión puede usar hasta max_threads
+    assert await sched.submit("s0", JobKind.partial, noop) == 8
+
+    gate = asyncio.Event()
+    seen: list[int] = []
+
+    async def run(threads: int) -> None:
+        seen.append(threads)
+        await gate.wait()
+
+    for i in range(8):
+        await sched.submit(f"s{i}", JobKind.partial, noop)
+    # 8 sesiones activas llegando una a una: nadie se lleva 8 de 32 núcleos
+    tasks = []
+    for i in range(8):
+        tasks.append(asyncio.create_task(sched.submit(f"s{i}", JobKind.final, run)))
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+    assert seen == [4] * 8
+    assert sched.stats()["running"] == 8
+
+    gate.set()
+    await asyncio.gather(*tasks)
+    sched.cancel("s0")
+    assert sched._active_sessions() == 7
+
+
+@pytest.mark.asyncio
+async def test_cancel_kills_running_whisper_and_drops_queued_jobs(monkeypatch):
+    from app.providers.stt import whisper_cli
+
+    procs = []
+    real_exec = asyncio.create_subprocess_exec
+
+    async def spy_exec(*args, **kwargs):
+        proc = await real_exec(*args, **kwargs)
+        procs.append(proc)
+        return proc
+
+    monkeypatch.setattr(whisper_cli.asyncio, "create_subprocess_exec", spy_exec)
+
+    sched = TranscriptionScheduler(core_budget=2, min_threads=2, max_threads=2)
+
+    running = asyncio.create_task(
+        sched.submit("s1", JobKind.partial, lambda t: whisper_cli.run_whisper(["sleep", "30"], 60, "test"))
+    )
+    queued = asyncio.create_task(sched.submit("s1", JobKind.final, lambda t: asyncio.sleep(0)))
+    while not procs:
+        await asyncio.sleep(0.01)
+
+    assert sched.cancel("s1") == 2
+
+    with pytest.raises(JobCancelled):
+        await running
+    with pytest.raises(JobCancelled):
+        await queued
+
+    await asyncio.sleep(0.05)
+    assert procs[0].returncode is not None
+    stats = sched.stats()
+    assert (stats["running"], stats["queue_depth"], stats["threads_in_use"]) == (0, 0, 0)
+
+
+def test_core_budget_is_split_between_workers(monkeypatch):
+    from app.core.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "STT_CPU_BUDGET", 32)
+    monkeypatch.setattr(get_settings(), "WORKERS", 4)
+    sched = TranscriptionScheduler.from_settings()
+    assert sched.core_budget == 8
+
+    monkeypatch.setattr(get_settings(), "STT_CPU_BUDGET", 0)
+    monkeypatch.setattr("app.services.stt_scheduler.os.cpu_count", lambda: 16)
+    assert TranscriptionScheduler.from_settings().core_budget == 4
+
+
+@pytest.mark.asyncio
+async def test_pool_jobs_reserve_the_server_threads(monkeypatch):
+    from app.core.config import get_settings
+    from app.providers.stt.whisper_cpp import WhisperCppSTTProvider
+    from app.services.session_store import SessionStore
+
+    monkeypatch.setattr(get_settings(), "WHISPER_POOL_THREADS", 3)
+    sched = TranscriptionScheduler(core_budget=8, min_threads=2, max_threads=8)
+    provider = WhisperCppSTTProvider(SessionStore(), sched)
+    gate = asyncio.Event()
+    seen: list[int] = []
+
+    async def run(threads: int) -> None:
+        seen.append(threads)
+        await gate.wait()
+
+    # whisper-server corre con -t 3 pase lo que pase: eso es lo que cuenta el scheduler
+    reserved = provider.reserved_threads({"whisper_pool": True})
+    assert reserved == 3
+    assert provider.reserved_threads({"whisper_pool": False}) is None
+
+    tasks = [asyncio.create_task(sched.submit(f"s{i}", JobKind.final, run, reserved)) for i in range(3)]
+    await asyncio.sleep(0.01)
+
+    assert seen == [3, 3]
+    assert sched.stats()["threads_in_use"] == 6
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert seen == [3, 3, 3] and sched.stats()["threads_in_use"] == 0
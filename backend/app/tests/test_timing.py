@@ -0,0 +1,85 @@
+import json
+import logging
+
+import httpx
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.core.timing import Timings, record, span, use_timings
+from app.main import app
+from app.tests.conftest import mock_llm_http
+
+SR = 16000
+
+
+def test_spans_accumulate_only_when_active():
+    with span("ignored"):
+        pass
+    record("ignored", 1.0)
+
+    t = Timings()
+    with use_timings(t):
+        with span("step"):
+            pass
+        record("step", 0.01)
+        record("other", 0.002)
+    record("after", 1.0)
+
+    d = t.to_dict()
+    assert set(d) == {"step", "other", "total"}
+    assert d["step"] >= 10.0
+    assert t.server_timing().startswith("step;dur=")
+
+
+def test_llm_generate_returns_server_timing(monkeypatch, caplog):
+    mock_llm_http(monkeypatch, lambda r: httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]}))
+    monkeypatch.setattr(get_settings(), "TIMINGS_LOG", True)
+
+    client = TestClient(app)
+    with caplog.at_level(logging.INFO, logger="app.timings"):
+        r = client.post("/llm/generate", json={
+            "messages": [{"role": "user", "content": "hola"}],
+            "config": {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m", "cache": False},
+        })
+
+    assert r.status_code == 200
+    names = [part.split(";")[0].strip() for part in r.headers["server-timing"].split(",")]
+    assert "llm_upstream" in names and "llm_queue" in names and names[-1] == "total"
+
+    line = json.loads(caplog.records[-1].getMessage())
+    assert line["event"] == "llm.generate"
+    assert "llm_upstream" in line["timings_ms"]
+
+
+def test_ws_final_carries_timings(fake_whisper_cli, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+    rng = np.random.default_rng(0)
+    t = np.arange(SR) / SR
+    silence = rng.normal(0, 30, SR).astype("<i2")
+    tone = (0.3 * 32767 * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+    audio = np.concatenate([silence, tone, silence, silence]).tobytes()
+
+    client = TestClient(app)
+    config = {
+        "provider": "whisper_selfhosted",
+        "whisper_bin": fake_whisper_cli,
+        "model": str(tmp_path / "ggml.bin"),
+        "audio_transport": "binary",
+        "sample_rate": SR,
+        "partial_every_s": 60,
+        "timings": True,
+    }
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-timings", "config": config})
+        assert ws.receive_json()["type"] == "ready"
+        for i in range(0, len(audio), 3200):
+            ws.send_bytes(audio[i : i + 3200])
+        final_msg = ws.receive_json()
+        ws.send_json({"type": "stop"})
+
+    assert final_msg["type"] == "final"
+    timings = final_msg["timings"]
+    for name in ("stt_queue", "stt_transcribe", "wav_encode", "whisper_exec", "total"):
+        assert name in timings
+    assert timings["whisper_exec"] <= timings["stt_transcribe"] <= timings["total"]
@@ -0,0 +1,92 @@
+import sys
+import textwrap
+
+import pytest
+
+from app.core.config import Settings
+from app.services.whisper_pool import WhisperWorkerPool
+
+FAKE_SERVER = textwrap.dedent(
+    """
+    import json, sys
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    args = sys.argv[1:]
+    port = int(args[args.index("--port") + 1])
+
+    class H(BaseHTTPRequestHandler):
+        def log_message(self, *a):
+            pass
+
+        def _json(self, obj):
+            body = json.dumps(obj).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._json({"status": "ok"})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            self._json({"text": " hola mundo "})
+
+    HTTPServer(("127.0.0.1", port), H).serve_forever()
+    """
+)
+
+
+@pytest.fixture
+def fake_server_bin(tmp_path):
+    script = tmp_path / "whisper-server"
+    script.write_text(f"#!{sys.executable}\n" + FAKE_SERVER)
+    script.chmod(0o755)
+    return str(script)
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_worker_and_restarts_on_crash(fake_server_bin):
+    settings = Settings(WHISPER_POOL_SIZE=1, WHISPER_POOL_STARTUP_TIMEOUT_S=10, WHISPER_POOL_HEALTH_INTERVAL_S=60)
+    pool = WhisperWorkerPool(settings)
+    key = (fake_server_bin, "model.bin", "es")
+
+    try:
+        first = await pool.transcribe(key, b"RIFF", timeout_s=5)
+        assert first["text"].strip() == "hola mundo"
+
+        await pool.transcribe(key, b"RIFF", timeout_s=5)
+        worker = pool.stats()[0]["workers"][0]
+        assert worker["alive"] and worker["restarts"] == 0
+
+        # simula un crash del proceso: el siguiente job lo relanza
+        pool._pools[key].workers[0].proc.kill()
+        await pool._pools[key].workers[0].proc.wait()
+
+        again = await pool.transcribe(key, b"RIFF", timeout_s=5)
+        assert again["text"].strip() == "hola mundo"
+        assert pool.stats()[0]["workers"][0]["restarts"] == 1
+    finally:
+        await pool.aclose()
+
+
+@pytest.mark.asyncio
+async def test_closed_pool_stays_closed(fake_server_bin):
+    settings = Settings(WHISPER_POOL_SIZE=1, WHISPER_POOL_HEALTH_INTERVAL_S=60)
+    pool = WhisperWorkerPool(settings)
+    await pool.aclose()
+
+    with pytest.raises(ValueError, match="closed"):
+        await pool.transcribe((fake_server_bin, "model.bin", "es"), b"RIFF", timeout_s=5)
+    assert pool.stats() == []
+
+
+def test_pool_timeout_prefers_session_config(monkeypatch):
+    from app.core.config import get_settings
+    from app.services.whisper_pool import pool_timeout_s
+
+    monkeypatch.setattr(get_settings(), "WHISPER_POOL_REQUEST_TIMEOUT_S", 90.0)
+    assert pool_timeout_s({"timeout_s": 15}) == 15.0
+    assert pool_timeout_s({}) == 90.0
+    assert pool_timeout_s({"timeout_s": 0}) == 90.0
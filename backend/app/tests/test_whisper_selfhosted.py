@@ -0,0 +1,124 @@
+import asyncio
+import os
+
+import pytest
+
+from app.providers.stt.whisper_selfhosted import WhisperSelfHostedSTTProvider
+from app.services.session_store import SessionStore
+
+
+@pytest.mark.asyncio
+async def test_transcribe_pcm_does_not_block_event_loop(fake_whisper_cli, tmp_path):
+    provider = WhisperSelfHostedSTTProvider(SessionStore())
+    config = {"whisper_bin": fake_whisper_cli, "model": str(tmp_path / "ggml.bin"), "sample_rate": 16000}
+
+    ticks = 0
+
+    async def ticker() -> None:
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.02)
+            ticks += 1
+
+    t = asyncio.create_task(ticker())
+    try:
+        text = await provider.transcribe_pcm(b"\x00\x00" * 1600, config)
+    finally:
+        t.cancel()
+
+    assert text == "hola mundo"
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_on_stop_reports_timeout(fake_whisper_cli, tmp_path):
+    store = SessionStore()
+    store.create("s1", {})
+    store.append_audio("s1", b"\x00\x00" * 1600)
+
+    provider = WhisperSelfHostedSTTProvider(store)
+    config = {"whisper_bin": fake_whisper_cli, "model": str(tmp_path / "ggml.bin"), "timeout_s": 0.05}
+
+    with pytest.raises(ValueError, match="timeout"):
+        await provider.on_stop("s1", config)
+
+
+@pytest.fixture
+def clean_io_cache():
+    from app.providers.stt import whisper_cli
+
+    whisper_cli._io_mode_cache.clear()
+    yield whisper_cli._io_mode_cache
+    whisper_cli._io_mode_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_audio_goes_through_stdin_without_temp_files(fake_whisper_cli, tmp_path, clean_io_cache, monkeypatch):
+    import tempfile
+
+    from app.tests.conftest import read_call_modes
+
+    def no_tempdir(*a, **kw):
+        raise AssertionError("temp dir should not be used")
+
+    monkeypatch.setattr(tempfile, "TemporaryDirectory", no_tempdir)
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+
+    provider = WhisperSelfHostedSTTProvider(SessionStore())
+    config = {"whisper_bin": fake_whisper_cli, "model": str(tmp_path / "ggml.bin"), "sample_rate": 16000}
+
+    segments = await provider.transcribe_segments(b"\x00\x00" * 1600, config)
+
+    assert [(s.start_ms, s.end_ms, s.text) for s in segments] == [(0, 100, "hola mundo")]
+    assert read_call_modes(fake_whisper_cli) == ["stdin"]
+    assert clean_io_cache[fake_whisper_cli] == "stdin"
+
+
+@pytest.mark.asyncio
+async def test_falls_back_when_binary_cannot_read_stdin(fake_whisper_cli, tmp_path, clean_io_cache, monkeypatch):
+    from app.tests.conftest import read_call_modes
+
+    monkeypatch.setenv("FAKE_WHISPER_NO_STDIN", "1")
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+
+    provider = WhisperSelfHostedSTTProvider(SessionStore())
+    config = {"whisper_bin": fake_whisper_cli, "model": str(tmp_path / "ggml.bin"), "sample_rate": 16000}
+
+    assert await provider.transcribe_pcm(b"\x00\x00" * 1600, config) == "hola mundo"
+    assert await provider.transcribe_pcm(b"\x00\x00" * 1600, config) == "hola mundo"
+
+    # el modo que funcionó queda cacheado: la segunda llamada no reintenta stdin
+    expected = "memfd" if hasattr(os, "memfd_create") else "file"
+    assert read_call_modes(fake_whisper_cli) == [expected, expected]
+    assert clean_io_cache[fake_whisper_cli] == expected
+
+    config["whisper_io"] = "file"
+    assert await provider.transcribe_pcm(b"\x00\x00" * 1600, config) == "hola mundo"
+    assert read_call_modes(fake_whisper_cli)[-1] == "file"
+
+
+@pytest.mark.asyncio
+async def test_transient_failure_does_not_pin_the_fallback(fake_whisper_cli, tmp_path, clean_io_cache, monkeypatch):
+    from app.providers.stt import whisper_cli
+    from app.tests.conftest import read_call_modes
+
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+    real_stdin = whisper_cli._RUNNERS["stdin"]
+    failures = [ValueError("whisper: exit 1: out of memory")]
+
+    async def flaky_stdin(*args):
+        if failures:
+            raise failures.pop()
+        return await real_stdin(*args)
+
+    monkeypatch.setitem(whisper_cli._RUNNERS, "stdin", flaky_stdin)
+    provider = WhisperSelfHostedSTTProvider(SessionStore())
+    config = {"whisper_bin": fake_whisper_cli, "model": str(tmp_path / "ggml.bin"), "sample_rate": 16000}
+
+    # la primera llamada se salva con el fallback, pero no lo recuerda
+    assert await provider.transcribe_pcm(b"\x00\x00" * 1600, config) == "hola mundo"
+    assert fake_whisper_cli not in clean_io_cache
+
+    assert await provider.transcribe_pcm(b"\x00\x00" * 1600, config) == "hola mundo"
+    assert read_call_modes(fake_whisper_cli)[-1] == "stdin"
+    assert clean_io_cache[fake_whisper_cli] == "stdin"
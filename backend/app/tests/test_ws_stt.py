@@ -1,6 +1,8 @@
 import base64
+import time
 from fastapi.testclient import TestClient
 from app.main import app
+from app.tests.conftest import read_calls
 
 def test_ws_stt_mock_flow():
     client = TestClient(app)
@@ -26,3 +28,73 @@ def test_ws_stt_mock_flow():
         ws.send_json({"type": "stop"})
         stop_final = ws.receive_json()
         assert stop_final["type"] == "final"
+
+
+def test_ws_stt_binary_audio_flow():
+    client = TestClient(app)
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({
+            "type": "start",
+            "session_id": "s-bin",
+            "config": {"audio_transport": "binary", "format": "pcm16", "sample_rate": 16000},
+        })
+        msg = ws.receive_json()
+        assert msg["type"] == "ready"
+        assert msg["audio_transport"] == "binary"
+        assert msg["sample_rate"] == 16000
+
+        for i in range(3):
+            ws.send_bytes(b"\x00\x01\x02\x03")
+            partial = ws.receive_json()
+            assert partial["type"] == "partial"
+            assert partial["session_id"] == "s-bin"
+
+        final_msg = ws.receive_json()
+        assert final_msg["type"] == "final"
+
+        ws.send_bytes(b"\x00\x01\x02")
+        err = ws.receive_json()
+        assert err["type"] == "error"
+
+        ws.send_json({"type": "stop"})
+        stop_final = ws.receive_json()
+        assert stop_final["type"] == "final"
+
+
+def test_ws_stt_binary_requires_negotiation():
+    client = TestClient(app)
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-json", "config": {}})
+        assert ws.receive_json()["type"] == "ready"
+
+        ws.send_bytes(b"\x00\x01")
+        err = ws.receive_json()
+        assert err["type"] == "error"
+        assert err["session_id"] == "s-json"
+
+
+def test_ws_stt_idle_session_runs_no_partials(fake_whisper_cli, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+    client = TestClient(app)
+    config = {
+        "provider": "whisper_selfhosted",
+        "whisper_bin": fake_whisper_cli,
+        "model": str(tmp_path / "ggml.bin"),
+        "audio_transport": "binary",
+        "vad": False,
+        "partial_every_s": 0.1,
+    }
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-idle", "config": config})
+        assert ws.receive_json()["type"] == "ready"
+
+        ws.send_bytes(b"\x10\x00" * 16000 * 3)
+        partial = ws.receive_json()
+        assert partial["type"] == "partial"
+
+        # sin audio nuevo: ningún whisper más aunque pasen varios ticks
+        time.sleep(0.6)
+        assert len(read_calls(fake_whisper_cli)) == 1
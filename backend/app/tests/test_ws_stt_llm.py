@@ -0,0 +1,92 @@
+import base64
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.services.conversation_store import get_conversation_store
+from app.tests.conftest import mock_llm_http
+
+LLM_CONFIG = {"base_url": "https://api.example.com/v1", "api_key": "k", "model": "m", "cache": False}
+
+SSE_BODY = (
+    'data: {"choices":[{"delta":{"content":"Res"}}]}\n\n'
+    'data: {"choices":[{"delta":{"content":"puesta"}}]}\n\n'
+    "data: [DONE]\n\n"
+)
+
+
+def _run_session(llm: dict) -> list[dict]:
+    client = TestClient(app)
+    audio = base64.b64encode(b"\x00\x01\x02\x03").decode("ascii")
+    msgs = []
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-llm", "config": {"llm": llm}})
+        assert ws.receive_json()["type"] == "ready"
+        for _ in range(3):
+            ws.send_json({"type": "audio", "format": "pcm16", "sample_rate": 16000, "data": audio})
+        ws.send_json({"type": "stop"})
+        try:
+            while True:
+                msgs.append(ws.receive_json())
+        except WebSocketDisconnect:
+            pass
+    return msgs
+
+
+def test_final_is_answered_over_the_same_socket(monkeypatch):
+    prompts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        prompts.append(json.loads(request.content)["messages"][-1]["content"])
+        return httpx.Response(200, text=SSE_BODY, headers={"content-type": "text/event-stream"})
+
+    mock_llm_http(monkeypatch, handler)
+    msgs = _run_session({"provider": "openai_compat", "config": LLM_CONFIG, "prompt_template": "Contesta: {text}"})
+
+    finals = [m["text"] for m in msgs if m["type"] == "final"]
+    done = [m for m in msgs if m["type"] == "llm_done"]
+    assert len(finals) == 2
+    assert [d["turn"] for d in done] == [1, 2]
+    assert all(d["text"] == "Respuesta" for d in done)
+    assert prompts == [f"Contesta: {t}" for t in finals]
+
+    turn1 = [m["type"] for m in msgs if m.get("turn") == 1]
+    assert turn1 == ["llm_start", "llm_token", "llm_token", "llm_done"]
+
+
+def test_history_and_errors_are_reported_per_turn(monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content)["messages"])
+        if len(calls) == 2:
+            return httpx.Response(400, text="bad")
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}], "model": "m"})
+
+    mock_llm_http(monkeypatch, handler)
+    msgs = _run_session({"config": LLM_CONFIG, "stream": False, "history": True, "system_prompt": "S"})
+
+    done = [m for m in msgs if m["type"] == "llm_done"]
+    errors = [m for m in msgs if m["type"] == "llm_error"]
+    assert [d["turn"] for d in done] == [1]
+    assert done[0]["conversation_id"]
+    assert errors[0]["turn"] == 2
+    assert errors[0]["error"]["code"] == "PROVIDER_ERROR"
+    # el segundo turno lleva el historial del primero
+    assert [m["role"] for m in calls[1]] == ["system", "user", "assistant", "user"]
+    # al cerrar el socket el historial se borra del store
+    assert get_conversation_store().get(done[0]["conversation_id"]) is None
+
+
+def test_invalid_llm_config_is_rejected_on_start():
+    client = TestClient(app)
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-bad", "config": {"llm": {"prompt_template": "sin hueco"}}})
+        assert ws.receive_json()["type"] == "ready"
+        err = ws.receive_json()
+        assert err["type"] == "error"
+        assert "llm" in err["message"]
+        ws.send_json({"type": "stop"})
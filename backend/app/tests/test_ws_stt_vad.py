@@ -0,0 +1,50 @@
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.tests.conftest import read_calls
+
+SR = 16000
+
+
+def _speech_then_silence() -> bytes:
+    rng = np.random.default_rng(0)
+    silence = rng.normal(0, 30, SR).astype("<i2")
+    t = np.arange(SR) / SR
+    tone = (0.3 * 32767 * np.sin(2 * np.pi * 220 * t)).astype("<i2")
+    return np.concatenate([silence, tone, silence, silence]).tobytes()
+
+
+def test_vad_emits_final_per_utterance_and_skips_silence(fake_whisper_cli, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_WHISPER_SLEEP", "0")
+    client = TestClient(app)
+    config = {
+        "provider": "whisper_selfhosted",
+        "whisper_bin": fake_whisper_cli,
+        "model": str(tmp_path / "ggml.bin"),
+        "audio_transport": "binary",
+        "sample_rate": SR,
+        "partial_every_s": 60,
+    }
+
+    with client.websocket_connect("/ws/stt") as ws:
+        ws.send_json({"type": "start", "session_id": "s-vad", "config": config})
+        assert ws.receive_json()["type"] == "ready"
+
+        audio = _speech_then_silence()
+        for i in range(0, len(audio), 3200):
+            ws.send_bytes(audio[i : i + 3200])
+
+        # el final llega antes del stop, en cuanto se cierra la locución
+        final_msg = ws.receive_json()
+        assert final_msg["type"] == "final"
+        assert final_msg["text"] == "hola mundo"
+        assert 600 <= final_msg["start_ms"] <= 1000
+        assert 2000 <= final_msg["end_ms"] <= 2400
+
+        ws.send_json({"type": "stop"})
+
+    # whisper solo vio la locución (~1.4 s), nunca los 4 s con silencio
+    calls = read_calls(fake_whisper_cli)
+    assert len(calls) == 1
+    assert calls[0] < 2.0
@@ -9,7 +9,8 @@ def pcm16_duration_seconds(num_bytes: int, sample_rate: int, channels: int = 1)
 def estimate_pcm16_bytes(seconds: float, sample_rate: int, channels: int = 1) -> int:
     if seconds <= 0 or sample_rate <= 0 or channels <= 0:
         return 0
-    return int(seconds * sample_rate * channels * 2)
+    n = int(seconds * sample_rate * channels * 2)
+    return n - n % (channels * 2)  # alineado a muestra completa
 
 def chunk_bytes(data: bytes, chunk_size: int) -> list[bytes]:
     if chunk_size <= 0:
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+class PCMBuffer:
+    # Bloques de tamaño fijo preasignados: append O(1) (sin realloc del total)
+    # y vistas de solo lectura sin copia cuando el rango cae en un bloque.
+    # Los offsets son absolutos desde el inicio de la sesión, aunque se
+    # liberen bloques viejos.
+
+    def __init__(self, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+        if block_size <= 0:
+            raise ValueError("block_size must be > 0")
+        self.block_size = block_size
+        self._blocks: list[bytearray] = []
+        self._fill = 0  # bytes usados del último bloque
+        self._base = 0  # offset absoluto del byte 0 de _blocks[0]
+        self._start = 0  # offset absoluto del primer byte retenido
+        self._end = 0  # offset absoluto del final (total recibido)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __bool__(self) -> bool:
+        return self._end > self._start
+
+    @property
+    def start(self) -> int:
+        return self._start
+
+    @property
+    def end(self) -> int:
+        return self._end
+
+    def append(self, data: bytes | bytearray | memoryview) -> None:
+        src = memoryview(data).cast("B")
+        pos = 0
+        n = len(src)
+        while pos < n:
+            if not self._blocks or self._fill == self.block_size:
+                self._blocks.append(bytearray(self.block_size))
+                self._fill = 0
+            take = min(self.block_size - self._fill, n - pos)
+            # asignación de slice del mismo tamaño: no redimensiona el bloque
+            self._blocks[-1][self._fill : self._fill + take] = src[pos : pos + take]
+            self._fill += take
+            pos += take
+        self._end += n
+
+    def view(self, start: int, end: int) -> memoryview:
+        start = max(start, self._start)
+        end = min(end, self._end)
+        if end <= start:
+            return memoryview(b"")
+
+        base = self._base
+        first = (start - base) // self.block_size
+        last = (end - 1 - base) // self.block_size
+        a = (start - base) % self.block_size
+
+        if first == last:
+            return memoryview(self._blocks[first])[a : a + (end - start)].toreadonly()
+
+        parts: list[memoryview] = []
+        for i in range(first, last + 1):
+            block = memoryview(self._blocks[i])
+            lo = a if i == first else 0
+            hi = ((end - 1 - base) % self.block_size) + 1 if i == last else self.block_size
+            parts.append(block[lo:hi])
+        return memoryview(b"".join(parts))
+
+    def tail(self, n: int) -> memoryview:
+        if n <= 0:
+            return memoryview(b"")
+        return self.view(self._end - n, self._end)
+
+    def snapshot(self) -> memoryview:
+        return self.view(self._start, self._end)
+
+    def release_before(self, offset: int) -> None:
+        # suelta bloques completos anteriores a offset (las vistas ya
+        # entregadas siguen siendo válidas: mantienen vivo su bloque)
+        offset = min(offset, self._end)
+        if offset <= self._start:
+            return
+        drop = min((offset - self._base) // self.block_size, len(self._blocks))
+        if drop > 0:
+            del self._blocks[:drop]
+            self._base += drop * self.block_size
+            if not self._blocks:
+                self._fill = 0
+        self._start = offset
+
+    def clear(self) -> None:
+        self._blocks = []
+        self._fill = 0
+        self._base = self._start = self._end
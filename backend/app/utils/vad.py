@@ -0,0 +1,149 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class VADConfig:
+    frame_ms: int = 30
+    # umbral = max(piso absoluto, ruido de fondo estimado + margen)
+    min_energy_db: float = -50.0
+    noise_margin_db: float = 10.0
+    # voz sonora: ZCR baja; ruido/sibilantes débiles: ZCR alta
+    max_zcr: float = 0.35
+    min_speech_ms: int = 150
+    min_silence_ms: int = 600
+    pre_roll_ms: int = 200
+    post_roll_ms: int = 200
+    max_utterance_s: float = 30.0
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "VADConfig":
+        c = config.get("vad")
+        if not isinstance(c, dict):
+            return cls()
+        known = {k: v for k, v in c.items() if k in cls.__dataclass_fields__ and isinstance(v, (int, float))}
+        return cls(**known)
+
+
+@dataclass(frozen=True)
+class Utterance:
+    # offsets absolutos en bytes (mismos que PCMBuffer)
+    start: int
+    end: int
+
+
+def frame_features(samples: np.ndarray, frame_len: int) -> tuple[np.ndarray, np.ndarray]:
+    # energía RMS en dBFS y zero-crossing rate por frame, vectorizado
+    n = len(samples) // frame_len
+    if n == 0:
+        return np.empty(0), np.empty(0)
+    frames = samples[: n * frame_len].reshape(n, frame_len).astype(np.float32) / 32768.0
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20.0 * np.log10(np.maximum(rms, 1e-10))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / float(frame_len - 1)
+    return energy_db, zcr
+
+
+@dataclass
+class VADSegmenter:
+    sample_rate: int = 16000
+    config: VADConfig = field(default_factory=VADConfig)
+
+    noise_db: float = -60.0
+    in_speech: bool = False
+    speech_start: int = 0  # byte donde empezó la voz actual (sin pre-roll)
+    last_speech_end: int = 0
+    _utt_start: int = 0
+    _last_close: int = 0
+    _pending_speech_ms: int = 0
+    _silence_ms: int = 0
+    _pos: int = 0  # offset absoluto (bytes) del próximo frame a analizar
+    _carry: bytes = b""
+
+    @property
+    def frame_bytes(self) -> int:
+        return max(1, self.sample_rate * self.config.frame_ms // 1000) * 2
+
+    @property
+    def utterance_start(self) -> Optional[int]:
+        # inicio de la locución en curso incluyendo pre-roll
+        return self._utt_start if self.in_speech else None
+
+    def _open(self) -> None:
+        pre = self.sample_rate * self.config.pre_roll_ms // 1000 * 2
+        self.in_speech = True
+        self.last_speech_end = self._pos
+        # el pre-roll nunca se solapa con la locución anterior
+        self._utt_start = max(self._last_close, self.speech_start - pre, 0)
+
+    def _close(self) -> Utterance:
+        post = self.sample_rate * self.config.post_roll_ms // 1000 * 2
+        end = min(self._pos, self.last_speech_end + post)
+        utt = Utterance(start=self._utt_start, end=end)
+        self.in_speech = False
+        self._silence_ms = 0
+        self._pending_speech_ms = 0
+        self._last_close = end
+        return utt
+
+    def feed(self, pcm: bytes | memoryview) -> list[Utterance]:
+        data = self._carry + bytes(pcm) if self._carry else pcm
+        fb = self.frame_bytes
+        usable = len(data) - len(data) % fb
+        self._carry = bytes(data[usable:])
+        if usable == 0:
+            return []
+
+        samples = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        energy_db, zcr = frame_features(samples, fb // 2)
+
+        cfg = self.config
+        out: list[Utterance] = []
+        max_utt = int(cfg.max_utterance_s * self.sample_rate) * 2
+
+        for e, z in zip(energy_db.tolist(), zcr.tolist()):
+            frame_start = self._pos
+            self._pos += fb
+
+            threshold = max(cfg.min_energy_db, self.noise_db + cfg.noise_margin_db)
+            speech = e > threshold and (z < cfg.max_zcr or e > threshold + 10.0)
+
+            if not speech:
+                # piso de ruido adaptativo (solo con frames sin voz)
+                self.noise_db = 0.95 * self.noise_db + 0.05 * e
+
+            if not self.in_speech:
+                if speech:
+                    if self._pending_speech_ms == 0:
+                        self.speech_start = frame_start
+                    self._pending_speech_ms += cfg.frame_ms
+                    if self._pending_speech_ms >= cfg.min_speech_ms:
+                        self._open()
+                else:
+                    self._pending_speech_ms = 0
+                continue
+
+            if speech:
+                self._silence_ms = 0
+                self.last_speech_end = self._pos
+            else:
+                self._silence_ms += cfg.frame_ms
+
+            too_long = self._pos - self._utt_start >= max_utt
+            if self._silence_ms >= cfg.min_silence_ms or too_long:
+                out.append(self._close())
+                if too_long and speech:
+                    # corte forzado en mitad de voz: sigue otra locución
+                    self.speech_start = self._pos
+                    self._open()
+
+        return out
+
+    def flush(self) -> list[Utterance]:
+        if self.in_speech:
+            return [self._close()]
+        return []
@@ -8,6 +8,7 @@ ClientMsgType = Literal["start", "audio", "stop"]
 ServerMsgType = Literal["ready", "partial", "final", "error"]
 
 AudioFormat = Literal["pcm16"]
+AudioTransport = Literal["json", "binary"]
 
 class ClientStart(TypedDict):
     type: Literal["start"]
@@ -28,11 +29,20 @@ ClientMessage = ClientStart | ClientAudio | ClientStop
 class ServerReady(TypedDict):
     type: Literal["ready"]
     session_id: str
+    # solo con config.audio_transport="binary"
+    audio_transport: NotRequired[AudioTransport]
+    format: NotRequired[AudioFormat]
+    sample_rate: NotRequired[int]
 
 class ServerPartial(TypedDict):
     type: Literal["partial"]
     session_id: str
     text: str
+    # parciales incrementales: prefijo confirmado + cola volátil
+    committed: NotRequired[str]
+    tail: NotRequired[str]
+    start_ms: NotRequired[Optional[int]]
+    end_ms: NotRequired[Optional[int]]
 
 class ServerFinal(TypedDict):
     type: Literal["final"]
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentiles(values: list[float], scale: float = 1000.0) -> dict[str, Optional[float]]:
+    # segundos -> ms por defecto; nearest-rank, sin numpy
+    if not values:
+        return {"p50": None, "p90": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(values)
+
+    def pick(p: float) -> float:
+        idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return round(ordered[idx] * scale, 2)
+
+    return {"p50": pick(50), "p90": pick(90), "p95": pick(95), "p99": pick(99), "max": round(ordered[-1] * scale, 2)}
+
+
+class LoopLagMonitor:
+    # retraso del event loop del propio cliente: si crece, el benchmark mide al cliente
+    def __init__(self, interval_s: float = 0.05) -> None:
+        self.interval_s = interval_s
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            t0 = time.perf_counter()
+            await asyncio.sleep(self.interval_s)
+            self.samples.append(max(0.0, time.perf_counter() - t0 - self.interval_s))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def probe_latency(base_url: str, stop: asyncio.Event, interval_s: float = 0.1) -> list[float]:
+    # RTT de /health durante la carga: lo que tarda el event loop del servidor en atender
+    out: list[float] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                await client.get("/health")
+                out.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), interval_s)
+            except asyncio.TimeoutError:
+                pass
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _descendants(pid: int) -> list[int]:
+    out = [pid]
+    try:
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                for child in f.read().split():
+                    out.extend(_descendants(int(child)))
+    except OSError:
+        pass
+    return out
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    # VmHWM (pico de RSS) del servidor y sus workers; solo Linux
+    total_kb = 0
+    found = False
+    for p in _descendants(pid):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+                        found = True
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1) if found else None
+
+
+class LocalServer:
+    # uvicorn en un subproceso con el entorno del benchmark (p.ej. whisper falso);
+    # app="bench.mock_llm:app" levanta el LLM falso
+    def __init__(self, env: Optional[dict[str, str]] = None, workers: int = 1, app: str = "app.main:app") -> None:
+        self.app = app
+        self.port = _free_port()
+        # WORKERS: los presupuestos de la máquina (CPU, rate limits) se reparten entre los procesos
+        self.env = {**os.environ, "ENV": "bench", "WORKERS": str(workers), **(env or {})}
+        self.workers = workers
+        self.proc: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout_s: float = 30.0) -> None:
+        cmd = [
+            sys.executable, "-m", "uvicorn", self.app,
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning", "--no-access-log",
+        ]
+        self.proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=self.env)
+        deadline = time.monotonic() + timeout_s
+        while time.monotonic() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"server exited with code {self.proc.returncode}")
+            try:
+                if httpx.get(f"{self.base_url}/health", timeout=1.0).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.1)
+        self.stop()
+        raise RuntimeError("server did not become healthy in time")
+
+    def stop(self) -> None:
+        if self.proc is None or self.proc.poll() is not None:
+            return
+        self.proc.send_signal(signal.SIGTERM)
+        try:
+            self.proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+    def __enter__(self) -> "LocalServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def environment() -> dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git_rev": _git_rev(),
+    }
+
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _get(report: dict[str, Any], path: str) -> Optional[float]:
+    cur: Any = report
+    for part in path.split("."):
+        if not isinstance(cur, dict):
+            return None
+        cur = cur.get(part)
+    return float(cur) if isinstance(cur, (int, float)) else None
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], keys: list[tuple[str, bool]], max_regression: float) -> list[str]:
+    # keys: (ruta.con.puntos, mayor_es_peor). Devuelve las regresiones encontradas.
+    out = []
+    for path, higher_is_worse in keys:
+        now, before = _get(report, path), _get(baseline, path)
+        if now is None or before is None or before == 0:
+            continue
+        change = (now - before) / before if higher_is_worse else (before - now) / before
+        if change > max_regression:
+            out.append(f"{path}: {before} -> {now} ({change:+.0%})")
+    return out
+
+
+def write_report(report: dict[str, Any], path: Optional[str]) -> None:
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if path:
+        Path(path).write_text(text + "\n")
+    else:
+        print(text)
+
+
+def load_report(path: str) -> dict[str, Any]:
+    return json.loads(Path(path).read_text())
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# whisper-cli falso para benchmarks: tarda audio_s * FAKE_WHISPER_RTF y devuelve
+# FAKE_WHISPER_TEXT con timestamps, como whisper-cli. Acepta -f archivo,
+# -f - (stdin) y -f /dev/fd/N, así que sirve con cualquier WHISPER_IO_MODE.
+#
+#   FAKE_WHISPER_RTF=0.2      segundos de proceso por segundo de audio
+#   FAKE_WHISPER_BUSY=1       quema CPU en vez de dormir (satura núcleos de verdad)
+#   FAKE_WHISPER_STARTUP_S    coste fijo por llamada (carga del modelo)
+import io
+import os
+import sys
+import time
+import wave
+
+
+def _audio_seconds(src: str) -> float:
+    if not src:
+        return 0.0
+    fp = io.BytesIO(sys.stdin.buffer.read()) if src == "-" else src
+    with wave.open(fp, "rb") as wf:
+        return wf.getnframes() / wf.getframerate()
+
+
+def _ts(seconds: float) -> str:
+    ms = int(seconds * 1000)
+    return f"{ms // 3_600_000:02d}:{ms // 60_000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def _work(seconds: float, busy: bool) -> None:
+    if not busy:
+        time.sleep(seconds)
+        return
+    deadline = time.perf_counter() + seconds
+    x = 0
+    while time.perf_counter() < deadline:
+        x += 1
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    src = args[args.index("-f") + 1] if "-f" in args else ""
+    secs = _audio_seconds(src)
+
+    rtf = float(os.environ.get("FAKE_WHISPER_RTF", "0.1"))
+    startup = float(os.environ.get("FAKE_WHISPER_STARTUP_S", "0"))
+    _work(startup + secs * rtf, os.environ.get("FAKE_WHISPER_BUSY") == "1")
+
+    text = os.environ.get("FAKE_WHISPER_TEXT", "hola mundo")
+    if "-of" in args:
+        with open(args[args.index("-of") + 1] + ".txt", "w") as f:
+            f.write(text + "\n")
+    print(f"[{_ts(0)} --> {_ts(secs)}]   {text}")
+
+
+if __name__ == "__main__":
+    main()
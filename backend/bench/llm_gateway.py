@@ -0,0 +1,339 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+
+from bench.common import (
+    LocalServer,
+    LoopLagMonitor,
+    compare,
+    environment,
+    load_report,
+    peak_rss_mb,
+    percentiles,
+    probe_latency,
+    write_report,
+)
+
+# Benchmark de /llm/generate (y /llm/generate/stream) contra bench/mock_llm.py:
+# mide throughput, latencias, conexiones al upstream y tasas de error para
+# validar cambios de pooling, caché y rate limiting sin gastar cuota.
+#
+#   python -m bench.llm_gateway --concurrency 32 --requests 2000 --json main.json
+#   python -m bench.llm_gateway --provider gemini --stream --token-ms 20
+#   python -m bench.llm_gateway --distinct 50 --rate-429 0.05 --backend-env LLM_CACHE_ENABLED=false
+#   python -m bench.llm_gateway --baseline main.json --max-regression 0.2   (exit 1 si empeora)
+
+REGRESSION_KEYS = [
+    ("latency_ms.p95", True),
+    ("latency_ms.p99", True),
+    ("ttft_ms.p95", True),
+    ("error_rate", True),
+    ("upstream.connections", True),
+    ("throughput.requests_per_s", False),
+]
+
+
+@dataclass
+class Sample:
+    latency_s: float
+    status: int
+    ttft_s: Optional[float] = None
+    cached: bool = False
+    error_code: Optional[str] = None
+
+
+@dataclass
+class RunState:
+    issued: int = 0
+    samples: list[Sample] = field(default_factory=list)
+
+
+def build_payload(i: int, args: argparse.Namespace, mock_url: str) -> dict[str, Any]:
+    # --distinct N: solo N prompts distintos (reparte aciertos de caché); 0 = todos únicos
+    n = i % args.distinct if args.distinct else i
+    config: dict[str, Any] = {"model": args.model, "api_key": "bench-key", "cache": not args.no_cache}
+    if args.provider == "openai_compat":
+        config["base_url"] = f"{mock_url}/v1"
+    return {
+        "messages": [
+            {"role": "system", "content": "Eres un asistente de benchmark."},
+            {"role": "user", "content": f"Pregunta número {n}: " + "contexto " * args.prompt_words},
+        ],
+        "provider": args.provider,
+        "temperature": args.temperature,
+        "max_tokens": args.max_tokens,
+        "config": config,
+    }
+
+
+async def _one(client: httpx.AsyncClient, payload: dict[str, Any], stream: bool) -> Sample:
+    t0 = time.perf_counter()
+    if not stream:
+        r = await client.post("/llm/generate", json=payload)
+        dt = time.perf_counter() - t0
+        try:
+            data = r.json()
+        except ValueError:
+            data = {}
+        if r.status_code >= 400:
+            return Sample(dt, r.status_code, error_code=(data.get("error") or {}).get("code"))
+        return Sample(dt, r.status_code, cached=bool(data.get("cached")))
+
+    ttft: Optional[float] = None
+    event = ""
+    async with client.stream("POST", "/llm/generate/stream", json=payload) as r:
+        if r.status_code >= 400:
+            body = await r.aread()
+            try:
+                code = (json.loads(body).get("error") or {}).get("code")
+            except ValueError:
+                code = None
+            return Sample(time.perf_counter() - t0, r.status_code, error_code=code)
+        async for line in r.aiter_lines():
+            if line.startswith("event:"):
+                event = line[6:].strip()
+            elif line.startswith("data:"):
+                if event == "token" and ttft is None:
+                    ttft = time.perf_counter() - t0
+                elif event == "error":
+                    # el stream ya devolvió 200: el fallo viaja como evento SSE
+                    code = (json.loads(line[5:]).get("error") or {}).get("code")
+                    return Sample(time.perf_counter() - t0, 200, ttft, error_code=code or "STREAM_ERROR")
+                elif event == "done":
+                    data = json.loads(line[5:])
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    return Sample(time.perf_counter() - t0, 200, ttft, cached=bool(data.get("cached")))
+    return Sample(time.perf_counter() - t0, 200, ttft, error_code="STREAM_TRUNCATED")
+
+
+async def _worker(client: httpx.AsyncClient, state: RunState, args: argparse.Namespace, mock_url: str, deadline: float) -> None:
+    while True:
+        if args.requests and state.issued >= args.requests:
+            return
+        if not args.requests and time.perf_counter() >= deadline:
+            return
+        i = state.issued
+        state.issued += 1
+        t0 = time.perf_counter()
+        try:
+            sample = await _one(client, build_payload(i, args, mock_url), args.stream)
+        except httpx.HTTPError as e:
+            sample = Sample(time.perf_counter() - t0, 0, error_code=type(e).__name__)
+        state.samples.append(sample)
+
+
+async def _snapshot(base_url: str, path: str) -> dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=10.0) as client:
+        r = await client.get(path)
+        return r.json() if r.status_code == 200 else {}
+
+
+async def run_benchmark(backend_url: str, mock_url: str, args: argparse.Namespace) -> dict[str, Any]:
+    async with httpx.AsyncClient(base_url=mock_url, timeout=10.0) as mock:
+        await mock.post("/_mock/reset")
+        mock_config = (await mock.post("/_mock/config", json=args.mock_config)).json()
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    state = RunState()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    stop_probe = asyncio.Event()
+    probe = asyncio.create_task(probe_latency(backend_url, stop_probe))
+
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(base_url=backend_url, timeout=args.timeout_s, limits=limits) as client:
+        await asyncio.gather(*(
+            _worker(client, state, args, mock_url, t0 + args.duration) for _ in range(args.concurrency)
+        ))
+    wall_s = time.perf_counter() - t0
+
+    stop_probe.set()
+    server_lag = await probe
+    await monitor.stop()
+
+    upstream = await _snapshot(mock_url, "/_mock/stats")
+    llm_stats = await _snapshot(backend_url, "/llm/stats")
+    cache_stats = await _snapshot(backend_url, "/llm/cache/stats")
+
+    samples = state.samples
+    ok = [s for s in samples if s.status == 200 and s.error_code is None]
+    errors: dict[str, int] = {}
+    for s in samples:
+        if s.error_code is not None or s.status != 200:
+            key = s.error_code or f"HTTP_{s.status}"
+            errors[key] = errors.get(key, 0) + 1
+    status: dict[str, int] = {}
+    for s in samples:
+        status[str(s.status)] = status.get(str(s.status), 0) + 1
+    upstream_total = upstream.get("requests_total", 0)
+
+    return {
+        "benchmark": "llm_gateway",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "params": {
+            "provider": args.provider,
+            "stream": args.stream,
+            "concurrency": args.concurrency,
+            "requests": args.requests or None,
+            "duration_s": None if args.requests else args.duration,
+            "distinct": args.distinct or None,
+            "temperature": args.temperature,
+            "cache": not args.no_cache,
+            "workers": args.workers if not args.url else None,
+            "backend_env": args.backend_env,
+            "mock": mock_config,
+        },
+        "wall_s": round(wall_s, 2),
+        "requests": len(samples),
+        "ok": len(ok),
+        "cached": sum(1 for s in ok if s.cached),
+        "status": status,
+        "errors": errors,
+        "error_rate": round((len(samples) - len(ok)) / len(samples), 4) if samples else None,
+        "throughput": {
+            "requests_per_s": round(len(samples) / wall_s, 2) if wall_s else None,
+            "ok_per_s": round(len(ok) / wall_s, 2) if wall_s else None,
+        },
+        "latency_ms": percentiles([s.latency_s for s in ok]),
+        "ttft_ms": percentiles([s.ttft_s for s in ok if s.ttft_s is not None]),
+        "upstream": {
+            "requests": upstream_total,
+            # peticiones al upstream por petición al backend (<1: caché/coalescing; >1: reintentos)
+            "amplification": round(upstream_total / len(samples), 3) if samples else None,
+            # conexiones TCP distintas que abrió el backend: mide si el pool reutiliza
+            "connections": upstream.get("connections"),
+            "max_inflight": upstream.get("max_inflight"),
+            "status": upstream.get("status"),
+        },
+        "backend": {"llm": llm_stats, "cache": cache_stats},
+        "server_lag_ms": percentiles(server_lag),
+        "client_loop_lag_ms": percentiles(monitor.samples),
+        "peak_rss_mb": None,
+    }
+
+
+def _print_summary(report: dict[str, Any]) -> None:
+    t, u = report["throughput"], report["upstream"]
+    print(
+        f"requests={report['requests']} ok={report['ok']} cached={report['cached']} "
+        f"req/s={t['requests_per_s']} error_rate={report['error_rate']} errors={report['errors']}",
+        file=sys.stderr,
+    )
+    print(f"latency_ms={report['latency_ms']}", file=sys.stderr)
+    if report["params"]["stream"]:
+        print(f"ttft_ms={report['ttft_ms']}", file=sys.stderr)
+    print(
+        f"upstream requests={u['requests']} x{u['amplification']} connections={u['connections']} "
+        f"max_inflight={u['max_inflight']} status={u['status']}",
+        file=sys.stderr,
+    )
+    print(f"server_lag_ms={report['server_lag_ms']} peak_rss_mb={report['peak_rss_mb']}", file=sys.stderr)
+
+
+def _parse_env(items: list[str]) -> dict[str, str]:
+    out = {}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--backend-env espera KEY=VALUE: {item}")
+        out[key] = value
+    return out
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark del gateway LLM contra un upstream falso")
+    ap.add_argument("--url", help="backend ya levantado; sin esto se arranca uno local")
+    ap.add_argument("--mock-url", help="mock ya levantado (bench.mock_llm); sin esto se arranca uno local")
+    ap.add_argument("--provider", choices=["openai_compat", "gemini"], default="openai_compat")
+    ap.add_argument("--model", default="mock-model")
+    ap.add_argument("--stream", action="store_true", help="usa /llm/generate/stream y mide TTFT")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=500, help="0 = usar --duration")
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--distinct", type=int, default=0, help="prompts distintos (0 = todos únicos)")
+    ap.add_argument("--prompt-words", type=int, default=50)
+    ap.add_argument("--temperature", type=float, default=0.0)
+    ap.add_argument("--max-tokens", type=int, default=128)
+    ap.add_argument("--no-cache", action="store_true", help="config.cache=false en cada petición")
+    ap.add_argument("--timeout-s", type=float, default=120.0)
+    # comportamiento del upstream falso
+    ap.add_argument("--latency-ms", type=float, default=200.0)
+    ap.add_argument("--jitter-ms", type=float, default=50.0)
+    ap.add_argument("--tokens", type=int, default=20)
+    ap.add_argument("--token-ms", type=float, default=10.0)
+    ap.add_argument("--rate-429", type=float, default=0.0)
+    ap.add_argument("--retry-after-s", type=float, default=1.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--mock-max-concurrency", type=int, default=0)
+    # backend local
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--backend-env", action="append", default=[], help="KEY=VALUE para el backend local (repetible)")
+    ap.add_argument("--json", help="escribe el informe aquí (si no, a stdout)")
+    ap.add_argument("--baseline", help="informe anterior con el que comparar")
+    ap.add_argument("--max-regression", type=float, default=0.2)
+    args = ap.parse_args(argv)
+    args.mock_config = {
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "tokens": args.tokens,
+        "token_ms": args.token_ms,
+        "rate_429": args.rate_429,
+        "retry_after_s": args.retry_after_s,
+        "error_rate": args.error_rate,
+        "max_concurrency": args.mock_max_concurrency,
+    }
+    return args
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    servers: list[LocalServer] = []
+    backend: Optional[LocalServer] = None
+    try:
+        if args.mock_url:
+            mock_url = args.mock_url.rstrip("/")
+        else:
+            mock = LocalServer(app="bench.mock_llm:app")
+            mock.start()
+            servers.append(mock)
+            mock_url = mock.base_url
+
+        if args.url:
+            backend_url = args.url.rstrip("/")
+        else:
+            env = {"GEMINI_BASE_URL": mock_url, **_parse_env(args.backend_env)}
+            backend = LocalServer(env=env, workers=args.workers)
+            backend.start()
+            servers.append(backend)
+            backend_url = backend.base_url
+
+        report = asyncio.run(run_benchmark(backend_url, mock_url, args))
+        if backend is not None and backend.proc is not None:
+            report["peak_rss_mb"] = peak_rss_mb(backend.proc.pid)
+    finally:
+        for s in servers:
+            s.stop()
+
+    _print_summary(report)
+    write_report(report, args.json)
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), REGRESSION_KEYS, args.max_regression)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
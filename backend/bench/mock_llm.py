@@ -0,0 +1,236 @@
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+from dataclasses import asdict, dataclass, fields
+from typing import Any, AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Servidor LLM falso para benchmarks: habla chat/completions (OpenAI) y
+# generateContent / streamGenerateContent (Gemini) sin gastar cuota.
+#
+#   uvicorn bench.mock_llm:app --port 9100
+#   MOCK_LLM_LATENCY_MS=300 MOCK_LLM_RATE_429=0.05 uvicorn bench.mock_llm:app
+#
+# El comportamiento sale de MOCK_LLM_* y se puede cambiar en caliente con
+# POST /_mock/config; GET /_mock/stats cuenta peticiones, conexiones TCP
+# distintas (para ver si el pool del backend reutiliza) y fallos inyectados.
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 200.0  # hasta la cabecera / primer token
+    jitter_ms: float = 50.0  # +uniform(0, jitter)
+    tokens: int = 20  # palabras por respuesta
+    token_ms: float = 10.0  # entre chunks de streaming (y coste de generar en no-stream)
+    rate_429: float = 0.0  # probabilidad de 429
+    retry_after_s: float = 1.0
+    error_rate: float = 0.0  # probabilidad de 500
+    max_concurrency: int = 0  # >0: 429 si hay más peticiones en curso (límite del provider)
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        cfg = cls()
+        for f in fields(cls):
+            raw = os.environ.get(f"MOCK_LLM_{f.name.upper()}")
+            if raw is not None:
+                setattr(cfg, f.name, type(getattr(cfg, f.name))(raw))
+        return cfg
+
+    def update(self, raw: dict[str, Any]) -> None:
+        for f in fields(self):
+            if f.name in raw:
+                setattr(self, f.name, type(getattr(self, f.name))(raw[f.name]))
+
+
+class MockStats:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.requests: dict[str, int] = {}
+        self.status: dict[str, int] = {}
+        self.peers: set[tuple[str, int]] = set()
+        self.inflight = 0
+        self.max_inflight = 0
+        self.tokens_sent = 0
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "requests": dict(self.requests),
+            "requests_total": sum(self.requests.values()),
+            "status": dict(self.status),
+            "connections": len(self.peers),
+            "inflight": self.inflight,
+            "max_inflight": self.max_inflight,
+            "tokens_sent": self.tokens_sent,
+        }
+
+
+app = FastAPI(title="mock-llm")
+app.state.config = MockConfig.from_env()
+app.state.stats = MockStats()
+
+
+def _words(n: int) -> list[str]:
+    return [f"palabra{i}" for i in range(n)]
+
+
+def _usage(prompt: Any, n: int) -> tuple[int, int]:
+    return max(1, len(json.dumps(prompt)) // 4), n
+
+
+async def _delay(cfg: MockConfig) -> None:
+    await asyncio.sleep((cfg.latency_ms + random.uniform(0, cfg.jitter_ms)) / 1000)
+
+
+def _injected_failure(cfg: MockConfig, stats: MockStats) -> JSONResponse | None:
+    if cfg.max_concurrency and stats.inflight > cfg.max_concurrency:
+        return JSONResponse(
+            {"error": {"message": "concurrency limit", "type": "rate_limit"}},
+            status_code=429,
+            headers={"retry-after": str(cfg.retry_after_s)},
+        )
+    r = random.random()
+    if r < cfg.rate_429:
+        return JSONResponse(
+            {"error": {"message": "rate limited", "type": "rate_limit"}},
+            status_code=429,
+            headers={"retry-after": str(cfg.retry_after_s)},
+        )
+    if r < cfg.rate_429 + cfg.error_rate:
+        return JSONResponse({"error": {"message": "injected failure", "type": "server_error"}}, status_code=500)
+    return None
+
+
+async def _handle(request: Request, route: str, stream: bool, shape: str) -> Any:
+    cfg: MockConfig = app.state.config
+    stats: MockStats = app.state.stats
+    stats.requests[route] = stats.requests.get(route, 0) + 1
+    if request.client is not None:
+        stats.peers.add((request.client.host, request.client.port))
+
+    body = await request.json()
+    stats.inflight += 1
+    stats.max_inflight = max(stats.max_inflight, stats.inflight)
+    released = False
+
+    def release(status: int) -> None:
+        nonlocal released
+        if not released:
+            released = True
+            stats.inflight -= 1
+            stats.status[str(status)] = stats.status.get(str(status), 0) + 1
+
+    try:
+        failure = _injected_failure(cfg, stats)
+        await _delay(cfg)
+        if failure is not None:
+            release(failure.status_code)
+            return failure
+
+        words = _words(cfg.tokens)
+        prompt = body.get("messages") or body.get("contents")
+        p_tok, c_tok = _usage(prompt, len(words))
+
+        if not stream:
+            await asyncio.sleep(cfg.tokens * cfg.token_ms / 1000)
+            stats.tokens_sent += len(words)
+            release(200)
+            return JSONResponse(_full_response(shape, body, " ".join(words), p_tok, c_tok))
+    except BaseException:
+        release(499)
+        raise
+
+    async def events() -> AsyncIterator[str]:
+        status = 499
+        try:
+            for i, w in enumerate(words):
+                if i:
+                    await asyncio.sleep(cfg.token_ms / 1000)
+                stats.tokens_sent += 1
+                yield _stream_chunk(shape, body, w if i == 0 else " " + w, None)
+            yield _stream_chunk(shape, body, "", (p_tok, c_tok))
+            if shape == "openai":
+                yield "data: [DONE]\n\n"
+            status = 200
+        finally:
+            release(status)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _full_response(shape: str, body: dict[str, Any], text: str, p_tok: int, c_tok: int) -> dict[str, Any]:
+    if shape == "openai":
+        return {
+            "id": "mock",
+            "object": "chat.completion",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": p_tok, "completion_tokens": c_tok, "total_tokens": p_tok + c_tok},
+        }
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": p_tok, "candidatesTokenCount": c_tok, "totalTokenCount": p_tok + c_tok},
+    }
+
+
+def _stream_chunk(shape: str, body: dict[str, Any], delta: str, usage: tuple[int, int] | None) -> str:
+    if shape == "openai":
+        data: dict[str, Any] = {"id": "mock", "object": "chat.completion.chunk", "model": body.get("model"), "choices": []}
+        if delta:
+            data["choices"] = [{"index": 0, "delta": {"content": delta}}]
+        if usage:
+            data["usage"] = {"prompt_tokens": usage[0], "completion_tokens": usage[1], "total_tokens": sum(usage)}
+    else:
+        data = {"candidates": [{"content": {"role": "model", "parts": [{"text": delta}]}}]}
+        if usage:
+            data["usageMetadata"] = {"promptTokenCount": usage[0], "candidatesTokenCount": usage[1], "totalTokenCount": sum(usage)}
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request) -> Any:
+    # el stream va en el body; hay que leerlo antes de decidir la forma
+    body = await request.json()
+    return await _handle(request, "chat/completions", bool(body.get("stream")), "openai")
+
+
+@app.post("/v1beta/models/{model}:generateContent")
+async def generate_content(model: str, request: Request) -> Any:
+    return await _handle(request, "generateContent", False, "gemini")
+
+
+@app.post("/v1beta/models/{model}:streamGenerateContent")
+async def stream_generate_content(model: str, request: Request) -> Any:
+    return await _handle(request, "streamGenerateContent", True, "gemini")
+
+
+@app.get("/health")
+def health() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/_mock/stats")
+def mock_stats() -> dict:
+    return app.state.stats.to_dict()
+
+
+@app.post("/_mock/reset")
+def mock_reset() -> dict:
+    app.state.stats.reset()
+    return {"ok": True}
+
+
+@app.get("/_mock/config")
+def mock_get_config() -> dict:
+    return asdict(app.state.config)
+
+
+@app.post("/_mock/config")
+async def mock_set_config(request: Request) -> dict:
+    app.state.config.update(await request.json())
+    return asdict(app.state.config)
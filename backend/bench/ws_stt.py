@@ -0,0 +1,296 @@
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+import uuid
+import wave
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+import numpy as np
+from websockets.asyncio.client import connect
+
+from bench.common import (
+    LocalServer,
+    LoopLagMonitor,
+    compare,
+    environment,
+    load_report,
+    peak_rss_mb,
+    percentiles,
+    probe_latency,
+    write_report,
+)
+
+# Benchmark de carga de /ws/stt: N clientes mandan PCM a ritmo de tiempo real y
+# se mide cuánto tardan parciales y finales respecto al audio que cubren.
+#
+#   python -m bench.ws_stt --clients 8 --duration 30 --rtf 0.15 --json out.json
+#   python -m bench.ws_stt --url http://host:8000 --audio reunion.wav
+#   python -m bench.ws_stt --baseline main.json --max-regression 0.2   (exit 1 si empeora)
+
+SR = 16000
+FAKE_WHISPER = Path(__file__).resolve().parent / "fake_whisper.py"
+
+# métricas que se comparan con --baseline (ruta, mayor_es_peor)
+REGRESSION_KEYS = [
+    ("partials.latency_ms.p95", True),
+    ("finals.latency_ms.p95", True),
+    ("server_lag_ms.p99", True),
+    ("peak_rss_mb", True),
+    ("throughput.realtime_streams", False),
+]
+
+
+def synthetic_audio(seconds: float, seed: int = 0) -> bytes:
+    # "habla" (tono modulado) 1.6 s + silencio con ruido 0.8 s: el VAD cierra locuciones
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SR)
+    t = np.arange(n) / SR
+    speech = (np.arange(n) % int(2.4 * SR)) < int(1.6 * SR)
+    tone = 0.3 * 32767 * np.sin(2 * np.pi * (180 + 40 * np.sin(2 * np.pi * 0.5 * t)) * t)
+    noise = rng.normal(0, 30, n)
+    return np.where(speech, tone, noise).astype("<i2").tobytes()
+
+
+def load_wav(path: str) -> bytes:
+    with wave.open(path, "rb") as wf:
+        if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != SR:
+            raise SystemExit(f"{path}: se espera WAV mono PCM16 a {SR} Hz")
+        return wf.readframes(wf.getnframes())
+
+
+@dataclass
+class ClientResult:
+    partial_latency: list[float] = field(default_factory=list)
+    final_latency: list[float] = field(default_factory=list)
+    partials: int = 0
+    partials_untimed: int = 0
+    finals: int = 0
+    errors: int = 0
+    messages: int = 0
+    audio_s: float = 0.0
+    failed: Optional[str] = None
+
+
+async def run_client(idx: int, ws_url: str, audio: bytes, args: argparse.Namespace, config: dict[str, Any]) -> ClientResult:
+    res = ClientResult()
+    chunk_bytes = int(SR * 2 * args.chunk_ms / 1000)
+    chunks = [audio[i : i + chunk_bytes] for i in range(0, len(audio), chunk_bytes)]
+    sent_at: list[float] = []
+    stop_at: Optional[float] = None
+
+    def audio_sent_at(end_ms: Any) -> Optional[float]:
+        # instante en que salió el chunk que contiene end_ms
+        if not isinstance(end_ms, (int, float)) or not sent_at:
+            return None
+        i = min(len(sent_at) - 1, max(0, math.ceil(end_ms / args.chunk_ms) - 1))
+        return sent_at[i]
+
+    async def receive(ws: Any) -> None:
+        async for raw in ws:
+            now = time.perf_counter()
+            msg = json.loads(raw)
+            res.messages += 1
+            kind = msg.get("type")
+            if kind == "partial":
+                res.partials += 1
+                t0 = audio_sent_at(msg.get("end_ms"))
+                if t0 is None:
+                    res.partials_untimed += 1
+                else:
+                    res.partial_latency.append(now - t0)
+            elif kind == "final":
+                res.finals += 1
+                t0 = audio_sent_at(msg.get("end_ms")) if "end_ms" in msg else stop_at
+                if t0 is not None:
+                    res.final_latency.append(now - t0)
+            elif kind == "error":
+                res.errors += 1
+
+    # arranque escalonado: no todos los start en el mismo milisegundo
+    await asyncio.sleep(args.ramp_s * idx / max(1, args.clients))
+    try:
+        async with connect(f"{ws_url}/ws/stt", max_size=None, open_timeout=30) as ws:
+            await ws.send(json.dumps({"type": "start", "session_id": f"bench-{idx}-{uuid.uuid4().hex[:8]}", "config": config}))
+            ready = json.loads(await ws.recv())
+            if ready.get("type") != "ready":
+                res.failed = f"start rejected: {ready}"
+                return res
+
+            receiver = asyncio.create_task(receive(ws))
+            t_start = time.perf_counter()
+            chunk_s = args.chunk_ms / 1000
+            for k, chunk in enumerate(chunks):
+                await ws.send(chunk)
+                sent_at.append(time.perf_counter())
+                res.audio_s += len(chunk) / (SR * 2)
+                # ritmo de tiempo real respecto al inicio (sin acumular deriva)
+                delay = t_start + (k + 1) * chunk_s - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            stop_at = time.perf_counter()
+            await ws.send(json.dumps({"type": "stop"}))
+            try:
+                await asyncio.wait_for(receiver, args.stop_timeout_s)
+            except asyncio.TimeoutError:
+                res.failed = "timeout waiting for final after stop"
+    except Exception as e:
+        res.failed = f"{type(e).__name__}: {e}"
+    return res
+
+
+async def run_benchmark(ws_url: str, http_url: str, audio: bytes, args: argparse.Namespace) -> dict[str, Any]:
+    config: dict[str, Any] = {
+        "provider": args.provider,
+        "audio_transport": "binary",
+        "sample_rate": SR,
+        "partial_every_s": args.partial_every_s,
+    }
+    if args.provider in ("whisper_selfhosted", "whisper_cpp") and not args.url:
+        config.update({"whisper_bin": str(FAKE_WHISPER), "model": "bench-model.bin"})
+    config.update(json.loads(args.config) if args.config else {})
+
+    async with httpx.AsyncClient(base_url=http_url, timeout=10.0) as client:
+        sched_before = (await client.get("/stt/scheduler")).json()
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    stop_probe = asyncio.Event()
+    probe = asyncio.create_task(probe_latency(http_url, stop_probe))
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(run_client(i, ws_url, audio, args, config) for i in range(args.clients)))
+    wall_s = time.perf_counter() - t0
+
+    stop_probe.set()
+    server_lag = await probe
+    await monitor.stop()
+
+    async with httpx.AsyncClient(base_url=http_url, timeout=10.0) as client:
+        sched_after = (await client.get("/stt/scheduler")).json()
+
+    partial_lat = [x for r in results for x in r.partial_latency]
+    final_lat = [x for r in results for x in r.final_latency]
+    audio_s = sum(r.audio_s for r in results)
+    jobs = sched_after.get("completed", 0) - sched_before.get("completed", 0)
+
+    return {
+        "benchmark": "ws_stt",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "params": {
+            "clients": args.clients,
+            "audio_s_per_client": round(len(audio) / (SR * 2), 2),
+            "chunk_ms": args.chunk_ms,
+            "provider": args.provider,
+            "rtf": args.rtf if not args.url else None,
+            "workers": args.workers if not args.url else None,
+            "config": config,
+        },
+        "wall_s": round(wall_s, 2),
+        "clients_failed": [r.failed for r in results if r.failed],
+        "partials": {
+            "count": sum(r.partials for r in results),
+            "untimed": sum(r.partials_untimed for r in results),
+            "latency_ms": percentiles(partial_lat),
+        },
+        "finals": {"count": sum(r.finals for r in results), "latency_ms": percentiles(final_lat)},
+        "errors": sum(r.errors for r in results),
+        "throughput": {
+            "audio_s": round(audio_s, 2),
+            # flujos en tiempo real sostenidos (= clientes si nadie se quedó atrás)
+            "realtime_streams": round(audio_s / wall_s, 2) if wall_s else None,
+            "messages_per_s": round(sum(r.messages for r in results) / wall_s, 2) if wall_s else None,
+            "whisper_jobs": jobs,
+            "whisper_jobs_per_s": round(jobs / wall_s, 2) if wall_s else None,
+            "superseded_partials": sched_after.get("superseded", 0) - sched_before.get("superseded", 0),
+        },
+        "server_lag_ms": percentiles(server_lag),
+        "client_loop_lag_ms": percentiles(monitor.samples),
+        "peak_rss_mb": None,
+    }
+
+
+def _print_summary(report: dict[str, Any]) -> None:
+    p, f, t = report["partials"], report["finals"], report["throughput"]
+    print(
+        f"clients={report['params']['clients']} wall={report['wall_s']}s "
+        f"streams={t['realtime_streams']} jobs/s={t['whisper_jobs_per_s']}",
+        file=sys.stderr,
+    )
+    print(f"partials n={p['count']} latency_ms={p['latency_ms']}", file=sys.stderr)
+    print(f"finals   n={f['count']} latency_ms={f['latency_ms']}", file=sys.stderr)
+    print(f"server_lag_ms={report['server_lag_ms']} peak_rss_mb={report['peak_rss_mb']}", file=sys.stderr)
+    if report["clients_failed"]:
+        print(f"failed clients: {report['clients_failed']}", file=sys.stderr)
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Benchmark de carga de /ws/stt")
+    ap.add_argument("--url", help="servidor ya levantado (http://host:port); sin esto se arranca uno local")
+    ap.add_argument("--clients", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=20.0, help="segundos de audio sintético por cliente")
+    ap.add_argument("--audio", help="WAV mono PCM16 16 kHz a reproducir en lugar del sintético")
+    ap.add_argument("--chunk-ms", type=int, default=100)
+    ap.add_argument("--provider", default="whisper_selfhosted")
+    ap.add_argument("--config", help="JSON extra para el config de start")
+    ap.add_argument("--partial-every-s", type=float, default=1.0)
+    ap.add_argument("--rtf", type=float, default=0.1, help="real-time factor del whisper falso")
+    ap.add_argument("--busy", action="store_true", help="el whisper falso quema CPU en vez de dormir")
+    ap.add_argument("--cpu-budget", type=int, default=0, help="STT_CPU_BUDGET del servidor local")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--ramp-s", type=float, default=1.0)
+    ap.add_argument("--stop-timeout-s", type=float, default=60.0)
+    ap.add_argument("--json", help="escribe el informe aquí (si no, a stdout)")
+    ap.add_argument("--baseline", help="informe anterior con el que comparar")
+    ap.add_argument("--max-regression", type=float, default=0.2)
+    return ap.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    audio = load_wav(args.audio) if args.audio else synthetic_audio(args.duration)
+
+    server: Optional[LocalServer] = None
+    if args.url:
+        http_url = args.url.rstrip("/")
+    else:
+        env = {"FAKE_WHISPER_RTF": str(args.rtf), "WHISPER_POOL_ENABLED": "false"}
+        if args.busy:
+            env["FAKE_WHISPER_BUSY"] = "1"
+        if args.cpu_budget:
+            env["STT_CPU_BUDGET"] = str(args.cpu_budget)
+        server = LocalServer(env=env, workers=args.workers)
+        server.start()
+        http_url = server.base_url
+
+    ws_url = "ws" + http_url[len("http"):]
+    try:
+        report = asyncio.run(run_benchmark(ws_url, http_url, audio, args))
+        if server is not None and server.proc is not None:
+            report["peak_rss_mb"] = peak_rss_mb(server.proc.pid)
+    finally:
+        if server is not None:
+            server.stop()
+
+    _print_summary(report)
+    write_report(report, args.json)
+
+    if args.baseline:
+        regressions = compare(report, load_report(args.baseline), REGRESSION_KEYS, args.max_regression)
+        for r in regressions:
+            print(f"REGRESSION {r}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
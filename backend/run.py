@@ -1,6 +1,97 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import tempfile
+import time
+
 from app.core.config import get_settings
+from app.core.logging import setup_logging
 import uvicorn
 
+logger = logging.getLogger("app.run")
+
+# WORKERS > 1: N procesos uvicorn que comparten PORT con SO_REUSEPORT (el kernel
+# reparte las conexiones nuevas) y además escuchan cada uno en PORT + 1 + i,
+# su URL directa para las redirecciones de afinidad. El registro de sesiones
+# pasa a SQLite compartido si no se configuró otro.
+
+
+def _bind(host: str, port: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve_worker(index: int, env: dict[str, str]) -> None:
+    os.environ.update(env)
+    get_settings.cache_clear()
+    s = get_settings()
+    shared = _bind(s.HOST, s.PORT, reuse_port=True)
+    direct = _bind(s.HOST, s.PORT + 1 + index, reuse_port=False)
+    config = uvicorn.Config("app.main:app", log_level=s.LOG_LEVEL.lower())
+    uvicorn.Server(config).run(sockets=[shared, direct])
+
+
+def _worker_env(s, index: int) -> dict[str, str]:
+    env = {
+        "WORKER_ID": f"{socket.gethostname()}-w{index}",
+        "WORKER_URL": f"http://{s.PUBLIC_HOST}:{s.PORT + 1 + index}",
+    }
+    if s.SESSION_REGISTRY == "memory":
+        # un registro en memoria no se ve desde los otros procesos
+        env["SESSION_REGISTRY"] = "sqlite"
+    if not s.SESSION_REGISTRY_SQLITE_PATH:
+        env["SESSION_REGISTRY_SQLITE_PATH"] = os.path.join(tempfile.gettempdir(), f"prompter-sessions-{s.PORT}.db")
+    return env
+
+
+def run_workers(s) -> None:
+    if not hasattr(socket, "SO_REUSEPORT"):
+        sys.exit("WORKERS > 1 requires SO_REUSEPORT (Linux/macOS)")
+    setup_logging(s.LOG_LEVEL)
+
+    ctx = multiprocessing.get_context("spawn")
+    envs = [_worker_env(s, i) for i in range(s.WORKERS)]
+    procs = [None] * s.WORKERS
+    stopping = False
+
+    def stop(*_):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while not stopping:
+        for i, p in enumerate(procs):
+            if p is None or not p.is_alive():
+                if p is not None:
+                    logger.warning("worker %d exited with code %s, restarting", i, p.exitcode)
+                procs[i] = ctx.Process(target=_serve_worker, args=(i, envs[i]), name=f"prompter-w{i}")
+                procs[i].start()
+        time.sleep(0.5)
+
+    for p in procs:
+        if p is not None and p.is_alive():
+            p.terminate()
+    for p in procs:
+        if p is not None:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.kill()
+
+
 if __name__ == "__main__":
     s = get_settings()
-    uvicorn.run("app.main:app", host=s.HOST, port=s.PORT, reload=(s.ENV == "dev"))
\ No newline at end of file
+    if s.WORKERS > 1:
+        run_workers(s)
+    else:
+        uvicorn.run("app.main:app", host=s.HOST, port=s.PORT, reload=(s.ENV == "dev"))